@@ -0,0 +1,355 @@
+# Batched race simulator: the rules from simulation.py applied to N races at once.
+# Every piece of per-player state is a NumPy array of shape (N, 2), so one step()
+# call advances all races with a handful of vectorized operations.
+import numpy as np
+
+from objectstore import BOOST, OBS, SLIPPERY, SPEED_DOWN
+from simulation import (ACCELERATION, BOOST_DURATION, BOOSTED_TOP_SPEED, CAR_HALF, ITEM_COUNTS, ITEM_HALF,
+                        LEVEL_HANDLING, REACH, SLIPPERY_DURATION, SLIPPERY_HALF, START_HEALTH, TICK_DT, TICK_RATE,
+                        TOP_SPEED, TRACK_LENGTH, TRACK_SAMPLES, TRACK_WIDTH)
+
+
+DEFAULT_COUNTS = ITEM_COUNTS  # Same item mix as the scalar simulation
+
+# Objects sit on distinct spline samples, so at most this many fit in the z window
+# a car sweeps in one tick, 2 * REACH plus its top speed; collisions only ever look
+# at this many columns
+WINDOW = int(np.ceil((2 * REACH + BOOSTED_TOP_SPEED) / (TRACK_LENGTH / TRACK_SAMPLES))) + 1
+
+# Per-race arrays, all indexed by row; retire_finished() drops rows from each of them
+RACE_FIELDS = ('race_id', 'pos_x', 'pos_z', 'prev_x', 'prev_z', 'velocity', 'max_speed', 'handling', 'health', 'boost_end_time',
+               'slippery_end_time', 'finished', 'finish_time', 'obj_x', 'obj_z', 'obj_type', 'obj_active', 'obj_half')
+
+
+def _entry(start, delta, center, half):
+    """
+    Fraction of a straight motion along one axis at which a point enters a slab.
+    Args:
+        start: Positions at the start of the motion
+        delta: Distances moved
+        center: Slab centers
+        half: Slab half-widths
+    Returns:
+        Array of fractions; -inf where the point doesn't move along this axis
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t0 = (center - half - start) / delta
+        t1 = (center + half - start) / delta
+
+    return np.where(delta == 0.0, -np.inf, np.minimum(t0, t1))
+
+
+class BatchRaceSim:
+    """
+    N independent two-player races stored as struct-of-arrays.
+    Races start already past the countdown and run a single level. Each
+    race's objects are kept sorted by z so a step only tests the few
+    objects in each car's z window instead of the whole track.
+    run() periodically retires finished races so the slow stragglers don't
+    keep paying for the whole batch; row i then holds race race_id[i], and
+    final_finish_time / final_health hold results by original race number.
+    Args:
+        num_races: Number of races simulated in parallel
+        level: Level whose base handling is used (0: Sunny, 1: Rainy, 2: Snowy)
+        counts: Optional dict mapping object type code to item count per race
+        seed: Seed for the NumPy random generator
+    """
+
+    def __init__(self, num_races, level=0, counts=None, seed=None):
+        self.num_races = num_races
+        self.base_handling = LEVEL_HANDLING[level]
+        self.counts = dict(DEFAULT_COUNTS if counts is None else counts)
+        self.rng = np.random.default_rng(seed)
+        self.reset()
+
+    def reset(self):
+        """
+        Put every race back on the start line with freshly placed objects.
+        """
+        n = self.num_races
+        self.tick = 0
+        self.race_id = np.arange(n)
+        self.final_finish_time = np.full((n, 2), np.inf)
+        self.final_health = np.full((n, 2), START_HEALTH)
+
+        self.pos_x = np.empty((n, 2))
+        self.pos_x[:, 0] = -TRACK_WIDTH / 4
+        self.pos_x[:, 1] = TRACK_WIDTH / 4
+        self.pos_z = np.zeros((n, 2))
+        self.prev_x = self.pos_x.copy()  # Positions at the last collision check
+        self.prev_z = self.pos_z.copy()
+        self.velocity = np.zeros((n, 2))
+        self.max_speed = np.full((n, 2), TOP_SPEED)
+        self.handling = np.full((n, 2), self.base_handling)
+        self.health = np.full((n, 2), START_HEALTH)
+        self.boost_end_time = np.zeros((n, 2))
+        self.slippery_end_time = np.zeros((n, 2))
+        self.finished = np.zeros((n, 2), dtype=bool)
+        self.finish_time = np.full((n, 2), np.inf)
+
+        self.generate_objects()
+
+    def generate_objects(self):
+        """
+        Place objects randomly along each race's track.
+        Each race gets distinct spline samples and a shuffled mix of types,
+        like generate_objects() in simulation.py.
+        """
+        n = self.num_races
+        kinds = np.concatenate([np.full(count, code, dtype=np.int8) for code, count in sorted(self.counts.items())])
+        m = len(kinds)
+
+        # Distinct sample indices per race: the first m columns of a random permutation
+        candidates = np.arange(10, TRACK_SAMPLES - 10)
+        picks = np.sort(np.argsort(self.rng.random((n, len(candidates))), axis=1)[:, :m], axis=1)
+        self.obj_z = candidates[picks] * (TRACK_LENGTH / TRACK_SAMPLES)
+
+        self.obj_type = kinds[np.argsort(self.rng.random((n, m)), axis=1)]
+        self.obj_x = self.rng.uniform(-TRACK_WIDTH / 2 + 0.25, TRACK_WIDTH / 2 - 0.25, (n, m))
+        self.obj_active = np.ones((n, m), dtype=bool)
+        self.obj_half = np.where(self.obj_type == SLIPPERY, SLIPPERY_HALF, ITEM_HALF) + CAR_HALF
+
+        self._build_search_rows()
+
+    def _build_search_rows(self):
+        """
+        Offset each row by a multiple of 2 * TRACK_LENGTH so the sorted rows
+        form one sorted array and a single searchsorted serves all races.
+        """
+        self._row_offset = np.arange(len(self.obj_z)) * (2 * TRACK_LENGTH)
+        self._flat_z = (self.obj_z + self._row_offset[:, None]).ravel()
+
+    def retire_finished(self):
+        """
+        Record the results of finished races and drop their rows from every array.
+        """
+        done = self.done
+        self._record_results(done)
+        keep = ~done
+
+        for name in RACE_FIELDS:
+            setattr(self, name, getattr(self, name)[keep])
+
+        self._build_search_rows()
+
+    def _record_results(self, rows):
+        """
+        Copy finish times and health of the given rows into the final_* arrays.
+        Args:
+            rows: Boolean mask of rows to record
+        """
+        ids = self.race_id[rows]
+        self.final_finish_time[ids] = self.finish_time[rows]
+        self.final_health[ids] = self.health[rows]
+
+    @property
+    def time(self):
+        """
+        Simulation time in seconds.
+        """
+        return self.tick * TICK_DT
+
+    @property
+    def done(self):
+        """
+        Boolean array of races in which both players have finished.
+        """
+        return self.finished.all(axis=1)
+
+    # --- PHYSICS & COLLISION ---
+    def check_car_collision(self):
+        """
+        Stop a random car and push the cars apart in every race where they touch.
+        """
+        dx = self.pos_x[:, 0] - self.pos_x[:, 1]
+        dz = self.pos_z[:, 0] - self.pos_z[:, 1]
+        hit = dx * dx + dz * dz < 0.04
+
+        if not hit.any():
+            return
+
+        rows = np.nonzero(hit)[0]
+        loser = self.rng.integers(0, 2, len(rows))
+        self.velocity[rows, loser] = 0.0
+
+        push_dir = np.where(dx[rows] < 0, 0.05, -0.05)
+        self.pos_x[rows, 0] += push_dir
+        self.pos_x[rows, 1] -= push_dir
+
+    def check_collisions(self, player_id, racing):
+        """
+        Apply object pickups for one player slot in every race.
+        Like the scalar simulation's swept collisions, the car's whole path since
+        its last check is tested, and when a car touches several objects in the
+        same tick they are applied in the order the car reached them.
+        Args:
+            player_id: 0 for Player 1, 1 for Player 2
+            racing: Boolean array of races where this player is still driving
+        """
+        t = self.time
+        opponent_id = 1 - player_id
+
+        n, m = self.obj_z.shape
+        cx = self.pos_x[:, player_id, None]
+        cz = self.pos_z[:, player_id]
+        sx = self.prev_x[:, player_id, None]
+        sz = self.prev_z[:, player_id]
+
+        # Flat indices of the WINDOW objects starting at the first one within reach of the path
+        first = np.searchsorted(self._flat_z, np.minimum(sz, cz) - REACH + self._row_offset)
+        cols = first[:, None] + np.arange(WINDOW)
+        in_row = cols < (np.arange(n)[:, None] + 1) * m
+        cols = np.minimum(cols, n * m - 1)
+
+        obj_type = self.obj_type.ravel()[cols]
+        half = self.obj_half.ravel()[cols]
+        obj_x = self.obj_x.ravel()[cols]
+        obj_z = self.obj_z.ravel()[cols]
+
+        # Separating axis test of the path against each object's box: the box's
+        # two axes and the path's normal. A car that didn't move gets the point test
+        ex = (cx - sx) / 2
+        ez = ((cz - sz) / 2)[:, None]
+        rx = obj_x - (cx + sx) / 2
+        rz = obj_z - ((cz + sz) / 2)[:, None]
+        swept = ((np.abs(rx) < half + np.abs(ex))
+                 & (np.abs(rz) < half + np.abs(ez))
+                 & (np.abs(ex * rz - ez * rx) <= half * (np.abs(ex) + np.abs(ez))))
+
+        hit = (self.obj_active.ravel()[cols]
+               & in_row
+               & racing[:, None]
+               & swept)
+
+        self.prev_x[:, player_id] = self.pos_x[:, player_id]
+        self.prev_z[:, player_id] = cz
+
+        if hit.any():
+            self.obj_active.ravel()[cols[hit]] = False
+
+            # Where along its path the car entered each object it hit, then the hits
+            # of every race in that order; lexsort is stable, so ties keep z order
+            rows, slots = np.nonzero(hit)
+            dx = (cx - sx)[rows, 0]
+            dz = (cz - sz)[rows]
+            entry = np.maximum(np.maximum(_entry(sx[rows, 0], dx, obj_x[rows, slots], half[rows, slots]),
+                                          _entry(sz[rows], dz, obj_z[rows, slots], half[rows, slots])), 0.0)
+            order = np.lexsort((entry, rows))
+            rows = rows[order]
+            kinds = obj_type[rows, slots[order]]
+            rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+
+            # One pass per hit rank: each race appears at most once in a pass
+            for k in range(rank.max() + 1):
+                now = rank == k
+                race, kind = rows[now], kinds[now]
+
+                # Obstacles cost health and 10% top speed, and another 90% once health runs out
+                obs = race[kind == OBS]
+                self.health[obs, player_id] -= 1.0
+                self.max_speed[obs, player_id] *= 0.9
+                self.velocity[obs, player_id] = 0.0
+                dead = obs[self.health[obs, player_id] <= 0]
+                self.health[dead, player_id] = 0.0
+                self.max_speed[dead, player_id] *= 0.1
+
+                boosted = race[kind == BOOST]
+                self.max_speed[boosted, player_id] = BOOSTED_TOP_SPEED
+                self.boost_end_time[boosted, player_id] = t + BOOST_DURATION
+
+                self.velocity[race[kind == SPEED_DOWN], opponent_id] *= 0.2
+
+                slipped = race[kind == SLIPPERY]
+                self.handling[slipped, player_id] = self.base_handling * 0.3
+                self.slippery_end_time[slipped, player_id] = t + SLIPPERY_DURATION
+
+        expired = racing & (self.boost_end_time[:, player_id] > 0) & (t > self.boost_end_time[:, player_id])
+        alive = self.health[:, player_id] > 0
+        self.max_speed[expired & alive, player_id] = TOP_SPEED
+        self.boost_end_time[expired, player_id] = 0.0
+
+        expired = racing & (self.slippery_end_time[:, player_id] > 0) & (t > self.slippery_end_time[:, player_id])
+        self.handling[expired, player_id] = self.base_handling
+        self.slippery_end_time[expired, player_id] = 0.0
+
+    def _live_keys(self, keys):
+        """
+        Shape one key input to (rows, 2), picking the live races' rows out of per-race arrays.
+        Args:
+            keys: Key state as accepted by step()
+        Returns:
+            Read-only (rows, 2) bool array
+        """
+        keys = np.asarray(keys, dtype=bool)
+
+        if keys.ndim == 2 and keys.shape[0] == self.num_races:
+            keys = keys[self.race_id]
+        elif keys.ndim > 1:
+            raise ValueError(f"per-race keys must have shape ({self.num_races}, 2), got {keys.shape}")
+
+        return np.broadcast_to(keys, (len(self.pos_z), 2))
+
+    def step(self, accel, left=False, right=False):
+        """
+        Advance every race by one fixed tick.
+        Args:
+            accel, left, right: Key states: a bool, a (2,) array of per-player keys,
+                or a (num_races, 2) array of per-race keys indexed by original race
+                number, of which only the rows of races still in the batch are used
+        """
+        accel = self._live_keys(accel)
+        left = self._live_keys(left)
+        right = self._live_keys(right)
+
+        self.tick += 1
+        self.check_car_collision()
+
+        for player_id in range(2):
+            racing = ~self.finished[:, player_id]
+            self.check_collisions(player_id, racing)
+
+            v = self.velocity[:, player_id]
+            v = np.where(accel[:, player_id], v + ACCELERATION, np.where(v > 0, v - ACCELERATION / 2, v))
+            v = np.clip(v, 0, self.max_speed[:, player_id])
+
+            x = self.pos_x[:, player_id] + (left[:, player_id] * 1.0 - right[:, player_id]) * self.handling[:, player_id]
+            new_x = np.clip(x, -TRACK_WIDTH / 2 + 0.1, TRACK_WIDTH / 2 - 0.1)
+            v = np.where(new_x != x, v * 0.9, v)
+
+            self.velocity[:, player_id] = np.where(racing, v, self.velocity[:, player_id])
+            self.pos_x[:, player_id] = np.where(racing, new_x, self.pos_x[:, player_id])
+            self.pos_z[:, player_id] += np.where(racing, v, 0.0)
+
+            crossed = racing & (self.pos_z[:, player_id] >= TRACK_LENGTH)
+            self.finish_time[crossed, player_id] = self.time
+            self.finished[crossed, player_id] = True
+
+    def run(self, max_ticks=TICK_RATE * 120, accel=True, left=False, right=False):
+        """
+        Step every race until all have finished or max_ticks is reached.
+        Args:
+            max_ticks: Safety cap on the number of ticks to simulate
+            accel, left, right: Key states held for the whole run, as accepted by step()
+        Returns:
+            Array of round winners per race (0, 1, or -1 for a tie)
+        """
+        while self.tick < max_ticks and len(self.pos_z) and not self.done.all():
+            self.step(accel, left, right)
+
+            # Shrink the batch once at least half of it has finished
+            if self.tick % TICK_RATE == 0 and self.done.sum() * 2 >= len(self.pos_z):
+                self.retire_finished()
+
+        return self.winners()
+
+    def winners(self):
+        """
+        Round winner of each race from the recorded finish times.
+        Returns:
+            Int array indexed by original race number: 0 or 1 for the faster
+            player, -1 for a tie or unfinished race
+        """
+        self._record_results(np.ones(len(self.pos_z), dtype=bool))
+        t0 = self.final_finish_time[:, 0]
+        t1 = self.final_finish_time[:, 1]
+        return np.where(t0 < t1, 0, np.where(t1 < t0, 1, -1))
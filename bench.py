@@ -0,0 +1,371 @@
+# Benchmark harness for the race logic and the renderer.
+# Results are "higher is better" rates that can be saved as a JSON baseline and
+# compared against later runs:
+#
+#   python bench.py --save baseline.json
+#   python bench.py --compare baseline.json
+#   xvfb-run python bench.py --render glut
+#   python bench.py --render osmesa
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+from simulation import TICK_RATE, TOP_SPEED, TRACK_LENGTH, Simulation, empty_keys, scaled_item_counts
+from snapshot import SnapshotRing
+
+
+# (track length, item count) configurations for the race logic benchmarks
+LOGIC_CONFIGS = [(150, 80), (150, 500), (1500, 800), (1500, 5000), (15000, 8000), (15000, 50000)]
+QUICK_CONFIGS = [(150, 80), (1500, 800)]
+
+
+def measure(run, min_time, setup=None):
+    """
+    Repeat a workload until at least min_time seconds have passed.
+    Args:
+        run: Function doing one round of work and returning the units it did
+        min_time: Minimum total measuring time in seconds
+        setup: Optional function called before each round, outside the timing
+    Returns:
+        Units per second
+    """
+    units = 0
+    elapsed = 0.0
+
+    while elapsed < min_time:
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        units += run()
+        elapsed += time.perf_counter() - start
+
+    return units / elapsed
+
+
+def make_sim(length, items, **kwargs):
+    """
+    Create a headless race that is already past the countdown.
+    Args:
+        length: Track length
+        items: Total number of items on the track
+    Returns:
+        Simulation ready to step
+    """
+    sim = Simulation(weather=False, seed=1, track_length=length, item_counts=scaled_item_counts(items), **kwargs)
+    sim.init_game()
+    sim.countdown_state = 'racing'
+    return sim
+
+
+def driving_keys(tick):
+    """
+    Scripted input: both players accelerate and weave across the track.
+    Args:
+        tick: Current tick number
+    Returns:
+        Input state dict
+    """
+    keys = empty_keys()
+    keys['p1_accel'] = keys['p2_accel'] = True
+    phase = tick // 90 % 4
+    keys['p1_left'] = keys['p2_right'] = phase == 0
+    keys['p1_right'] = keys['p2_left'] = phase == 2
+    return keys
+
+
+KEY_CYCLE = [driving_keys(tick) for tick in range(360)]
+
+
+def bench_update_physics(length, items, min_time):
+    """
+    Full simulation ticks per second.
+    """
+    sim = make_sim(length, items)
+
+    def run():
+        for tick in range(TICK_RATE):
+            if sim.level_completed:
+                sim.reset_level()
+                sim.countdown_state = 'racing'
+            sim.step(KEY_CYCLE[sim.tick % len(KEY_CYCLE)])
+        return TICK_RATE
+
+    return measure(run, min_time)
+
+
+def bench_check_collisions(length, items, min_time):
+    """
+    Object collision queries per second, sweeping a car along the whole track.
+    """
+    sim = make_sim(length, items)
+    steps = 1000
+    spacing = length / steps
+
+    def setup():
+        # Undo the pickups of the previous round
+        sim.objects.active[:] = b'\x01' * len(sim.objects)
+        sim.build_object_index()
+
+    def run():
+        for i in range(steps):
+            # Start each query one tick's drive behind, so the sweep is as long as a real one
+            x, z = (i % 9 - 4) * 0.5, i * spacing
+            sim.previous_position[0][:] = (x, 0.0, z - TOP_SPEED)
+            sim.position[0][:] = (x, 0.0, z)
+            sim.check_collisions(0)
+        return steps
+
+    return measure(run, min_time, setup)
+
+
+def bench_check_car_collision(min_time):
+    """
+    Car-vs-car collision checks per second, half of them touching.
+    """
+    sim = make_sim(TRACK_LENGTH, 80)
+
+    def run():
+        for i in range(1000):
+            sim.position[0][:] = (0.0, 0.0, 10.0)
+            sim.position[1][:] = (0.1 if i % 2 else 1.0, 0.0, 10.0)
+            sim.check_car_collision()
+        return 1000
+
+    return measure(run, min_time)
+
+
+def bench_car_field(num_players, min_time):
+    """
+    Car-vs-car collision checks per second for a whole field of cars spread over the start grid.
+    """
+    sim = make_sim(TRACK_LENGTH, 80, num_players=num_players)
+    start = sim.snapshot()
+
+    def setup():
+        # Undo the pushes of the previous round
+        sim.restore(start)
+
+    def run():
+        for _ in range(100):
+            sim.check_car_collision()
+        return 100
+
+    return measure(run, min_time, setup)
+
+
+def bench_snapshot(num_players, min_time):
+    """
+    Race state snapshot-and-restore round trips per second, as used to roll a race back.
+    """
+    sim = make_sim(TRACK_LENGTH, 80, num_players=num_players)
+
+    def run():
+        for _ in range(1000):
+            sim.restore(sim.snapshot())
+        return 1000
+
+    return measure(run, min_time)
+
+
+def bench_rollback(min_time):
+    """
+    Ticks per second of a race that keeps a SnapshotRing and rolls back 8 ticks every 8 ticks,
+    as a rollback netcode client would after every late input.
+    """
+    sim = make_sim(TRACK_LENGTH, 80)
+    sim.history = SnapshotRing(64)
+    keys = empty_keys()
+    keys['p1_accel'] = keys['p2_accel'] = True
+
+    def run():
+        for _ in range(100):
+            for _ in range(8):
+                sim.step(keys)
+                if sim.level_completed:
+                    sim.reset_level()
+                    sim.countdown_state = 'racing'
+            sim.history.rewind(sim, 8)
+        return 800
+
+    return measure(run, min_time)
+
+
+def bench_batch(min_time):
+    """
+    Race-ticks per second of the NumPy batch simulator, if NumPy is available.
+    """
+    try:
+        from batchsim import BatchRaceSim
+    except ImportError:
+        return None
+
+    batch = BatchRaceSim(10000, seed=1)
+
+    def run():
+        for _ in range(10):
+            batch.step(True)
+        return 10 * batch.num_races
+
+    return measure(run, min_time)
+
+
+def bench_render(backend, level, width, height, min_time):
+    """
+    Frames per second of the split-screen renderer.
+    Args:
+        backend: 'glut' for a real (or Xvfb) window, 'osmesa' for software offscreen rendering
+        level: Level to render (weather changes the particle load)
+        width, height: Framebuffer size
+        min_time: Minimum measuring time in seconds
+    Returns:
+        Frames per second
+    """
+    if backend == 'osmesa':
+        os.environ['PYOPENGL_PLATFORM'] = 'osmesa'  # Must be set before OpenGL is imported
+
+    import racinggame
+    from OpenGL.GL import GL_UNSIGNED_BYTE, glFinish
+    from OpenGL.GLUT import (GLUT_DEPTH, GLUT_DOUBLE, GLUT_RGB, glutCreateWindow, glutInit, glutInitDisplayMode,
+                             glutInitWindowSize, glutSwapBuffers)
+
+    if backend == 'osmesa':
+        from OpenGL import arrays, osmesa
+        context = osmesa.OSMesaCreateContextExt(osmesa.OSMESA_RGBA, 24, 0, 0, None)
+        buffer = arrays.GLubyteArray.zeros((height, width, 4))
+        osmesa.OSMesaMakeCurrent(context, buffer, GL_UNSIGNED_BYTE, width, height)
+        swap = glFinish
+        hud = False  # GLUT bitmap fonts need a GLUT display connection
+    else:
+        glutInit()
+        glutInitDisplayMode(GLUT_DOUBLE | GLUT_RGB | GLUT_DEPTH)
+        glutInitWindowSize(width, height)
+        glutCreateWindow(b"Racing Game Benchmark")
+        swap = glutSwapBuffers
+        hud = True
+
+    racinggame.init()
+    racinggame.reshape(width, height)
+
+    sim = racinggame.sim = make_sim(TRACK_LENGTH, 80, weather=True)
+    sim.current_level = level
+    sim.reset_level()
+    sim.countdown_state = 'racing'
+
+    def run():
+        for _ in range(10):
+            if sim.level_completed:
+                sim.reset_level()
+                sim.countdown_state = 'racing'
+            sim.step(KEY_CYCLE[sim.tick % len(KEY_CYCLE)])
+            racinggame.render_frame(width, height, hud)
+            swap()
+        glFinish()
+        return 10
+
+    return measure(run, min_time)
+
+
+def run_benchmarks(args):
+    """
+    Run every selected benchmark and print results as they come in.
+    Returns:
+        Dict mapping benchmark name to rate
+    """
+    results = {}
+
+    def report(name, value, unit):
+        if value is None:
+            print(f"{name:<48} skipped")
+            return
+        results[name] = value
+        print(f"{name:<48} {value:14,.0f} {unit}")
+
+    for length, items in (QUICK_CONFIGS if args.quick else LOGIC_CONFIGS):
+        tag = f"len{length}/items{items}"
+        report(f"update_physics/{tag}", bench_update_physics(length, items, args.min_time), "ticks/s")
+        report(f"check_collisions/{tag}", bench_check_collisions(length, items, args.min_time), "queries/s")
+
+    report("check_car_collision", bench_check_car_collision(args.min_time), "checks/s")
+    report("check_car_collision/players32", bench_car_field(32, args.min_time), "checks/s")
+    report("race_state/snapshot_restore", bench_snapshot(2, args.min_time), "round trips/s")
+    report("race_state/rollback", bench_rollback(args.min_time), "ticks/s")
+    report("batchsim/10000_races", bench_batch(args.min_time), "race-ticks/s")
+
+    if args.render != 'none':
+        for level in (0, 1, 2):
+            report(f"display/{args.render}/level{level}",
+                   bench_render(args.render, level, args.width, args.height, args.min_time), "frames/s")
+
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print each result relative to a baseline.
+    Args:
+        results: Dict of this run's rates
+        baseline: Dict of the baseline's rates
+        tolerance: Allowed fractional slowdown before a result counts as a regression
+    Returns:
+        Number of regressions
+    """
+    regressions = 0
+    print()
+    print(f"{'benchmark':<48} {'baseline':>14} {'now':>14} {'change':>8}")
+
+    for name, value in results.items():
+        if name not in baseline:
+            print(f"{name:<48} {'-':>14} {value:14,.0f}      new")
+            continue
+
+        ratio = value / baseline[name]
+        flag = ""
+        if ratio < 1 - tolerance:
+            flag = "  SLOWER"
+            regressions += 1
+        elif ratio > 1 + tolerance:
+            flag = "  faster"
+
+        print(f"{name:<48} {baseline[name]:14,.0f} {value:14,.0f} {(ratio - 1) * 100:+7.1f}%{flag}")
+
+    return regressions
+
+
+def main():
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the race logic and renderer.")
+    parser.add_argument('--quick', action='store_true', help="only run the small logic configurations")
+    parser.add_argument('--min-time', type=float, default=0.5, help="seconds to spend on each benchmark")
+    parser.add_argument('--render', choices=('none', 'glut', 'osmesa'), default='none',
+                        help="also benchmark display() through a GLUT window (e.g. under Xvfb) or OSMesa")
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--save', metavar='PATH', help="write the results as a JSON baseline")
+    parser.add_argument('--compare', metavar='PATH', help="compare against a JSON baseline")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="fractional slowdown allowed before --compare reports a regression")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'meta': {'python': sys.version.split()[0], 'platform': platform.platform(),
+                                'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+                       'results': results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+
+        if compare(results, baseline, args.tolerance):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
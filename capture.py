@@ -0,0 +1,378 @@
+# Offscreen rendering of recorded races to PNG sequences or raw video, without a window.
+# Frames are drawn into a framebuffer object and read back through a ring of pixel buffer
+# objects: glReadPixels into a PBO returns immediately, and the pixels are only mapped a
+# frame later, once the GPU has finished with them. Encoding and writing happen on a
+# background thread, so the render loop never waits on zlib or the disk.
+#
+#   python capture.py race.rec --out frames/                      (PNG sequence)
+#   python capture.py race.rec --every 60 --out thumbs/           (one frame per second)
+#   python capture.py race.rec --raw - | ffmpeg -f rawvideo -pix_fmt rgba -s 1280x720 -r 60 -i - race.mp4
+import argparse
+import ctypes
+import os
+import queue
+import struct
+import sys
+import threading
+import zlib
+
+from replay import InputRecorder, replay_steps
+from simulation import TICK_RATE
+
+
+PBO_COUNT = 2  # Readbacks in flight; the oldest is mapped while the newest is still being copied
+WRITE_QUEUE = 8  # Frames waiting for the writer thread before rendering blocks
+
+
+# --- FRAME WRITERS ---
+def flip_rows(pixels, width, height):
+    """
+    Reorder RGBA rows from OpenGL's bottom-up order to top-down.
+    Args:
+        pixels: Bytes of height rows of width RGBA pixels
+        width, height: Frame size
+    Returns:
+        Bytes with the rows reversed
+    """
+    stride = width * 4
+    return b''.join(pixels[row * stride:(row + 1) * stride] for row in range(height - 1, -1, -1))
+
+
+def png_bytes(pixels, width, height, level=6):
+    """
+    Encode a frame as a PNG file.
+    Args:
+        pixels: Top-down RGBA bytes
+        width, height: Frame size
+        level: zlib compression level
+    Returns:
+        Contents of the PNG file
+    """
+    stride = width * 4
+    # Every row starts with filter type 0 (none)
+    raw = b''.join(b'\x00' + pixels[row * stride:(row + 1) * stride] for row in range(height))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw, level))
+            + chunk(b'IEND', b''))
+
+
+class PNGWriter:
+    """
+    Writes every frame to its own numbered PNG file.
+    Args:
+        directory: Output directory, created if missing
+        pattern: File name format taking the frame number
+    """
+
+    def __init__(self, directory, pattern='frame_{:06d}.png'):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.pattern = pattern
+
+    def write(self, index, pixels, width, height):
+        """
+        Write one frame.
+        Args:
+            index: Frame number
+            pixels: Top-down RGBA bytes
+            width, height: Frame size
+        """
+        with open(os.path.join(self.directory, self.pattern.format(index)), 'wb') as f:
+            f.write(png_bytes(pixels, width, height))
+
+    def close(self):
+        pass
+
+
+class RawWriter:
+    """
+    Appends every frame as raw RGBA to one file or pipe, e.g. ffmpeg's rawvideo input.
+    Args:
+        path: Output path, or '-' for standard output
+    """
+
+    def __init__(self, path):
+        self.f = sys.stdout.buffer if path == '-' else open(path, 'wb')
+
+    def write(self, index, pixels, width, height):
+        self.f.write(pixels)
+
+    def close(self):
+        self.f.flush()
+        if self.f is not sys.stdout.buffer:
+            self.f.close()
+
+
+class BackgroundWriter:
+    """
+    Runs another writer on a separate thread behind a bounded queue.
+    Rows are flipped and frames encoded there too; zlib and file writes
+    release the GIL, so this overlaps with rendering.
+    Args:
+        writer: PNGWriter or RawWriter doing the actual writing
+        width, height: Frame size
+        depth: Frames that may wait before write() blocks
+    """
+
+    def __init__(self, writer, width, height, depth=WRITE_QUEUE):
+        self.writer = writer
+        self.width = width
+        self.height = height
+        self.frames = queue.Queue(depth)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.frames.get()
+            if item is None:
+                return
+            if self.error is not None:
+                continue  # Keep draining so write() never blocks on a dead thread
+            index, pixels = item
+            try:
+                self.writer.write(index, flip_rows(pixels, self.width, self.height), self.width, self.height)
+            except Exception as e:
+                self.error = e
+
+    def write(self, index, pixels):
+        """
+        Queue one bottom-up frame for writing.
+        """
+        if self.error is not None:
+            raise self.error
+        self.frames.put((index, pixels))
+
+    def close(self):
+        """
+        Wait for the queued frames to be written and close the writer.
+        """
+        self.frames.put(None)
+        self.thread.join()
+        self.writer.close()
+        if self.error is not None:
+            raise self.error
+
+
+# --- OFFSCREEN RENDERING ---
+def create_context(backend, width, height):
+    """
+    Make an OpenGL context current without showing a window.
+    PYOPENGL_PLATFORM must already be 'osmesa' for the OSMesa backend.
+    Args:
+        backend: 'osmesa' for software rendering, 'glut' for a hidden GLUT window
+        width, height: Frame size
+    Returns:
+        Objects that must stay alive as long as the context is used
+    """
+    from OpenGL.GL import GL_UNSIGNED_BYTE
+
+    if backend == 'osmesa':
+        from OpenGL import arrays, osmesa
+        context = osmesa.OSMesaCreateContextExt(osmesa.OSMESA_RGBA, 24, 0, 0, None)
+        buffer = arrays.GLubyteArray.zeros((height, width, 4))
+        if not osmesa.OSMesaMakeCurrent(context, buffer, GL_UNSIGNED_BYTE, width, height):
+            raise RuntimeError("could not make the OSMesa context current")
+        return context, buffer
+
+    from OpenGL.GLUT import GLUT_DEPTH, GLUT_RGB, glutCreateWindow, glutHideWindow, glutInit, glutInitDisplayMode, \
+        glutInitWindowSize
+    glutInit()
+    glutInitDisplayMode(GLUT_RGB | GLUT_DEPTH)
+    glutInitWindowSize(width, height)
+    window = glutCreateWindow(b"Racing Game Capture")
+    glutHideWindow()
+    return window,
+
+
+class FrameCapture:
+    """
+    A framebuffer object to render into plus a ring of pixel buffer objects to read it back.
+    Call begin() before rendering a frame and read() after; read() returns the
+    frame from PBO_COUNT - 1 calls ago, and finish() returns the ones still in flight.
+    Args:
+        width, height: Frame size
+        buffers: Number of pixel buffer objects in the ring
+    """
+
+    def __init__(self, width, height, buffers=PBO_COUNT):
+        from OpenGL.GL import GL_COLOR_ATTACHMENT0, GL_DEPTH_ATTACHMENT, GL_DEPTH_COMPONENT24, GL_FRAMEBUFFER, \
+            GL_FRAMEBUFFER_COMPLETE, GL_PIXEL_PACK_BUFFER, GL_RENDERBUFFER, GL_RGBA8, GL_STREAM_READ, glBindBuffer, \
+            glBindFramebuffer, glBindRenderbuffer, glBufferData, glCheckFramebufferStatus, glFramebufferRenderbuffer, \
+            glGenBuffers, glGenFramebuffers, glGenRenderbuffers, glRenderbufferStorage
+
+        self.width = width
+        self.height = height
+        self.size = width * height * 4
+
+        self.fbo = glGenFramebuffers(1)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+
+        self.renderbuffers = []
+        for storage, attachment in ((GL_RGBA8, GL_COLOR_ATTACHMENT0), (GL_DEPTH_COMPONENT24, GL_DEPTH_ATTACHMENT)):
+            renderbuffer = glGenRenderbuffers(1)
+            glBindRenderbuffer(GL_RENDERBUFFER, renderbuffer)
+            glRenderbufferStorage(GL_RENDERBUFFER, storage, width, height)
+            glFramebufferRenderbuffer(GL_FRAMEBUFFER, attachment, GL_RENDERBUFFER, renderbuffer)
+            self.renderbuffers.append(renderbuffer)
+
+        if glCheckFramebufferStatus(GL_FRAMEBUFFER) != GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError("offscreen framebuffer is incomplete")
+
+        self.pbos = []
+        for _ in range(buffers):
+            pbo = glGenBuffers(1)
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+            glBufferData(GL_PIXEL_PACK_BUFFER, self.size, None, GL_STREAM_READ)
+            self.pbos.append(pbo)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+
+        self.frames = 0  # Frames read so far
+        self.pending = 0  # Readbacks started but not yet mapped
+
+    def begin(self):
+        """
+        Direct rendering into the offscreen framebuffer.
+        """
+        from OpenGL.GL import GL_FRAMEBUFFER, glBindFramebuffer
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+
+    def read(self):
+        """
+        Start reading back the frame just rendered.
+        Returns:
+            Bottom-up RGBA bytes of the oldest frame in flight once the ring is
+            full, None while it is still filling
+        """
+        from OpenGL.GL import GL_PIXEL_PACK_BUFFER, GL_RGBA, GL_UNSIGNED_BYTE, glBindBuffer
+        from OpenGL.raw.GL.VERSION.GL_1_0 import glReadPixels
+
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self.pbos[self.frames % len(self.pbos)])
+        glReadPixels(0, 0, self.width, self.height, GL_RGBA, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))  # Into the PBO
+        self.frames += 1
+        self.pending += 1
+
+        pixels = self._map_oldest() if self.pending == len(self.pbos) else None
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        return pixels
+
+    def finish(self):
+        """
+        Collect the frames whose readback is still in flight.
+        Returns:
+            List of bottom-up RGBA bytes, oldest first
+        """
+        from OpenGL.GL import GL_PIXEL_PACK_BUFFER, glBindBuffer
+
+        frames = []
+        while self.pending:
+            frames.append(self._map_oldest())
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        return frames
+
+    def _map_oldest(self):
+        """
+        Copy the pixels out of the oldest PBO in flight.
+        """
+        from OpenGL.GL import GL_PIXEL_PACK_BUFFER, GL_READ_ONLY, glBindBuffer, glMapBuffer, glUnmapBuffer
+
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self.pbos[(self.frames - self.pending) % len(self.pbos)])
+        address = glMapBuffer(GL_PIXEL_PACK_BUFFER, GL_READ_ONLY)
+        pixels = ctypes.string_at(address, self.size)
+        glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+        self.pending -= 1
+        return pixels
+
+
+def capture_replay(recording, writer, width, height, every=1, start=0, limit=None, hud=True):
+    """
+    Render a recorded race offscreen and hand every captured frame to a writer.
+    A GL context must be current.
+    Args:
+        recording: InputRecorder of the race
+        writer: BackgroundWriter receiving bottom-up RGBA frames
+        width, height: Frame size
+        every: Capture one frame per this many ticks
+        start: First tick to capture
+        limit: Maximum number of frames (None for the whole race)
+        hud: Whether to draw the HUD text (needs GLUT's bitmap fonts)
+    Returns:
+        Number of frames captured
+    """
+    import racinggame
+
+    capture = FrameCapture(width, height)
+    capture.begin()
+    racinggame.init()
+    index = 0  # Frames rendered
+    written = 0  # Frames handed to the writer; they lag behind by the readbacks in flight
+
+    for sim in replay_steps(recording, weather=True):
+        if sim.tick < start or (sim.tick - start) % every:
+            continue
+
+        if index == 0:
+            racinggame.sim = sim
+            racinggame.set_players(sim.num_players)
+            racinggame.reshape(width, height)
+
+        racinggame.render_frame(width, height, hud)
+        pixels = capture.read()
+        if pixels is not None:
+            writer.write(written, pixels)
+            written += 1
+
+        index += 1
+        if limit is not None and index >= limit:
+            break
+
+    for pixels in capture.finish():
+        writer.write(written, pixels)
+        written += 1
+
+    return index
+
+
+def main():
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Render a recorded race offscreen to images or raw video.")
+    parser.add_argument('recording', help="file written by racinggame.py --record")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument('--out', metavar='DIR', help="write a PNG sequence into DIR")
+    output.add_argument('--raw', metavar='PATH', help="write raw RGBA frames to PATH ('-' for stdout)")
+    parser.add_argument('--backend', choices=('osmesa', 'glut'), default='osmesa',
+                        help="OSMesa software rendering, or a hidden GLUT window (needs a display, e.g. Xvfb)")
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--every', type=int, default=1, help="capture one frame per this many ticks")
+    parser.add_argument('--start', type=float, default=0.0, help="seconds into the race to start capturing")
+    parser.add_argument('--frames', type=int, help="stop after this many frames")
+    args = parser.parse_args()
+
+    if args.backend == 'osmesa':
+        os.environ['PYOPENGL_PLATFORM'] = 'osmesa'  # Must be set before OpenGL is imported
+
+    recording = InputRecorder.load(args.recording)
+    context = create_context(args.backend, args.width, args.height)  # Released once capturing is done
+    writer = BackgroundWriter(PNGWriter(args.out) if args.out else RawWriter(args.raw), args.width, args.height)
+
+    try:
+        frames = capture_replay(recording, writer, args.width, args.height, args.every,
+                                int(args.start * TICK_RATE), args.frames, hud=args.backend == 'glut')
+    finally:
+        writer.close()
+
+    print(f"Captured {frames} frames", file=sys.stderr)
+    del context
+
+
+if __name__ == "__main__":
+    main()
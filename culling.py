@@ -0,0 +1,174 @@
+# View-frustum and distance culling. The frustum is rebuilt from the same parameters
+# that are handed to gluPerspective and gluLookAt, so what it rejects is exactly what
+# the GPU would have clipped anyway (or what is too far away to matter).
+# Distance from the camera also picks the level of detail meshes are drawn at.
+import math
+
+
+DRAW_DISTANCE = 120.0  # Nothing further than this from the camera is drawn
+CHUNK_LENGTH = 15.0  # Length of the track and scenery chunks that are culled as a whole
+LOD_DISTANCES = (12.0, 35.0)  # Camera distances where meshes switch to the next coarser level of detail
+
+
+def _normalize(x, y, z):
+    """
+    Scale a vector to unit length.
+    """
+    length = math.sqrt(x * x + y * y + z * z)
+    return x / length, y / length, z / length
+
+
+def _cross(a, b):
+    """
+    Cross product of two 3D vectors.
+    """
+    return a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0]
+
+
+class Frustum:
+    """
+    The visible volume of a perspective camera, as six inward-facing planes.
+    Args:
+        eye, center, up: Camera placement, as passed to gluLookAt
+        fovy, aspect, near, far: Projection, as passed to gluPerspective
+        draw_distance: Far limit for culling; the nearer of this and far is used
+    """
+
+    def __init__(self, eye, center, up, fovy, aspect, near, far, draw_distance=DRAW_DISTANCE):
+        far = min(far, draw_distance)
+        forward = _normalize(center[0] - eye[0], center[1] - eye[1], center[2] - eye[2])
+        right = _normalize(*_cross(forward, up))
+        true_up = _cross(right, forward)
+
+        half_v = math.tan(math.radians(fovy) / 2)
+        half_h = half_v * aspect
+
+        self.eye = eye
+        self.far = far
+        self.planes = []  # (nx, ny, nz, d): a point p is inside when n . p + d >= 0
+
+        def add_plane(normal):
+            nx, ny, nz = _normalize(*normal)
+            self.planes.append((nx, ny, nz, -(nx * eye[0] + ny * eye[1] + nz * eye[2])))
+
+        # Side planes all pass through the eye; their normals lean from the side vector towards forward
+        for sign in (1, -1):
+            add_plane([forward[i] * half_h - sign * right[i] for i in range(3)])
+            add_plane([forward[i] * half_v - sign * true_up[i] for i in range(3)])
+
+        fx, fy, fz = forward
+        eye_dot = fx * eye[0] + fy * eye[1] + fz * eye[2]
+        self.planes.append((fx, fy, fz, -(eye_dot + near)))
+        self.planes.append((-fx, -fy, -fz, eye_dot + far))
+
+    def sphere_visible(self, x, y, z, radius):
+        """
+        Check whether a bounding sphere is at least partly inside the frustum.
+        Args:
+            x, y, z: Center of the sphere
+            radius: Radius of the sphere
+        Returns:
+            False if the sphere is certainly outside, True otherwise
+        """
+        for nx, ny, nz, d in self.planes:
+            if nx * x + ny * y + nz * z + d < -radius:
+                return False
+
+        return True
+
+    def box_visible(self, lo, hi):
+        """
+        Check whether an axis-aligned box is at least partly inside the frustum.
+        Args:
+            lo: (x, y, z) minimum corner
+            hi: (x, y, z) maximum corner
+        Returns:
+            False if the box is certainly outside, True otherwise
+        """
+        for nx, ny, nz, d in self.planes:
+            # Test the corner furthest along the plane normal
+            px = hi[0] if nx >= 0 else lo[0]
+            py = hi[1] if ny >= 0 else lo[1]
+            pz = hi[2] if nz >= 0 else lo[2]
+
+            if nx * px + ny * py + nz * pz + d < 0:
+                return False
+
+        return True
+
+
+def chunk_ranges(first, last, per_chunk):
+    """
+    Split a range of track samples into fixed-size chunks numbered from the start of the track,
+    so a chunk keeps its number while samples are added or dropped around it.
+    Neighbouring chunks share their boundary sample so no segment is lost.
+    Args:
+        first, last: Global indices of the first and last sample, inclusive
+        per_chunk: Samples per chunk
+    Returns:
+        List of (chunk number, start, end) sample ranges, end inclusive
+    """
+    ranges = []
+
+    for n in range(first // per_chunk, (last - 1) // per_chunk + 1):
+        start = max(n * per_chunk, first)
+        end = min((n + 1) * per_chunk, last)
+        if end > start:
+            ranges.append((n, start, end))
+
+    return ranges
+
+
+def bounds(points, pad=(0.0, 0.0, 0.0)):
+    """
+    Axis-aligned bounding box of some points.
+    Args:
+        points: Non-empty iterable of (x, y, z) points
+        pad: Amount added on every side, per axis
+    Returns:
+        (lo, hi) corner tuples
+    """
+    xs, ys, zs = zip(*points)
+    return ((min(xs) - pad[0], min(ys) - pad[1], min(zs) - pad[2]),
+            (max(xs) + pad[0], max(ys) + pad[1], max(zs) + pad[2]))
+
+
+def bucket_by_z(points, chunk_length=CHUNK_LENGTH):
+    """
+    Group scenery points into chunks by their z coordinate.
+    Args:
+        points: Iterable of (x, y, z) points
+        chunk_length: Length of a chunk along z
+    Returns:
+        Dict mapping chunk number to the list of its points
+    """
+    chunks = {}
+
+    for point in points:
+        chunks.setdefault(int(point[2] // chunk_length), []).append(point)
+
+    return chunks
+
+
+def lod_level(eye, x, y, z, distances=LOD_DISTANCES):
+    """
+    Pick a level of detail by distance from the camera.
+    Args:
+        eye: (x, y, z) camera position
+        x, y, z: Position of the object
+        distances: Increasing distances where the level steps up
+    Returns:
+        0 for the full mesh up to len(distances) for the coarsest
+    """
+    dx = x - eye[0]
+    dy = y - eye[1]
+    dz = z - eye[2]
+    distance_sq = dx * dx + dy * dy + dz * dz
+    level = 0
+
+    for limit in distances:
+        if distance_sq < limit * limit:
+            break
+        level += 1
+
+    return level
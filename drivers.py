@@ -0,0 +1,328 @@
+# Computer drivers and a process-pool runner for AI-vs-AI races.
+# A driver looks at an observation of the race from one car's point of view and returns
+# the same accelerate/left/right booleans the keyboard handlers put into the keys dict,
+# so the headless simulation can't tell it apart from a human player.
+import argparse
+import multiprocessing
+import os
+import time
+from functools import partial
+
+from objectstore import BOOST, OBS, SLIPPERY, SPEED_DOWN, TYPE_NAMES
+from simulation import (CAR_HALF, ITEM_HALF, LEVEL_NAMES, SLIPPERY_HALF, TICK_RATE, TRACK_LENGTH, TRACK_WIDTH,
+                        Simulation, empty_keys, scaled_item_counts)
+
+
+LOOKAHEAD = 8.0  # How far ahead along the track a driver sees objects
+HAZARDS = {OBS: ITEM_HALF + CAR_HALF, SLIPPERY: SLIPPERY_HALF + CAR_HALF}  # Type -> lateral distance that hits
+PICKUPS = (BOOST, SPEED_DOWN)  # Types worth driving over
+DODGE_MARGIN = 0.1  # Extra lateral clearance kept from hazards
+LANE_LIMIT = TRACK_WIDTH / 2 - 0.1  # Furthest a car can get from the center line
+
+
+# --- OBSERVATION ---
+def observe(sim, player_id, lookahead=LOOKAHEAD):
+    """
+    What one car can see of the race, relative to its own position.
+    Args:
+        sim: Simulation being driven
+        player_id: Index of the observing car
+        lookahead: How far ahead objects are reported
+    Returns:
+        Dict with the car's own 'position', 'velocity', 'max_speed', 'handling'
+        and 'health'; 'objects' as (type, dx, dz) of the active objects ahead,
+        nearest first; and 'opponents' as (dx, dz, velocity) of the other cars
+    """
+    x, y, z = sim.position[player_id]
+    objects = sim.objects
+
+    ahead = [(objects.types[i], objects.xs[i] - x, objects.zs[i] - z)
+             for i in sim.object_index.query(z, z + lookahead)]
+    ahead.sort(key=lambda item: item[2])
+
+    opponents = [(position[0] - x, position[2] - z, sim.velocity[i])
+                 for i, position in enumerate(sim.position) if i != player_id]
+
+    return {
+        'position': (x, y, z),
+        'velocity': sim.velocity[player_id],
+        'max_speed': sim.max_speed[player_id],
+        'handling': sim.handling[player_id],
+        'health': sim.health[player_id],
+        'objects': ahead,
+        'opponents': opponents,
+    }
+
+
+def apply_keys(keys, key_names, controls):
+    """
+    Write a driver's controls into a keys dict.
+    Args:
+        keys: Input state dict passed to Simulation.step()
+        key_names: (accel, left, right) key names of the car, from sim.key_names
+        controls: (accel, left, right) booleans returned by Driver.act()
+    """
+    for name, pressed in zip(key_names, controls):
+        keys[name] = pressed
+
+
+# --- DRIVERS ---
+class Driver:
+    """
+    Base class for computer drivers. Subclasses override act().
+    A driver instance controls one car for one race.
+    """
+
+    def act(self, observation):
+        """
+        Decide this tick's controls.
+        Args:
+            observation: Dict returned by observe()
+        Returns:
+            (accel, left, right) booleans
+        """
+        raise NotImplementedError
+
+
+class StraightDriver(Driver):
+    """
+    Holds accelerate and never steers, like run_headless()'s default input.
+    """
+
+    def act(self, observation):
+        return True, False, False
+
+
+class ScriptedDriver(Driver):
+    """
+    Baseline driver: full throttle, steers around obstacles and slippery patches
+    and goes for boosts and speed-downs it can still reach.
+    """
+
+    def act(self, observation):
+        x = observation['position'][0]
+        target = self.target(observation)
+        deadzone = observation['handling'] / 2
+        return True, target - x > deadzone, x - target > deadzone
+
+    def target(self, observation):
+        """
+        Lateral position to steer towards.
+        Args:
+            observation: Dict returned by observe()
+        Returns:
+            Lateral offset from the center line
+        """
+        x = observation['position'][0]
+        velocity = max(observation['velocity'], 0.01)
+        handling = observation['handling']
+        hazards = [(dx, dz, HAZARDS[kind]) for kind, dx, dz in observation['objects'] if kind in HAZARDS]
+
+        for dx, dz, reach in hazards:
+            if abs(dx) < reach + DODGE_MARGIN:
+                # Dodge to whichever side is closer and not blocked by another hazard
+                sides = sorted((dx - reach - DODGE_MARGIN, dx + reach + DODGE_MARGIN), key=abs)
+
+                for offset in sides:
+                    if abs(x + offset) < LANE_LIMIT and not self.blocked(offset, hazards):
+                        return x + offset
+
+                return x + sides[0]
+
+        for kind, dx, dz in observation['objects']:
+            # A pickup is reachable if the car can steer over in the ticks it takes to get there
+            if kind in PICKUPS and abs(dx) <= handling * dz / velocity and not self.blocked(dx, hazards):
+                return x + dx
+
+        return x
+
+    @staticmethod
+    def blocked(offset, hazards):
+        """
+        Check whether a lateral offset drives into one of the hazards ahead.
+        """
+        return any(abs(dx - offset) < reach for dx, dz, reach in hazards)
+
+
+DRIVERS = {'scripted': ScriptedDriver, 'straight': StraightDriver}
+
+
+# --- RACE RUNNER ---
+def run_race(seed, drivers, level=0, track_length=TRACK_LENGTH, item_counts=None, max_ticks=TICK_RATE * 120):
+    """
+    Run one level headlessly with every car under computer control.
+    The countdown is skipped, so races start racing on the first tick.
+    Args:
+        seed: Seed for the race
+        drivers: One Driver subclass (or other factory) per car
+        level: Level to race (0: Sunny, 1: Rainy, 2: Snowy)
+        track_length: Distance from the start to the finish line
+        item_counts: Dict mapping type code to item count (defaults to ITEM_COUNTS)
+        max_ticks: Safety cap on the number of ticks to simulate
+    Returns:
+        Dict with the 'seed', 'ticks' run, 'winner' (-1 for a tie, None if
+        unfinished), per-car 'finish_times' and 'health', and 'pickups', the
+        number of objects of each type that were hit
+    """
+    n = len(drivers)
+    sim = Simulation(weather=False, seed=seed, track_length=track_length, item_counts=item_counts, num_players=n)
+    sim.init_game()
+
+    if level:
+        sim.current_level = level
+        sim.reset_level()
+
+    sim.countdown_state = 'racing'
+    agents = [driver() for driver in drivers]
+    keys = empty_keys(n)
+
+    while sim.tick < max_ticks and not sim.level_completed:
+        for player_id, agent in enumerate(agents):
+            if not sim.game_finished[player_id]:
+                apply_keys(keys, sim.key_names[player_id], agent.act(observe(sim, player_id)))
+
+        sim.step(keys)
+
+    objects = sim.objects
+    pickups = [0] * len(TYPE_NAMES)
+
+    for i in range(len(objects)):
+        if not objects.active[i]:
+            pickups[objects.types[i]] += 1
+
+    return {
+        'seed': seed,
+        'ticks': sim.tick,
+        'winner': sim.round_winners[-1] if sim.level_completed else None,
+        'finish_times': sim.finish_times,
+        'health': sim.health,
+        'pickups': pickups,
+    }
+
+
+def evaluate(num_races, drivers, processes=None, seed=0, **race_options):
+    """
+    Run many races across a process pool.
+    Args:
+        num_races: Number of races; race k uses seed + k
+        drivers: One Driver subclass per car; must be importable by the workers
+        processes: Worker processes (None for one per core, 1 to run in this process)
+        seed: Seed of the first race
+        race_options: Passed on to run_race()
+    Returns:
+        List of run_race() results in seed order
+    """
+    seeds = range(seed, seed + num_races)
+    race = partial(run_race, drivers=drivers, **race_options)
+
+    if processes == 1:
+        return [race(s) for s in seeds]
+
+    with multiprocessing.Pool(processes) as pool:
+        # Races are cheap, so hand them out in batches to keep the workers busy
+        chunksize = max(1, num_races // ((processes or os.cpu_count() or 1) * 8))
+        results = list(pool.imap_unordered(race, seeds, chunksize))
+
+    results.sort(key=lambda result: result['seed'])
+    return results
+
+
+def summarize(results, num_players):
+    """
+    Aggregate race results into balancing statistics.
+    Args:
+        results: List of run_race() results
+        num_players: Number of cars per race
+    Returns:
+        Dict with per-car 'win_rate', 'mean_finish_time' and 'mean_health',
+        the overall 'tie_rate' and 'unfinished_rate', 'mean_margin' between the
+        first two finishers, and 'mean_pickups' per type name
+    """
+    races = len(results)
+    wins = [0] * num_players
+    finish_sums = [0.0] * num_players
+    finish_counts = [0] * num_players
+    health_sums = [0.0] * num_players
+    pickup_sums = [0] * len(TYPE_NAMES)
+    ties = unfinished = 0
+    margins = []
+
+    for result in results:
+        winner = result['winner']
+        if winner is None:
+            unfinished += 1
+        elif winner == -1:
+            ties += 1
+        else:
+            wins[winner] += 1
+
+        for player_id in range(num_players):
+            finish = result['finish_times'][player_id]
+            if finish is not None:
+                finish_sums[player_id] += finish
+                finish_counts[player_id] += 1
+            health_sums[player_id] += result['health'][player_id]
+
+        finished = sorted(t for t in result['finish_times'] if t is not None)
+        if len(finished) >= 2:
+            margins.append(finished[1] - finished[0])
+
+        for kind, count in enumerate(result['pickups']):
+            pickup_sums[kind] += count
+
+    return {
+        'races': races,
+        'win_rate': [w / races for w in wins],
+        'tie_rate': ties / races,
+        'unfinished_rate': unfinished / races,
+        'mean_finish_time': [s / c if c else None for s, c in zip(finish_sums, finish_counts)],
+        'mean_health': [s / races for s in health_sums],
+        'mean_margin': sum(margins) / len(margins) if margins else None,
+        'mean_pickups': {name: pickup_sums[kind] / races for kind, name in enumerate(TYPE_NAMES)},
+    }
+
+
+def main():
+    """
+    Command line entry point: evaluate a lineup of drivers over many seeds.
+    """
+    parser = argparse.ArgumentParser(description="Race computer drivers against each other across all cores.")
+    parser.add_argument('--races', type=int, default=1000)
+    parser.add_argument('--drivers', default='scripted,scripted',
+                        help=f"comma-separated driver per car, from: {', '.join(DRIVERS)}")
+    parser.add_argument('--processes', type=int, help="worker processes (default: one per core)")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the first race")
+    parser.add_argument('--level', type=int, default=0, choices=range(len(LEVEL_NAMES)))
+    parser.add_argument('--length', type=float, default=TRACK_LENGTH, help="track length")
+    parser.add_argument('--items', type=int, help="total number of items on the track (default: ITEM_COUNTS)")
+    args = parser.parse_args()
+
+    try:
+        drivers = [DRIVERS[name] for name in args.drivers.split(',')]
+    except KeyError as e:
+        parser.error(f"unknown driver {e}")
+
+    item_counts = scaled_item_counts(args.items) if args.items is not None else None
+
+    start = time.perf_counter()
+    results = evaluate(args.races, drivers, args.processes, args.seed, level=args.level, track_length=args.length,
+                       item_counts=item_counts)
+    elapsed = time.perf_counter() - start
+
+    summary = summarize(results, len(drivers))
+    print(f"{args.races} races on {LEVEL_NAMES[args.level]} in {elapsed:.1f} s ({args.races / elapsed:.0f} races/s)")
+
+    for player_id, name in enumerate(args.drivers.split(',')):
+        finish = summary['mean_finish_time'][player_id]
+        finish_text = f"mean finish {finish:.2f} s" if finish is not None else "never finished"
+        print(f"Player {player_id + 1} ({name}): {summary['win_rate'][player_id]:.1%} wins, {finish_text}, "
+              f"mean health {summary['mean_health'][player_id]:.2f}")
+
+    print(f"Ties {summary['tie_rate']:.1%}, unfinished {summary['unfinished_rate']:.1%}, "
+          f"mean margin {summary['mean_margin'] or 0:.2f} s")
+    print("Mean pickups per race: " + ", ".join(f"{name} {count:.1f}"
+                                                for name, count in summary['mean_pickups'].items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# Geometry builders for the renderer. These only produce vertex lists, so they can be
+# baked into display lists (or vertex buffers) once instead of re-issued every frame.
+import math
+
+
+# Unit cube corners and faces, shared by every box
+CUBE_VERTICES = [
+    (-1, -1, 1), (1, -1, 1), (1, 1, 1), (-1, 1, 1),
+    (-1, -1, -1), (1, -1, -1), (1, 1, -1), (-1, 1, -1)
+]
+CUBE_FACES = [
+    (0, 1, 2, 3), (4, 5, 6, 7), (3, 2, 6, 7),
+    (0, 1, 5, 4), (0, 3, 7, 4), (1, 2, 6, 5)
+]
+
+# Tree foliage: four triangles forming crossed pyramid faces around the trunk
+FOLIAGE_TRIANGLES = [
+    (-1.0, 0.0, 0.0), (1.0, 0.0, 0.0), (0.0, 3.0, 0.0),  # Front
+    (1.0, 0.0, 0.0), (-1.0, 0.0, 0.0), (0.0, 3.0, 0.0),  # Back
+    (0.0, 0.0, -1.0), (0.0, 0.0, 1.0), (0.0, 3.0, 0.0),  # Left
+    (0.0, 0.0, 1.0), (0.0, 0.0, -1.0), (0.0, 3.0, 0.0),  # Right
+]
+
+
+def box_quads(out, cx, cy, cz, hx, hy, hz):
+    """
+    Append the 24 quad vertices of an axis-aligned box.
+    Args:
+        out: List the (x, y, z) vertices are appended to
+        cx, cy, cz: Center of the box
+        hx, hy, hz: Half-extents of the box
+    """
+    for face in CUBE_FACES:
+        for vertex in face:
+            vx, vy, vz = CUBE_VERTICES[vertex]
+            out.append((cx + vx * hx, cy + vy * hy, cz + vz * hz))
+
+
+def tree_mesh(trees):
+    """
+    Bake a whole forest into two vertex lists in world space.
+    Args:
+        trees: Iterable of (x, y, z) tree positions
+    Returns:
+        (trunk_quads, foliage_triangles) lists of (x, y, z) vertices
+    """
+    trunks = []
+    foliage = []
+
+    for x, y, z in trees:
+        # Trunk: a 0.2 x 1.0 x 0.2 box standing on the ground
+        box_quads(trunks, x, y + 0.5, z, 0.1, 0.5, 0.1)
+
+        for vx, vy, vz in FOLIAGE_TRIANGLES:
+            foliage.append((x + vx, y + vy, z + vz))
+
+    return trunks, foliage
+
+
+# Tessellation of the curved meshes per level of detail (0 = full, as the GLUT solids had)
+SPHERE_DETAIL = [(16, 16), (8, 6), (5, 3)]  # (slices, stacks)
+WHEEL_DETAIL = [(20, 40), (8, 12), (4, 6)]  # (sides, rings)
+LOD_LEVELS = 3
+
+
+def sphere_quads(radius, slices, stacks):
+    """
+    Quad vertices of a UV sphere centered on the origin, like glutSolidSphere.
+    Args:
+        radius: Sphere radius
+        slices: Subdivisions around the vertical axis
+        stacks: Subdivisions from pole to pole
+    Returns:
+        List of (x, y, z) vertices, four per quad
+    """
+    rings = []
+
+    for j in range(stacks + 1):
+        phi = math.pi * j / stacks - math.pi / 2
+        y = radius * math.sin(phi)
+        r = radius * math.cos(phi)
+        rings.append([(r * math.cos(2 * math.pi * i / slices), y, r * math.sin(2 * math.pi * i / slices))
+                      for i in range(slices + 1)])
+
+    out = []
+    for j in range(stacks):
+        for i in range(slices):
+            out.extend((rings[j][i], rings[j][i + 1], rings[j + 1][i + 1], rings[j + 1][i]))
+
+    return out
+
+
+def torus_quads(inner_radius, outer_radius, sides, rings):
+    """
+    Quad vertices of a torus around the z axis, like glutSolidTorus.
+    Args:
+        inner_radius: Radius of the tube
+        outer_radius: Distance from the center to the middle of the tube
+        sides: Subdivisions around the tube
+        rings: Subdivisions around the torus
+    Returns:
+        List of (x, y, z) vertices, four per quad
+    """
+    grid = []
+
+    for i in range(rings + 1):
+        theta = 2 * math.pi * i / rings
+        row = []
+        for j in range(sides + 1):
+            phi = 2 * math.pi * j / sides
+            r = outer_radius + inner_radius * math.cos(phi)
+            row.append((r * math.cos(theta), r * math.sin(theta), inner_radius * math.sin(phi)))
+        grid.append(row)
+
+    out = []
+    for i in range(rings):
+        for j in range(sides):
+            out.extend((grid[i][j], grid[i + 1][j], grid[i + 1][j + 1], grid[i][j + 1]))
+
+    return out
+
+
+def car_mesh(level):
+    """
+    Build the car model at one level of detail, in car space.
+    Args:
+        level: Level of detail, 0 (full) to LOD_LEVELS - 1 (coarsest)
+    Returns:
+        (body_quads, cabin_quads, wheel_quads) lists of (x, y, z) vertices
+    """
+    body = []
+    box_quads(body, 0.0, 0.0, 0.0, 0.5, 0.15, 0.25)
+
+    cabin = []
+    box_quads(cabin, 0.0, 0.35, 0.0, 0.25, 0.125, 0.15)
+
+    wheel_radius = 0.2
+    wheel_width = 0.1
+    wheel = torus_quads(wheel_width / 2, wheel_radius, *WHEEL_DETAIL[level])
+
+    wheels = []
+    for wx in (-0.6, 0.6):
+        for wz in (-0.35, 0.35):
+            # Stand the wheel up: rotate 90 degrees about y, so its axle points along x
+            for x, y, z in wheel:
+                wheels.append((wx + z, y - 0.05, wz - x))
+
+    return body, cabin, wheels
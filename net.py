@@ -0,0 +1,748 @@
+# Networked races. An authoritative server runs every race in one asyncio event loop,
+# where a single scheduler task steps all of them each tick; clients send one small
+# input packet per tick, predict their own car locally, and reconcile against the
+# server's snapshots, which are sent as XOR deltas against the last snapshot the
+# client acknowledged and then zlib-compressed.
+#
+#   python net.py server --players 2
+#   python net.py bots --rooms 50            (AI clients filling 50 races on localhost)
+#   python net.py tournament --races 500     (AI-only races hosted in this process)
+#   python racinggame.py --connect localhost:5555 --room lobby
+import argparse
+import asyncio
+import random
+import socket
+import struct
+import sys
+import time
+import zlib
+from array import array
+
+from drivers import DRIVERS, observe
+from objectstore import ObjectStore
+from simulation import MAX_TICKS_PER_UPDATE, NUM_LEVELS, NUM_PLAYERS, TICK_DT, TICK_RATE, Simulation, empty_keys
+from snapshot import pack_state, unpack_state
+
+
+PORT = 5555
+SNAPSHOT_HISTORY = 64  # Snapshots a race keeps as delta bases (about a second)
+INPUT_LEAD = 3  # Ticks a client runs ahead of the server, so its inputs arrive before they are needed
+NO_BASE = 0xFFFFFFFF  # Base tick of a snapshot that is not a delta
+
+# Messages, each sent with a FRAME length prefix
+JOIN = b'J'  # Client -> server: room name
+WELCOME = b'W'  # Server -> client: player id, player count and seed of the race
+INPUT = b'I'  # Client -> server: key bits for one tick
+ACK = b'A'  # Client -> server: tick of the newest snapshot received
+SNAPSHOT = b'S'  # Server -> client: race state, possibly as a delta
+
+FRAME = struct.Struct('<I')
+WELCOME_MSG = struct.Struct('<cBBQ')  # Type, player id, player count, seed
+INPUT_MSG = struct.Struct('<cIB')  # Type, tick, key bits
+ACK_MSG = struct.Struct('<cI')  # Type, tick
+SNAPSHOT_MSG = struct.Struct('<cIII')  # Type, tick, base tick, state length; followed by the compressed payload
+
+# Key bits of an input packet, in order; enter and restart act for the whole race
+INPUT_BITS = ('accel', 'left', 'right', 'enter', 'restart')
+
+
+# --- INPUT PACKING ---
+def pack_input(accel, left, right, enter=False, restart=False):
+    """
+    Pack one player's keys for a tick into a byte.
+    Returns:
+        Integer in range(32)
+    """
+    return accel | left << 1 | right << 2 | enter << 3 | restart << 4
+
+
+def merge_inputs(sim, bits):
+    """
+    Build the keys dict for a tick from every player's key bits.
+    Args:
+        sim: Simulation the keys are for
+        bits: Key bits per player
+    Returns:
+        Input state dict
+    """
+    keys = empty_keys(sim.num_players)
+
+    for player_id, player_bits in enumerate(bits):
+        accel_key, left_key, right_key = sim.key_names[player_id]
+        keys[accel_key] = bool(player_bits & 1)
+        keys[left_key] = bool(player_bits & 2)
+        keys[right_key] = bool(player_bits & 4)
+        keys['enter'] = keys['enter'] or bool(player_bits & 8)
+        keys['restart'] = keys['restart'] or bool(player_bits & 16)
+
+    return keys
+
+
+# --- STATE SNAPSHOTS ---
+LAYOUT = struct.Struct('<I')  # Object count; followed by the type codes and the x, y and z arrays
+
+
+def encode_state(sim, bits):
+    """
+    Serialize everything that determines how a race continues, including the
+    object layout so a client that fell behind a level can catch up.
+    The layout is fixed for a race except for the round winners near the end,
+    so consecutive snapshots differ in few bytes and XOR deltas compress well.
+    Args:
+        sim: Simulation to serialize
+        bits: Key bits each player's car last ran with
+    Returns:
+        Bytes
+    """
+    objects = sim.objects
+    return b''.join([bytes(bits), LAYOUT.pack(len(objects)), objects.types, objects.xs.tobytes(),
+                     objects.ys.tobytes(), objects.zs.tobytes(), pack_state(sim)])
+
+
+def decode_state(sim, data):
+    """
+    Load a state written by encode_state() into a simulation of the same race.
+    Args:
+        sim: Simulation with the same seed and player count
+        data: Bytes from encode_state()
+    Returns:
+        Key bits each player's car last ran with
+    """
+    bits = list(data[:sim.num_players])
+    (count,) = LAYOUT.unpack_from(data, sim.num_players)
+    offset = sim.num_players + LAYOUT.size
+
+    objects = sim.objects
+    types = data[offset:offset + count]
+    positions = [array('d', data[offset + count + k * 8 * count:offset + count + (k + 1) * 8 * count])
+                 for k in range(3)]
+    offset += 25 * count
+
+    if types != objects.types or positions[2] != objects.zs or positions[0] != objects.xs:
+        # The server is on a level this client hasn't generated (yet)
+        replacement = ObjectStore()
+        for kind, x, y, z in zip(types, *positions):
+            replacement.add(kind, x, y, z)
+        sim.objects = replacement
+        sim.scenery_version += 1
+        sim.build_object_index()
+
+    unpack_state(sim, data, offset)
+    return bits
+
+
+def xor_bytes(a, b):
+    """
+    XOR two byte strings, padding the shorter one with zeros.
+    """
+    length = max(len(a), len(b))
+    return (int.from_bytes(a, 'little') ^ int.from_bytes(b, 'little')).to_bytes(length, 'little')
+
+
+def encode_snapshot(tick, state, base_tick=NO_BASE, base=b''):
+    """
+    Build a snapshot message, as a delta if a base state is given.
+    Args:
+        tick: Tick of the state
+        state: Bytes from encode_state()
+        base_tick: Tick of a state the client already has, or NO_BASE
+        base: That state's bytes
+    Returns:
+        Message bytes
+    """
+    payload = xor_bytes(state, base) if base_tick != NO_BASE else state
+    return SNAPSHOT_MSG.pack(SNAPSHOT, tick, base_tick, len(state)) + zlib.compress(payload, 1)
+
+
+def decode_snapshot(message, bases):
+    """
+    Recover the state of a snapshot message.
+    Args:
+        message: Bytes starting with SNAPSHOT_MSG
+        bases: Dict of tick -> state bytes the client has received
+    Returns:
+        (tick, state bytes), or (tick, None) if the delta base is unknown
+    """
+    _, tick, base_tick, length = SNAPSHOT_MSG.unpack_from(message)
+    payload = zlib.decompress(message[SNAPSHOT_MSG.size:])
+
+    if base_tick == NO_BASE:
+        return tick, payload
+
+    base = bases.get(base_tick)
+    if base is None:
+        return tick, None
+
+    return tick, xor_bytes(payload, base)[:length]
+
+
+def frame(message):
+    """
+    Prefix a message with its length for the byte stream.
+    """
+    return FRAME.pack(len(message)) + message
+
+
+# --- SERVER ---
+class Race:
+    """
+    One race hosted by the server: the authoritative simulation, the players'
+    inputs, and the recent snapshots used as delta bases.
+    Args:
+        name: Room name clients join with
+        num_players: Cars in the race
+        seed: Seed of the race
+        drivers: Dict of player id -> drivers.Driver for the seats the server drives itself
+        max_ticks: Give up on a race without players after this many ticks
+    """
+
+    def __init__(self, name, num_players, seed, drivers=None, max_ticks=TICK_RATE * 120 * NUM_LEVELS):
+        self.name = name
+        self.max_ticks = max_ticks
+        self.sim = Simulation(weather=False, seed=seed, num_players=num_players)
+        self.sim.init_game()
+        self.drivers = drivers or {}
+        self.writers = [None] * num_players  # Stream writer of each connected player
+        self.bits = [0] * num_players  # Key bits each car last ran with
+        self.pending = [{} for _ in range(num_players)]  # Per player: tick -> key bits not applied yet
+        self.acked = [NO_BASE] * num_players  # Newest snapshot tick each player has acknowledged
+        self.history = {}  # Tick -> state bytes
+
+    def join(self, writer):
+        """
+        Seat a new player.
+        Returns:
+            Player id, or None if the race is full
+        """
+        for player_id, seated in enumerate(self.writers):
+            if seated is None and player_id not in self.drivers:
+                self.writers[player_id] = writer
+                return player_id
+
+        return None
+
+    @property
+    def full(self):
+        """
+        Whether every seat has a player or a computer driver, so the race can start.
+        """
+        return all(writer is not None or player_id in self.drivers for player_id, writer in enumerate(self.writers))
+
+    @property
+    def over(self):
+        """
+        Whether the race can be dropped: every player has left, or a race without
+        players has finished its last level or run out of ticks.
+        """
+        sim = self.sim
+        if any(self.writers):
+            return False
+        return (not self.drivers or sim.tick >= self.max_ticks
+                or (sim.current_level == NUM_LEVELS - 1 and sim.level_completed))
+
+    def leave(self, player_id):
+        """
+        Free a player's seat; their car coasts from now on.
+        """
+        self.writers[player_id] = None
+        self.bits[player_id] = 0
+        self.pending[player_id].clear()
+
+    def receive(self, player_id, message):
+        """
+        Handle an INPUT or ACK message from a player.
+        """
+        kind = message[:1]
+
+        if kind == INPUT:
+            _, tick, bits = INPUT_MSG.unpack(message)
+            if tick > self.sim.tick:
+                self.pending[player_id][tick] = bits
+            else:
+                self.bits[player_id] = bits  # Late: use it from the next tick on
+
+        elif kind == ACK:
+            self.acked[player_id] = ACK_MSG.unpack(message)[1]
+
+    def step(self):
+        """
+        Run one tick with the inputs received for it and send every player a snapshot.
+        Players whose input for the tick is missing keep their last keys.
+        """
+        sim = self.sim
+        tick = sim.tick + 1
+
+        for player_id, pending in enumerate(self.pending):
+            for due in sorted(t for t in pending if t <= tick):
+                self.bits[player_id] = pending.pop(due)
+
+        for player_id, driver in self.drivers.items():
+            accel, left, right = driver.act(observe(sim, player_id))
+            self.bits[player_id] = pack_input(accel, left, right, enter=sim.level_completed)
+
+        sim.step(merge_inputs(sim, self.bits))
+
+        if not any(self.writers):
+            return
+
+        state = self.history[tick] = encode_state(sim, self.bits)
+        self.history.pop(tick - SNAPSHOT_HISTORY, None)
+
+        for player_id, writer in enumerate(self.writers):
+            if writer is None:
+                continue
+            base_tick = self.acked[player_id]
+            base = self.history.get(base_tick)
+            message = encode_snapshot(tick, state, base_tick, base) if base is not None else \
+                encode_snapshot(tick, state)
+            writer.write(frame(message))
+
+
+class TickScheduler:
+    """
+    Steps every running race from one asyncio task, so hosting hundreds of races
+    costs one timer wakeup per tick instead of one per race.
+    Args:
+        paced: Whether to tick at TICK_RATE; unpaced races run as fast as the CPU allows
+    """
+
+    def __init__(self, paced=True):
+        self.paced = paced
+        self.races = []
+        self.ticks = 0  # Scheduler ticks run
+        self.dropped_ticks = 0  # Ticks skipped because stepping every race took too long
+        self.busy_time = 0.0  # Seconds spent stepping races
+
+    def add(self, race):
+        """
+        Start ticking a race from the next scheduler tick on.
+        """
+        self.races.append(race)
+
+    def step(self):
+        """
+        Run one tick of every race and drop the races that are over.
+        """
+        start = time.perf_counter()
+
+        for race in self.races:
+            race.step()
+
+        self.races = [race for race in self.races if not race.over]
+        self.ticks += 1
+        self.busy_time += time.perf_counter() - start
+
+    async def run(self, until_idle=False):
+        """
+        Tick until cancelled.
+        Args:
+            until_idle: Return as soon as no race is left
+        """
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+
+        while self.races or not until_idle:
+            self.step()
+
+            if not self.paced:
+                await asyncio.sleep(0)  # Let clients' messages in between ticks
+                continue
+
+            next_tick += TICK_DT
+            behind = loop.time() - next_tick
+
+            if behind > MAX_TICKS_PER_UPDATE * TICK_DT:
+                # Too slow to catch up: skip the backlog instead of spiralling, like Simulation.update()
+                self.dropped_ticks += int(behind / TICK_DT)
+                next_tick = loop.time()
+
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+
+
+class RaceServer:
+    """
+    Hosts any number of races in one asyncio event loop, all stepped by one TickScheduler.
+    A race starts once all its seats are taken; later clients asking for the same
+    room name get a fresh race.
+    Args:
+        num_players: Players per race
+        seed: Seed for drawing the races' seeds (None for random)
+    """
+
+    def __init__(self, num_players=NUM_PLAYERS, seed=None):
+        self.num_players = num_players
+        self.seeds = random.Random(seed)
+        self.waiting = {}  # Room name -> Race still filling up
+        self.scheduler = TickScheduler()
+
+    async def serve(self, host='localhost', port=PORT):
+        """
+        Accept clients until cancelled.
+        """
+        server = await asyncio.start_server(self.handle_client, host, port)
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.scheduler.run())
+
+    async def handle_client(self, reader, writer):
+        """
+        Seat a client in the room it asks for and feed its messages to that race.
+        """
+        writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        race = player_id = None
+
+        try:
+            message = await read_message(reader)
+            if message[:1] != JOIN:
+                return
+
+            name = message[1:].decode('utf-8', 'replace')
+            race = self.waiting.get(name)
+
+            if race is None:
+                race = self.waiting[name] = Race(name, self.num_players, self.seeds.randrange(2 ** 63))
+
+            player_id = race.join(writer)
+            writer.write(frame(WELCOME_MSG.pack(WELCOME, player_id, self.num_players, race.sim.seed)))
+
+            if race.full:
+                del self.waiting[name]
+                self.scheduler.add(race)
+
+            while True:
+                race.receive(player_id, await read_message(reader))
+
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+        finally:
+            if player_id is not None:
+                race.leave(player_id)
+            writer.close()
+
+
+
+async def read_message(reader):
+    """
+    Read one length-prefixed message from a stream.
+    """
+    (length,) = FRAME.unpack(await reader.readexactly(FRAME.size))
+    return await reader.readexactly(length)
+
+
+# --- CLIENT ---
+class ClientSession:
+    """
+    Client side of a networked race, independent of how messages travel.
+    The local simulation runs ahead of the server with this player's own inputs
+    (and everybody else's last known keys); every snapshot rewinds it to the
+    server's state and replays the inputs the server hadn't seen yet.
+    Args:
+        player_id: Seat assigned by the server
+        num_players: Players in the race
+        seed: Seed of the race, so the track and objects match the server's
+        weather: Whether the local simulation runs weather particles (for rendering)
+    """
+
+    def __init__(self, player_id, num_players, seed, weather=False):
+        self.player_id = player_id
+        self.sim = Simulation(weather=weather, seed=seed, num_players=num_players)
+        self.sim.init_game()
+        self.bits = [0] * num_players  # Key bits used for every car while predicting
+        self.inputs = {}  # Tick -> own key bits the server may not have applied yet
+        self.predicted = {}  # Tick -> own car position predicted for that tick
+        self.states = {}  # Tick -> state bytes received, as delta bases
+        self.server_tick = None  # Newest server tick seen; None until the race starts
+        self.corrections = 0  # Snapshots where the server put this player's car somewhere else
+
+    @classmethod
+    def from_welcome(cls, message, weather=False):
+        """
+        Create a session from the server's WELCOME message.
+        """
+        _, player_id, num_players, seed = WELCOME_MSG.unpack(message)
+        return cls(player_id, num_players, seed, weather)
+
+    def tick(self, bits):
+        """
+        Predict one tick with this player's keys.
+        Args:
+            bits: Own key bits from pack_input()
+        Returns:
+            INPUT message for the server
+        """
+        sim = self.sim
+        tick = sim.tick + 1
+        self.inputs[tick] = bits
+        self.bits[self.player_id] = bits
+        sim.step(merge_inputs(sim, self.bits))
+        self.predicted[tick] = tuple(sim.position[self.player_id])
+        return INPUT_MSG.pack(INPUT, tick, bits)
+
+    def receive(self, message):
+        """
+        Handle a SNAPSHOT message: reconcile the prediction with the server's state.
+        Returns:
+            ACK message for the server, or None if the snapshot couldn't be decoded
+        """
+        tick, state = decode_snapshot(message, self.states)
+
+        if state is None or (self.server_tick is not None and tick <= self.server_tick):
+            return None
+
+        self.states[tick] = state
+        for old in [t for t in self.states if t <= tick - SNAPSHOT_HISTORY]:
+            del self.states[old]
+
+        self.server_tick = tick
+        self.reconcile(tick, state)
+        return ACK_MSG.pack(ACK, tick)
+
+    def reconcile(self, tick, state):
+        """
+        Rewind to the server's state at a tick and replay the newer own inputs.
+        """
+        sim = self.sim
+        predicted = max(sim.tick, tick)
+
+        self.bits = decode_state(sim, state)
+        if self.predicted.get(tick, tuple(sim.position[self.player_id])) != tuple(sim.position[self.player_id]):
+            self.corrections += 1
+
+        for old in [t for t in self.inputs if t <= tick]:
+            del self.inputs[old]
+            self.predicted.pop(old, None)
+
+        for t in range(tick + 1, predicted + 1):
+            self.bits[self.player_id] = self.inputs.get(t, self.bits[self.player_id])
+            sim.step(merge_inputs(sim, self.bits))
+            self.predicted[t] = tuple(sim.position[self.player_id])
+
+    def due_ticks(self):
+        """
+        How many ticks the local simulation may run to stay INPUT_LEAD ahead of the server.
+        """
+        if self.server_tick is None:
+            return 0
+        return max(0, self.server_tick + INPUT_LEAD - self.sim.tick)
+
+
+class PollingConnection:
+    """
+    Non-blocking socket transport for a client whose main loop isn't asyncio (the GLUT game).
+    Args:
+        host, port: Server address
+        room: Room name to join
+        weather: Whether the session's simulation runs weather particles
+    """
+
+    def __init__(self, host, port, room, weather=True):
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.buffer = b''
+        self.send(JOIN + room.encode('utf-8'))
+
+        while True:
+            messages = self._read()  # Still blocking here
+            if messages:
+                break
+
+        self.session = ClientSession.from_welcome(messages[0], weather)
+        self.sock.setblocking(False)
+        self.backlog = messages[1:]
+
+    def send(self, message):
+        """
+        Send one message to the server.
+        """
+        self.sock.sendall(frame(message))
+
+    def _read(self):
+        """
+        Read whatever has arrived and split it into complete messages.
+        """
+        try:
+            data = self.sock.recv(65536)
+        except BlockingIOError:
+            data = None
+
+        if data == b'':
+            raise ConnectionError("server closed the connection")
+
+        if data:
+            self.buffer += data
+
+        messages = []
+        while len(self.buffer) >= FRAME.size:
+            (length,) = FRAME.unpack_from(self.buffer)
+            if len(self.buffer) < FRAME.size + length:
+                break
+            messages.append(self.buffer[FRAME.size:FRAME.size + length])
+            self.buffer = self.buffer[FRAME.size + length:]
+
+        return messages
+
+    def poll(self, bits):
+        """
+        Apply the snapshots that arrived and run the due prediction ticks.
+        Args:
+            bits: Own key bits for the ticks run now
+        Returns:
+            Number of ticks predicted
+        """
+        messages, self.backlog = self.backlog + self._read(), []
+
+        for message in messages:
+            ack = self.session.receive(message)
+            if ack is not None:
+                self.send(ack)
+
+        ticks = self.session.due_ticks()
+        for _ in range(ticks):
+            self.send(self.session.tick(bits))
+
+        return ticks
+
+
+async def run_client(host, port, room, driver, max_ticks=TICK_RATE * 120):
+    """
+    Play a networked race with a computer driver until the last level is over.
+    Args:
+        host, port: Server address
+        room: Room name to join
+        driver: drivers.Driver instance steering this client's car
+        max_ticks: Give up after this many server ticks
+    Returns:
+        The finished ClientSession
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    writer.write(frame(JOIN + room.encode('utf-8')))
+    session = ClientSession.from_welcome(await read_message(reader))
+    sim = session.sim
+
+    async def receive():
+        while True:
+            ack = session.receive(await read_message(reader))
+            if ack is not None:
+                writer.write(frame(ack))
+
+    receiver = asyncio.create_task(receive())
+
+    try:
+        while not (sim.current_level == NUM_LEVELS - 1 and sim.level_completed):
+            if session.server_tick is not None and session.server_tick >= max_ticks:
+                break
+
+            for _ in range(session.due_ticks()):
+                accel, left, right = driver.act(observe(sim, session.player_id))
+                writer.write(frame(session.tick(pack_input(accel, left, right, enter=sim.level_completed))))
+
+            await writer.drain()
+            await asyncio.sleep(TICK_DT)
+
+    finally:
+        receiver.cancel()
+        writer.close()
+
+    return session
+
+
+async def run_bots(host, port, rooms, num_players, driver_name):
+    """
+    Fill several rooms with computer drivers and report how the races went.
+    """
+    start = time.perf_counter()
+    sessions = await asyncio.gather(*(run_client(host, port, f'bots{room}', DRIVERS[driver_name]())
+                                      for room in range(rooms) for _ in range(num_players)))
+    elapsed = time.perf_counter() - start
+
+    corrections = sum(session.corrections for session in sessions)
+    print(f"{rooms} races with {num_players} players finished in {elapsed:.1f} s, "
+          f"{corrections} corrected predictions")
+    for session in sessions[::num_players]:
+        print(f"  seed {session.sim.seed}: round winners {session.sim.round_winners}")
+
+
+async def run_tournament(num_races, driver_names, seed=0, paced=False):
+    """
+    Host a tournament of computer-driven races, all in this event loop.
+    Args:
+        num_races: Races to run at the same time; race k uses seed + k
+        driver_names: Name from drivers.DRIVERS for each car
+        seed: Seed of the first race
+        paced: Whether the races run at TICK_RATE, like races with people in them
+    Returns:
+        (races, scheduler) once every race has finished its last level
+    """
+    scheduler = TickScheduler(paced)
+    races = [Race(f'tournament{k}', len(driver_names), seed + k,
+                  {player_id: DRIVERS[name]() for player_id, name in enumerate(driver_names)})
+             for k in range(num_races)]
+
+    for race in races:
+        scheduler.add(race)
+
+    await scheduler.run(until_idle=True)
+    return races, scheduler
+
+
+def report_tournament(races, scheduler, driver_names, elapsed):
+    """
+    Print the standings of a tournament and how hard the scheduler had to work.
+    """
+    wins = [0] * len(driver_names)
+    rounds = 0
+
+    for race in races:
+        rounds += len(race.sim.round_winners)
+        for winner in race.sim.round_winners:
+            if winner >= 0:
+                wins[winner] += 1
+
+    unfinished = len(races) * NUM_LEVELS - rounds
+    race_ticks = sum(race.sim.tick for race in races)
+    print(f"{len(races)} races, {rounds} rounds ({unfinished} unfinished) in {elapsed:.1f} s: "
+          f"{scheduler.ticks} scheduler ticks, {race_ticks / max(scheduler.busy_time, 1e-9):.0f} race ticks/s, "
+          f"{scheduler.dropped_ticks} dropped")
+
+    for player_id, name in enumerate(driver_names):
+        print(f"Player {player_id + 1} ({name}): {wins[player_id]} round wins ({wins[player_id] / max(rounds, 1):.1%})")
+
+
+def main():
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Networked race server and test clients.")
+    parser.add_argument('mode', choices=('server', 'bots', 'tournament'))
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--players', type=int, default=NUM_PLAYERS, help="players per race")
+    parser.add_argument('--seed', type=int, help="seed for the races' seeds")
+    parser.add_argument('--rooms', type=int, default=1, help="races to fill with bots")
+    parser.add_argument('--driver', default='scripted', help="driver used by the bots")
+    parser.add_argument('--races', type=int, default=100, help="concurrent races in a tournament")
+    parser.add_argument('--drivers', default='scripted,scripted',
+                        help=f"comma-separated tournament driver per car, from: {', '.join(DRIVERS)}")
+    parser.add_argument('--paced', action='store_true', help="run tournament races in real time")
+    args = parser.parse_args()
+
+    try:
+        if args.mode == 'server':
+            print(f"Serving {args.players}-player races on {args.host}:{args.port}", file=sys.stderr)
+            asyncio.run(RaceServer(args.players, args.seed).serve(args.host, args.port))
+        elif args.mode == 'bots':
+            asyncio.run(run_bots(args.host, args.port, args.rooms, args.players, args.driver))
+        else:
+            driver_names = args.drivers.split(',')
+            if any(name not in DRIVERS for name in driver_names):
+                parser.error(f"unknown driver in {args.drivers!r}")
+            start = time.perf_counter()
+            races, scheduler = asyncio.run(run_tournament(args.races, driver_names, args.seed or 0, args.paced))
+            report_tournament(races, scheduler, driver_names, time.perf_counter() - start)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# Compact storage for track objects: one flat array per field instead of a dict per object.
+# Objects are referred to by integer id (their index in the arrays).
+from array import array
+
+
+# Object type codes
+OBS = 0
+BOOST = 1
+SPEED_DOWN = 2
+SLIPPERY = 3
+
+TYPE_NAMES = ('obs', 'boost', 'speed_down', 'slippery')
+
+
+class ObjectStore:
+    """
+    Track objects stored as parallel arrays: type codes and active flags are
+    one byte each, positions are contiguous doubles.
+    """
+
+    __slots__ = ('types', 'xs', 'ys', 'zs', 'active')
+
+    def __init__(self):
+        self.types = bytearray()  # Type code per object
+        self.xs = array('d')
+        self.ys = array('d')
+        self.zs = array('d')
+        self.active = bytearray()  # 1 while the object can still be picked up
+
+    def __len__(self):
+        return len(self.types)
+
+    def clear(self):
+        """
+        Remove every object from the store.
+        """
+        del self.types[:]
+        del self.xs[:]
+        del self.ys[:]
+        del self.zs[:]
+        del self.active[:]
+
+    def drop_first(self, n):
+        """
+        Remove the n oldest objects. The ids of the remaining objects shift down by n.
+        Args:
+            n: Number of objects to remove
+        """
+        if n <= 0:
+            return
+
+        del self.types[:n]
+        del self.xs[:n]
+        del self.ys[:n]
+        del self.zs[:n]
+        del self.active[:n]
+
+    def add(self, kind, x, y, z):
+        """
+        Append an active object.
+        Args:
+            kind: Type code (OBS, BOOST, SPEED_DOWN or SLIPPERY)
+            x, y, z: Position of the object
+        Returns:
+            Id of the new object
+        """
+        i = len(self.types)
+        self.types.append(kind)
+        self.xs.append(x)
+        self.ys.append(y)
+        self.zs.append(z)
+        self.active.append(1)
+        return i
+
+    def pos(self, i):
+        """
+        Position of an object.
+        Args:
+            i: Object id
+        Returns:
+            (x, y, z) tuple
+        """
+        return self.xs[i], self.ys[i], self.zs[i]
+
+    def deactivate(self, i):
+        """
+        Mark an object as picked up.
+        Args:
+            i: Object id
+        """
+        self.active[i] = 0
+
+    def active_ids(self):
+        """
+        Ids of all objects that are still active.
+        Returns:
+            List of object ids
+        """
+        active = self.active
+        return [i for i in range(len(active)) if active[i]]
+
@@ -0,0 +1,127 @@
+# Weather particles (rain and snow) stored as NumPy arrays and updated in bulk.
+# Positions are float32 so the renderer can hand them to GL as a vertex array as-is.
+import numpy as np
+
+
+PARTICLE_COUNT = 150  # Default number of rain drops / snow flakes
+RAIN_STREAK = 1.0  # Length of a rain drop line
+
+
+class ParticleSystem:
+    """
+    A pool of weather particles with positions and velocities in (N, 3) arrays.
+    Args:
+        count: Number of particles spawned per weather level
+        rng: NumPy random generator used for spawning and respawning
+    """
+
+    def __init__(self, count=PARTICLE_COUNT, rng=None):
+        self.count = count
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.level = 0
+        self.pos = np.zeros((0, 3), dtype=np.float32)
+        self.vel = np.zeros((0, 3), dtype=np.float32)
+        self._lines = np.zeros((0, 3), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.pos)
+
+    def clear(self):
+        """
+        Remove all particles (clear weather).
+        """
+        self.spawn(0)
+
+    def spawn(self, level):
+        """
+        Create the particles for a level's weather.
+        Args:
+            level: Integer (0: Sunny, 1: Rainy, 2: Snowy); sunny levels get no particles
+        """
+        self.level = level
+        n = self.count if level in (1, 2) else 0
+
+        self.pos = np.empty((n, 3), dtype=np.float32)
+        self.pos[:, 0] = self.rng.uniform(-10, 10, n)
+        self.pos[:, 1] = 20
+        self.pos[:, 2] = self.rng.uniform(-10, 10, n)
+
+        self.vel = np.zeros((n, 3), dtype=np.float32)
+        if level == 1:
+            self.vel[:, 1] = self.rng.uniform(-1.0, -0.5, n)
+        elif level == 2:
+            self._snow_velocity(self.vel, n)
+
+        self._lines = np.empty((2 * n, 3), dtype=np.float32)
+
+    def get_state(self):
+        """
+        Copy the particles and their random generator, e.g. for a rewind snapshot.
+        Returns:
+            State for set_state()
+        """
+        return self.level, self.rng.bit_generator.state, self.pos.copy(), self.vel.copy()
+
+    def set_state(self, state):
+        """
+        Put the particles and their random generator back as get_state() copied them.
+        Args:
+            state: Value returned by get_state()
+        """
+        self.level, rng_state, pos, vel = state
+        self.rng.bit_generator.state = rng_state
+        self.pos = pos.copy()
+        self.vel = vel.copy()
+
+        if len(self._lines) != 2 * len(pos):
+            self._lines = np.empty((2 * len(pos), 3), dtype=np.float32)
+
+    def _snow_velocity(self, out, n):
+        """
+        Fill out with n random snow flake velocities.
+        """
+        out[:, 0] = self.rng.uniform(-0.02, 0.02, n)
+        out[:, 1] = self.rng.uniform(-0.7, -0.3, n)
+        out[:, 2] = self.rng.uniform(-0.02, 0.02, n)
+
+    def update(self, center_x, center_z):
+        """
+        Move all particles and respawn the ones that fell below the ground.
+        Respawned particles reappear high above the ground around (center_x, center_z).
+        Args:
+            center_x, center_z: World position the weather follows (e.g. between the cars)
+        """
+        if not len(self.pos):
+            return
+
+        self.pos += self.vel
+
+        fallen = np.flatnonzero(self.pos[:, 1] < -1)
+        n = len(fallen)
+
+        if not n:
+            return
+
+        respawn = np.empty((n, 3), dtype=np.float32)
+        respawn[:, 0] = self.rng.uniform(center_x - 5, center_x + 5, n)
+        respawn[:, 1] = 20
+        respawn[:, 2] = self.rng.uniform(center_z - 20, center_z + 20, n)
+        self.pos[fallen] = respawn
+
+        velocity = np.zeros((n, 3), dtype=np.float32)
+        if self.level == 1:
+            velocity[:, 1] = self.rng.uniform(-2.5, -1.5, n)
+        elif self.level == 2:
+            self._snow_velocity(velocity, n)
+        self.vel[fallen] = velocity
+
+    def rain_lines(self):
+        """
+        Vertex array of line segments, one streak hanging below each particle.
+        Returns:
+            (2N, 3) float32 array, reused between calls
+        """
+        self._lines[0::2] = self.pos
+        self._lines[1::2] = self.pos
+        self._lines[1::2, 1] -= RAIN_STREAK
+        return self._lines
@@ -0,0 +1,134 @@
+# Lightweight frame profiler: named timing sections with rolling percentiles.
+# Sections are inclusive, so a section nested inside another counts towards both.
+import csv
+import json
+import time
+from collections import deque
+
+
+class _Section:
+    """
+    Context manager timing one run of a named section.
+    """
+
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = self.profiler.clock()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, (self.profiler.clock() - self.start) * 1000.0)
+        return False
+
+
+class _NullSection:
+    """
+    Context manager that does nothing, used while profiling is disabled.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SECTION = _NullSection()
+
+
+def percentile(sorted_samples, p):
+    """
+    Nearest-rank percentile of already sorted samples.
+    Args:
+        sorted_samples: Non-empty sorted list of values
+        p: Percentile in the range 0-100
+    Returns:
+        The sample at that percentile
+    """
+    rank = int(round(p / 100.0 * (len(sorted_samples) - 1)))
+    return sorted_samples[rank]
+
+
+class FrameProfiler:
+    """
+    Keeps the last `window` timings of each named section in milliseconds.
+    Args:
+        window: Number of recent samples kept per section
+        clock: Callable returning seconds
+    """
+
+    def __init__(self, window=300, clock=time.perf_counter):
+        self.window = window
+        self.clock = clock
+        self.enabled = False
+        self.samples = {}  # Section name -> deque of milliseconds, in first-seen order
+
+    def section(self, name):
+        """
+        Time a block of code.
+        Args:
+            name: Section name
+        Returns:
+            Context manager; a no-op while the profiler is disabled
+        """
+        if not self.enabled:
+            return _NULL_SECTION
+
+        return _Section(self, name)
+
+    def add(self, name, ms):
+        """
+        Record one timing sample.
+        Args:
+            name: Section name
+            ms: Duration in milliseconds
+        """
+        samples = self.samples.get(name)
+
+        if samples is None:
+            samples = self.samples[name] = deque(maxlen=self.window)
+
+        samples.append(ms)
+
+    def summary(self):
+        """
+        Rolling statistics of every section.
+        Returns:
+            List of (name, count, p50, p95, p99) tuples, times in milliseconds
+        """
+        rows = []
+
+        for name, samples in self.samples.items():
+            if not samples:
+                continue
+
+            ordered = sorted(samples)
+            rows.append((name, len(ordered), percentile(ordered, 50), percentile(ordered, 95), percentile(ordered, 99)))
+
+        return rows
+
+    def dump(self, path):
+        """
+        Write the current statistics to a file.
+        Args:
+            path: Output path; a .csv extension writes CSV, anything else JSON
+        """
+        rows = self.summary()
+
+        if path.lower().endswith('.csv'):
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['section', 'samples', 'p50_ms', 'p95_ms', 'p99_ms'])
+                writer.writerows(rows)
+
+        else:
+            with open(path, 'w') as f:
+                json.dump({name: {'samples': count, 'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99}
+                           for name, count, p50, p95, p99 in rows}, f, indent=2)
@@ -2,1002 +2,388 @@
 from OpenGL.GL import *
 from OpenGL.GLU import *
 from OpenGL.GLUT import *
+import argparse
+import atexit
+import colorsys
 import math
-import random
-import time
+from contextlib import contextmanager
 
+from culling import DRAW_DISTANCE, Frustum
+from drivers import ScriptedDriver, apply_keys, observe
+from net import PORT, PollingConnection, pack_input
+from profiler import FrameProfiler
+from replay import InputRecorder
+from scenegraph import Scene
+from simulation import LEVEL_NAMES, NUM_PLAYERS, TICK_RATE, Simulation, empty_keys
+from snapshot import SnapshotRing
+from textcache import TextCache
 
-# --- GLOBAL STATE ---
-# Define track width for the racing path
-TRACK_WIDTH = 10.0
 
-# Lists to store track control points, spline points, objects, particles, and trees
-CONTROL_POINTS = []
-SPLINE_POINTS = []
-objects = []
-particles = []
-trees = []
+# --- FRONTEND STATE ---
+# The race itself lives in a headless Simulation; this module only feeds it
+# input from the GLUT callbacks and renders its state.
+sim = Simulation()
 
-# Game state variables
-game_finished = [False, False]  # Tracks if each player has finished the race
-current_level = 0  # Current level (0: Sunny, 1: Rainy, 2: Snowy)
-countdown_state = None  # Countdown state: None, 3, 2, 1, 'GO!', 'racing'
-finish_times = [None, None]
-
-countdown_start_time = 0  # Timestamp when countdown starts
-round_winners = []  # Stores winners of each round
-level_completed = False  # Flag for level completion
-
-level_complete_time = 0  # Timestamp when level is completed
-paused = False  # Pause state for the game
-health = [5.0, 5.0]  # Health for Player 1 and Player 2
-
-# Car state for two players
-position = [[0.0, 0.0, 0.0], [0.0, 0.0, 0.0]]  # Player positions (x, y, z)
-orientation = [0.0, 0.0]  # Car orientations (radians)
-velocity = [0.0, 0.0]  # Current speed for each player
-
-top_speed = 0.3  # Base maximum speed
-acceleration = 0.005  # Acceleration rate
-base_handling = 0.06  # Base handling responsiveness
-
-handling = [base_handling, base_handling]  # Current handling for each player
-slippery_end_time = [0, 0]  # Time when slippery effect ends
-BOOSTED_TOP_SPEED = top_speed * 2.0  # Boosted speed multiplier
-
-max_speed = [top_speed, top_speed]  # Current max speed for each player
-boost_end_time = [0, 0]  # Time when boost effect ends
-car_colors = [(1, 0, 0), (0, 0, 1)]  # Colors: Red for P1, Blue for P2
-camera_mode = [1, 1]  # Camera mode: 0 = first-person, 1 = third-person
+car_colors = [(1, 0, 0), (0, 0, 1)]  # Colors: Red for P1, Blue for P2, more added by set_players()
+camera_mode = [1, 1]  # Camera mode per player: 0 = first-person, 1 = third-person
+views = [0, 1]  # Players whose view is drawn, one viewport each in this order
 
 # Input state for key presses
-keys = {
-    'p1_accel': False,  # Player 1 accelerate (W)
-    'p1_left': False,   # Player 1 steer left (A)
-    'p1_right': False,  # Player 1 steer right (D)
-    'p2_accel': False,  # Player 2 accelerate (Up arrow)
-    'p2_left': False,   # Player 2 steer left (Left arrow)
-    'p2_right': False,  # Player 2 steer right (Right arrow)
-    'enter': False,     # Enter key for advancing levels
-    'restart': False    # R key for restarting game
-}
-
-
-def generate_track():
-    """
-    Generate a simple straight track along the z-axis using spline points.
-    Stores points in SPLINE_POINTS list.
-    """
-    samples = 600
-    SPLINE_POINTS.clear()
-    
-    for i in range(samples):
-        t = i / float(samples)
-        x = 0.0
-        y = 0.0
-        z = t * 150.0
-        SPLINE_POINTS.append((x, y, z))
+keys = empty_keys()
+ai_drivers = []  # (player id, Driver) for the cars without a human at the keyboard
+connection = None  # PollingConnection to a race server when playing over the network
 
+# Holding B runs the race backwards through its last REWIND_TICKS ticks, for practice
+REWIND_TICKS = TICK_RATE * 10
+REWIND_SPEED = 2  # Ticks rewound per tick of wall-clock time
+rewinding = False
 
-def generate_trees():
-    """
-    Generate trees on both sides of the track at random positions.
-    Stores tree positions in the trees list.
-    """
-    trees.clear()
-    num_trees_per_side = 30
-    
-    for _ in range(num_trees_per_side):
-        z = random.uniform(0, 150)
-        x_left = -6.0 + random.uniform(-1.0, 1.0)
-        x_right = 6.0 + random.uniform(-1.0, 1.0)
-        trees.append((x_left, 0.0, z))
-        trees.append((x_right, 0.0, z))
-
-
-# --- OBJECT PLACEMENT ---
-def generate_objects():
-    """
-    Place objects (obstacles, boosts, etc.) randomly along the track.
-    Stores objects in the objects list with type and position.
-    """
-    num_obs = 50
-    num_boost = 10
-    num_speed_down = 5
-    num_slippery = 15
-    objects.clear()
-    
-    N = len(SPLINE_POINTS)
-    picks = random.sample(range(10, N - 10), num_obs + num_boost + num_speed_down + num_slippery)
-    kinds = ['obs'] * num_obs + ['boost'] * num_boost + ['speed_down'] * num_speed_down + ['slippery'] * num_slippery
-    random.shuffle(kinds)
-    
-    for idx, kind in zip(picks, kinds):
-        x, y, z = SPLINE_POINTS[idx]
-        x = random.uniform(-TRACK_WIDTH / 2 + 0.25, TRACK_WIDTH / 2 - 0.25)
-        objects.append({'type': kind, 'pos': (x, y, z), 'active': True})
-
-
-# --- DRAW ROUTINES ---
-def draw_track():
-    """
-    Draw the track as a series of quads for the asphalt and white lines for boundaries.
-    Includes dashed center line for visual guidance.
-    """
-    # Draw asphalt track
-    glBegin(GL_QUADS)
-    glColor3f(0.2, 0.2, 0.2)  # Dark gray for asphalt
-    
-    for i in range(len(SPLINE_POINTS) - 1):
-        x1, y1, z1 = SPLINE_POINTS[i]
-        x2, y2, z2 = SPLINE_POINTS[i + 1]
-        nx, nz = -1, 0  # Normal for flat track
-        w = TRACK_WIDTH / 2
-        
-        glVertex3f(x1 + nx * w, y1, z1 + nz * w)
-        glVertex3f(x1 - nx * w, y1, z1 - nz * w)
-        glVertex3f(x2 - nx * w, y2, z2 - nz * w)
-        glVertex3f(x2 + nx * w, y2, z2 + nz * w)
-    
-    glEnd()
+# Per-subsystem frame timings, shown with F3
+profiler = FrameProfiler()
+show_profiler = False
 
-    # Draw white side lines and dashed center line
-    glColor3f(1.0, 1.0, 1.0)  # White color
-    glLineWidth(2.0)
-    glBegin(GL_LINES)
-    
-    for i in range(len(SPLINE_POINTS) - 1):
-        z1 = SPLINE_POINTS[i][2]
-        z2 = SPLINE_POINTS[i + 1][2]
-        
-        # Left side line
-        glVertex3f(-4.8, 0.01, z1)
-        glVertex3f(-4.8, 0.01, z2)
-        
-        # Right side line
-        glVertex3f(4.8, 0.01, z1)
-        glVertex3f(4.8, 0.01, z2)
-        
-        # Dashed center line
-        if (i % 10) < 5:
-            glVertex3f(0.0, 0.01, z1)
-            glVertex3f(0.0, 0.01, z2)
-    
-    glEnd()
-    glLineWidth(1.0)
+# Everything drawn in the 3D views, kept on the GPU between frames; created by init()
+scene = None
 
+# Compiled HUD strings, only recompiled when their text changes
+text_cache = TextCache()
 
-def draw_cube():
-    """
-    Draw a simple cube for obstacles and other objects.
-    """
-    glBegin(GL_QUADS)
-    vertices = [
-        (-1, -1, 1), (1, -1, 1), (1, 1, 1), (-1, 1, 1),
-        (-1, -1, -1), (1, -1, -1), (1, 1, -1), (-1, 1, -1)
-    ]
-    faces = [
-        (0, 1, 2, 3), (4, 5, 6, 7), (3, 2, 6, 7),
-        (0, 1, 5, 4), (0, 3, 7, 4), (1, 2, 6, 5)
-    ]
-    
-    for face in faces:
-        for vertex in face:
-            glVertex3f(*vertices[vertex])
-    
-    glEnd()
+# Projection passed to gluPerspective (fovy, aspect, near, far); culling uses the same values
+perspective = (45, 1.0, 0.1, 200)
+draw_distance = DRAW_DISTANCE  # Scenery further than this from the camera is culled
 
 
-def draw_car(color):
+# --- DRAW ROUTINES ---
+def car_transform(player_id):
     """
-    Draw a car model with a body, cabin, and wheels.
+    Where a car is in the world. The simulation keeps cars in track coordinates.
     Args:
-        color: RGB tuple for the car's body color
-    """
-    # Draw car body
-    glColor3f(*color)
-    glPushMatrix()
-    glScalef(1.0, 0.3, 0.5)
-    glutSolidCube(1.0)
-    glPopMatrix()
-    
-    # Draw cabin
-    glColor3f(0.7, 0.7, 1.0)
-    glPushMatrix()
-    glTranslatef(0.0, 0.35, 0.0)
-    glScalef(0.5, 0.25, 0.3)
-    glutSolidCube(1.0)
-    glPopMatrix()
-    
-    # Draw wheels
-    glColor3f(0.0, 0.0, 0.0)
-    wheel_radius = 0.2
-    wheel_width = 0.1
-    wheel_offset_x = 0.6
-    wheel_offset_z = 0.35
-    
-    for x in [-wheel_offset_x, wheel_offset_x]:
-        for z in [-wheel_offset_z, wheel_offset_z]:
-            glPushMatrix()
-            glTranslatef(x, -0.05, z)
-            glRotatef(90, 0, 1, 0)
-            glutSolidTorus(wheel_width / 2, wheel_radius, 20, 40)
-            glPopMatrix()
-
-
-def draw_objects():
-    """
-    Draw track objects (obstacles, boosts, speed-downs, slippery patches).
+        player_id: Index of the car
+    Returns:
+        ((x, y, z), yaw): world position and heading in radians
     """
-    for obj in objects:
-        if not obj['active']:
-            continue
-        
-        x, y, z = obj['pos']
-        glPushMatrix()
-        glTranslatef(x, y + 0.01, z)
-        
-        if obj['type'] == 'obs':
-            glColor3f(0.5, 0.5, 0.5)
-            glScalef(0.25, 0.25, 0.25)
-            draw_cube()
-            
-        elif obj['type'] == 'boost':
-            glColor3f(1, 1, 0)
-            glutSolidSphere(0.25, 16, 16)
-            
-        elif obj['type'] == 'speed_down':
-            glColor3f(0, 1, 0)
-            glutSolidSphere(0.25, 16, 16)
-            
-        elif obj['type'] == 'slippery':
-            glColor3f(0.6, 0.4, 0)
-            
-            glBegin(GL_QUADS)
-            glVertex3f(-0.5, 0, -0.5)
-            glVertex3f(0.5, 0, -0.5)
-            glVertex3f(0.5, 0, 0.5)
-            glVertex3f(-0.5, 0, 0.5)
-            glEnd()
-        
-        glPopMatrix()
+    lateral, height, s = sim.position[player_id]
+    return sim.track.to_world(lateral, height, s), sim.track.heading(s) + sim.orientation[player_id]
 
 
-def draw_tree(x, y, z):
+@contextmanager
+def screen_space(width, height):
     """
-    Draw a tree with a trunk and simple pyramid-shaped foliage.
+    Temporarily switch to a 2D orthographic projection for overlays and text.
     Args:
-        x, y, z: Position of the tree
+        width, height: Size of the coordinate space in pixels
     """
+    glMatrixMode(GL_PROJECTION)
     glPushMatrix()
-    glTranslatef(x, y, z)
-    
-    # Draw trunk
-    glColor3f(0.5, 0.35, 0.05)  # Brown
-    glPushMatrix()
-    glTranslatef(0, 0.5, 0)
-    glScalef(0.2, 1.0, 0.2)
-    glutSolidCube(1.0)
-    glPopMatrix()
-    
-    # Draw foliage (pyramid shape using triangles)
-    glColor3f(0.0, 0.6, 0.0)  # Dark green
-    glBegin(GL_TRIANGLES)
-    # Front
-    glVertex3f(-1.0, 0.0, 0.0)
-    glVertex3f(1.0, 0.0, 0.0)
-    glVertex3f(0.0, 3.0, 0.0)
-    # Back (corrected to avoid duplicate vertices)
-    glVertex3f(1.0, 0.0, 0.0)
-    glVertex3f(-1.0, 0.0, 0.0)
-    glVertex3f(0.0, 3.0, 0.0)
-    # Left
-    glVertex3f(0.0, 0.0, -1.0)
-    glVertex3f(0.0, 0.0, 1.0)
-    glVertex3f(0.0, 3.0, 0.0)
-    # Right
-    glVertex3f(0.0, 0.0, 1.0)
-    glVertex3f(0.0, 0.0, -1.0)
-    glVertex3f(0.0, 3.0, 0.0)
-    glEnd()
-    
-    glPopMatrix()
-
-
-def draw_trees():
-    """
-    Draw all trees in the scene.
-    """
-    for tree_pos in trees:
-        draw_tree(*tree_pos)
-
-
-def draw_particles():
-    """
-    Draw weather particles (rain or snow) based on the current level.
-    """
-    if current_level == 1:  # Rainy level
-        glColor3f(0.5, 0.5, 1.0)
-        glBegin(GL_LINES)
-        for p in particles:
-            x, y, z = p['pos']
-            glVertex3f(x, y, z)
-            glVertex3f(x, y - 1.0, z)
-        glEnd()
-        
-    elif current_level == 2:  # Snowy level
-        glColor3f(1.0, 1.0, 1.0)
-        glPointSize(3.0)
-        glBegin(GL_POINTS)
-        for p in particles:
-            x, y, z = p['pos']
-            glVertex3f(x, y, z)
-            
-        glEnd()
-        glPointSize(1.0)
-
-
-def draw_sun():
-    """
-    Draw a sun with rays for the sunny level.
-    """
+    glLoadIdentity()
+    glOrtho(0, width, 0, height, -1, 1)
+    glMatrixMode(GL_MODELVIEW)
     glPushMatrix()
-    glTranslatef(0, 15, 150)
-    glColor3f(1.0, 1.0, 0.0)
-    glutSolidSphere(2.0, 20, 20)
-    glBegin(GL_LINES)
-    
-    for i in range(12):
-        angle = math.radians(i * 30)
-        x = math.cos(angle) * 4.0
-        y = math.sin(angle) * 4.0
-        glVertex3f(0, 0, 0)
-        glVertex3f(x, y, 0)
-    
-    glEnd()
-    glPopMatrix()
-
-
-def draw_sky():
-    """
-    Draw a gradient sky background based on the current level.
-    """
-    glDisable(GL_DEPTH_TEST)
-    glBegin(GL_QUADS)
-    
-    if current_level == 0:  # Sunny
-        glColor3f(0.529, 0.808, 0.922)  # Light blue at top
-        glVertex3f(-100, 100, -100)
-        glVertex3f(100, 100, -100)
-        glColor3f(0.678, 0.847, 0.902)  # Lighter blue at bottom
-        glVertex3f(100, 0, -100)
-        glVertex3f(-100, 0, -100)
-        
-    elif current_level == 1:  # Rainy
-        glColor3f(0.4, 0.4, 0.4)  # Dark gray at top
-        glVertex3f(-100, 100, -100)
-        glVertex3f(100, 100, -100)
-        glColor3f(0.6, 0.6, 0.6)  # Lighter gray at bottom
-        glVertex3f(100, 0, -100)
-        glVertex3f(-100, 0, -100)
-        
-    elif current_level == 2:  # Snowy
-        glColor3f(0.7, 0.7, 0.7)  # Gray at top
-        glVertex3f(-100, 100, -100)
-        glVertex3f(100, 100, -100)
-        glColor3f(0.9, 0.9, 0.9)  # Almost white at bottom
-        glVertex3f(100, 0, -100)
-        glVertex3f(-100, 0, -100)
+    glLoadIdentity()
     
-    glEnd()
-    glEnable(GL_DEPTH_TEST)
+    try:
+        yield
+    finally:
+        glPopMatrix()
+        glMatrixMode(GL_PROJECTION)
+        glPopMatrix()
+        glMatrixMode(GL_MODELVIEW)
 
 
-def draw_text(x, y, text):
+def draw_text(x, y, text, slot=None, font='helvetica18'):
     """
-    Draw 2D text on the screen using GLUT bitmap characters.
+    Draw 2D text in the current screen space projection from cached display lists.
     Args:
         x, y: Screen coordinates for text position
         text: String to display
+        slot: Cache key for this place on screen; defaults to the text itself
+        font: Font name from textcache.FONTS
     """
-    glMatrixMode(GL_PROJECTION)
-    glPushMatrix()
-    glLoadIdentity()
-    glOrtho(0, 800, 0, 600, -1, 1)
-    glMatrixMode(GL_MODELVIEW)
-    glPushMatrix()
-    glLoadIdentity()
-    glRasterPos2f(x, y)
-    
-    for char in text:
-        glutBitmapCharacter(GLUT_BITMAP_HELVETICA_18, ord(char))
-    
-    glPopMatrix()
-    glMatrixMode(GL_PROJECTION)
-    glPopMatrix()
-    glMatrixMode(GL_MODELVIEW)
+    text_cache.draw(text if slot is None else slot, x, y, text, font)
 
 
 def draw_countdown():
     """
     Display the countdown timer (3, 2, 1, GO!) at the start of each level.
-    Updates countdown_state based on elapsed time.
+    The countdown itself is advanced by the simulation.
     """
-    global countdown_state, countdown_start_time
-    
+    countdown_state = sim.countdown_state
+
     if countdown_state is None or countdown_state == 'racing':
         return
-    
-    current_time = time.time()
-    elapsed = current_time - countdown_start_time
-    
-    if countdown_state == 3 and elapsed > 1:
-        countdown_state = 2
-        countdown_start_time = current_time
-        
-    elif countdown_state == 2 and elapsed > 1:
-        countdown_state = 1
-        countdown_start_time = current_time
-        
-    elif countdown_state == 1 and elapsed > 1:
-        countdown_state = 'GO!'
-        countdown_start_time = current_time
-        
-    elif countdown_state == 'GO!' and elapsed > 1:
-        countdown_state = 'racing'
-    
-    if countdown_state != 'racing':
-        
-        glMatrixMode(GL_PROJECTION)
-        glPushMatrix()
-        glLoadIdentity()
-        glOrtho(0, 800, 0, 600, -1, 1)
-        glMatrixMode(GL_MODELVIEW)
-        glPushMatrix()
-        glLoadIdentity()
+
+    with screen_space(800, 600):
         glColor3f(1, 1, 1)
-        
         text = str(countdown_state) if countdown_state != 'GO!' else 'GO!'
-        glRasterPos2f(400 - len(text) * 14 / 2, 300)
-        
-        for char in text:
-            glutBitmapCharacter(GLUT_BITMAP_TIMES_ROMAN_24, ord(char))
-        
-        glPopMatrix()
-        glMatrixMode(GL_PROJECTION)
-        glPopMatrix()
-        glMatrixMode(GL_MODELVIEW)
+        draw_text(400 - len(text) * 14 / 2, 300, text, 'countdown', 'times24')
 
 
 def draw_pause_overlay():
     """
     Display a 'PAUSED' overlay when the game is paused.
     """
-    if paused:
-        glMatrixMode(GL_PROJECTION)
-        glPushMatrix()
-        glLoadIdentity()
-        glOrtho(0, 800, 0, 600, -1, 1)
-        glMatrixMode(GL_MODELVIEW)
-        glPushMatrix()
-        glLoadIdentity()
-        glColor3f(1, 1, 1)
-        
-        text = "PAUSED"
-        glRasterPos2f(400 - len(text) * 14 / 2, 300)
-        
-        for char in text:
-            glutBitmapCharacter(GLUT_BITMAP_TIMES_ROMAN_24, ord(char))
-        
-        glPopMatrix()
-        glMatrixMode(GL_PROJECTION)
-        glPopMatrix()
-        glMatrixMode(GL_MODELVIEW)
+    if sim.paused:
+        with screen_space(800, 600):
+            glColor3f(1, 1, 1)
+            text = "PAUSED"
+            draw_text(400 - len(text) * 14 / 2, 300, text, font='times24')
 
 
 def show_overall_winner():
     """
     Display the overall winner after all levels are completed.
     """
-    p1_wins = round_winners.count(0)
-    p2_wins = round_winners.count(1)
-    winner_text = "Player 1 Won!" if p1_wins > p2_wins else "Player 2 Won!" if p2_wins > p1_wins else "It's a Tie!"
-    
-    glMatrixMode(GL_PROJECTION)
-    glPushMatrix()
-    glLoadIdentity()
+    wins = [sim.round_winners.count(i) for i in range(sim.num_players)]
+    best = max(wins)
+    winner_text = f"Player {wins.index(best) + 1} Won!" if wins.count(best) == 1 else "It's a Tie!"
     
-    glOrtho(0, 800, 0, 600, -1, 1)
-    glMatrixMode(GL_MODELVIEW)
-    glPushMatrix()
-    
-    glLoadIdentity()
-    glColor3f(1, 1, 1)
-    draw_text(400 - len(winner_text) * 9 / 2, 300, winner_text)
-    draw_text(400 - len("Press R to Restart") * 7 / 2, 280, "Press R to Restart")
-    
-    glPopMatrix()
-    glMatrixMode(GL_PROJECTION)
-    glPopMatrix()
-    glMatrixMode(GL_MODELVIEW)
-
-
-# --- PHYSICS & COLLISION ---
-def aabb_collide(min1, max1, min2, max2):
-    """
-    Check for collision between two axis-aligned bounding boxes.
-    Args:
-        min1, max1: Min and max coordinates of first box
-        min2, max2: Min and max coordinates of second box
-    Returns:
-        Boolean indicating if the boxes intersect
-    """
-    return all(min1[i] < max2[i] and max1[i] > min2[i] for i in range(3))
+    with screen_space(800, 600):
+        glColor3f(1, 1, 1)
+        draw_text(400 - len(winner_text) * 9 / 2, 300, winner_text, 'winner')
+        draw_text(400 - len("Press R to Restart") * 7 / 2, 280, "Press R to Restart")
 
 
-def check_collisions(player_id):
+# --- SPLIT SCREEN RENDERING ---
+def set_players(num_players):
     """
-    Check for collisions between a player and track objects.
-    Updates player state (health, speed, handling) based on collisions.
+    Size the per-player frontend state for a race.
+    Players beyond the first two get colors spread around the hue circle.
     Args:
-        player_id: 0 for Player 1, 1 for Player 2
+        num_players: Number of cars in the race
     """
-    global velocity, max_speed, boost_end_time, handling, health
-    
-    cx, cy, cz = position[player_id]
-    car_min = (cx - 0.1, cy - 0.1, cz - 0.1)
-    car_max = (cx + 0.1, cy + 0.1, cz + 0.1)
-    
-    
-    t = glutGet(GLUT_ELAPSED_TIME)
-    opponent_id = 1 if player_id == 0 else 0
+    del car_colors[num_players:]
     
+    for i in range(len(car_colors), num_players):
+        car_colors.append(colorsys.hsv_to_rgb((i - 2) / max(num_players - 2, 1) * 0.9 + 0.1, 0.9, 1.0))
     
-    for obj in objects:
-        
-        if not obj['active']:
-            continue
-        
-        x, y, z = obj['pos']
-        
-        
-        if obj['type'] == 'slippery':
-            o_min = (x - 0.5, y - 0.1, z - 0.5)
-            o_max = (x + 0.5, y + 0.1, z + 0.5)
-            
-        else:
-            o_min = (x - 0.125, y - 0.125, z - 0.125)
-            o_max = (x + 0.125, y + 0.125, z + 0.125)
-        
-        
-        if aabb_collide(car_min, car_max, o_min, o_max):
-            
-            if obj['type'] == 'obs':
-                
-                health[player_id] -= 1.0
-                max_speed[player_id] *= 0.9
-                velocity[player_id] = 0.0
-                
-                if health[player_id] <= 0:
-                    
-                    health[player_id] = 0
-                    max_speed[player_id] *= 0.1
-                    
-            elif obj['type'] == 'boost':
-                
-                max_speed[player_id] = BOOSTED_TOP_SPEED
-                boost_end_time[player_id] = t + 2000
-                
-                
-            elif obj['type'] == 'speed_down':
-                velocity[opponent_id] *= 0.2
-                
-            elif obj['type'] == 'slippery':
-                
-                handling[player_id] = base_handling * 0.3
-                slippery_end_time[player_id] = t + 2000
-                
-            obj['active'] = False
-    
-    if boost_end_time[player_id] and t > boost_end_time[player_id]:
-        
-        max_speed[player_id] = top_speed if health[player_id] > 0 else max_speed[player_id]
-        boost_end_time[player_id] = 0
-    
-    if slippery_end_time[player_id] and t > slippery_end_time[player_id]:
-        
-        handling[player_id] = base_handling
-        slippery_end_time[player_id] = 0
+    camera_mode[:] = camera_mode[:num_players] + [1] * (num_players - len(camera_mode))
+    views[:] = range(num_players)
 
 
-def check_car_collision():
+def viewport_grid(num_players):
     """
-    Check for collisions between the two player cars.
-    Randomly selects a loser to stop and pushes cars apart.
+    Columns and rows of the split-screen layout: side by side for two players,
+    otherwise the squarest grid that fits everyone.
+    Args:
+        num_players: Number of views
+    Returns:
+        (columns, rows)
     """
-    p1_x, p1_y, p1_z = position[0]
-    p2_x, p2_y, p2_z = position[1]
-    
-    dx = p1_x - p2_x
-    dz = p1_z - p2_z
-
-    dist_squared = dx * dx + dz * dz
-    
-    if dist_squared < 0.04:
-        
-        loser = random.choice([0, 1])
-        velocity[loser] = 0.0
-        
-        push_dir = 0.05 if dx < 0 else -0.05
-        
-        position[0][0] += push_dir
-        position[1][0] -= push_dir
+    columns = math.ceil(math.sqrt(num_players))
+    return columns, math.ceil(num_players / columns)
 
 
-def update_physics():
+def viewport_rect(player_id, width, height):
     """
-    Update game physics: car movement, collisions, and particle positions.
-    Handles level completion and progression logic.
+    Window rectangle of a player's view, filling the grid left to right from the top.
+    Args:
+        player_id: Index of the player
+        width, height: Window dimensions
+    Returns:
+        (x, y, width, height) as passed to glViewport
     """
-    global position, velocity, game_finished, level_completed, level_complete_time, current_level, round_winners, countdown_state
-    
-    if paused or countdown_state != 'racing':
-        return
-    
-    check_car_collision()
-    
-    for player_id in range(2):
-        
-        if game_finished[player_id]:
-            continue
-        
-        check_collisions(player_id)
-        
-        accel_key = 'p1_accel' if player_id == 0 else 'p2_accel'
-        left_key = 'p1_left' if player_id == 0 else 'p2_left'
-        right_key = 'p1_right' if player_id == 0 else 'p2_right'
-        
-        
-        if keys[accel_key]:
-            
-            velocity[player_id] += acceleration
-            
-        else:
-            
-            velocity[player_id] -= acceleration / 2 if velocity[player_id] > 0 else 0
-        
-        velocity[player_id] = max(0, min(max_speed[player_id], velocity[player_id]))
-        
-        if keys[left_key]:
-            
-            position[player_id][0] += handling[player_id]
-            
-        if keys[right_key]:
-            
-            position[player_id][0] -= handling[player_id]
-        
-        new_x = max(-TRACK_WIDTH / 2 + 0.1, min(TRACK_WIDTH / 2 - 0.1, position[player_id][0]))
-        
-        
-        if new_x != position[player_id][0]:
-            velocity[player_id] *= 0.9
-            
-        position[player_id][0] = new_x
-        position[player_id][2] += velocity[player_id]
-        
-        if position[player_id][2] >= 150.0:
-            finish_times[player_id] = time.time()
-            game_finished[player_id] = True
-    
-    if all(game_finished) and not level_completed:
-        
-        level_completed = True
-        level_complete_time = glutGet(GLUT_ELAPSED_TIME)
-        
-        if finish_times[0] < finish_times[1]:
-            round_winners.append(0)  
-        elif finish_times[1] < finish_times[0]:
-            round_winners.append(1)  
-            
-        else:
-            round_winners.append(-1) # Tie
-    
-    if level_completed and keys['enter'] and current_level < 2:
-        next_level()
-    
-    if level_completed and current_level == 2 and keys['restart']:
-        restart_game()
-    
-    for p in particles:
-        p['pos'][0] += p['vel'][0]
-        p['pos'][1] += p['vel'][1]
-        p['pos'][2] += p['vel'][2]
-        
-        
-        avg_z = (position[0][2] + position[1][2]) / 2
-        
-        if p['pos'][1] < -1:
-            
-            p['pos'] = [random.uniform(-5, 5), 20, random.uniform(max(0, avg_z - 20), min(150, avg_z + 20))]
-            
-            if current_level == 1:
-                p['vel'] = [0, random.uniform(-2.5, -1.5), 0]
-                
-            elif current_level == 2:
-                p['vel'] = [random.uniform(-0.02, 0.02), random.uniform(-0.7, -0.3), random.uniform(-0.02, 0.02)]
+    columns, rows = viewport_grid(len(views))
+    cell_width = width // columns
+    cell_height = height // rows
+    row, column = divmod(views.index(player_id), columns)
+    return column * cell_width, (rows - 1 - row) * cell_height, cell_width, cell_height
 
 
-# --- LEVEL MANAGEMENT ---
-def set_level_properties(level):
+def setup_viewport(player_id, width, height):
     """
-    Set properties (handling, particles) for the current level.
+    Set up the viewport for split-screen rendering.
     Args:
-        level: Integer (0: Sunny, 1: Rainy, 2: Snowy)
+        player_id: Index of the player whose view is drawn
+        width, height: Window dimensions
     """
-    global base_handling, handling, particles
-    
-    if level == 0:
-        base_handling = 0.06
-        particles = []
-        
-    elif level == 1:
-        
-        base_handling = 0.03
-        particles = [{'pos': [random.uniform(-10, 10), 20, random.uniform(-10, 10)],
-                      'vel': [0, random.uniform(-1.0, -0.5), 0]} for _ in range(150)]
-        
-    elif level == 2:
-        
-        base_handling = 0.12
-        particles = [{'pos': [random.uniform(-10, 10), 20, random.uniform(-10, 10)],
-                      'vel': [random.uniform(-0.02, 0.02), random.uniform(-0.7, -0.3), random.uniform(-0.02, 0.02)]} for _ in range(150)]
-    
-    handling = [base_handling, base_handling]
+    glViewport(*viewport_rect(player_id, width, height))
 
 
-def next_level():
+def player_camera(player_id):
     """
-    Advance to the next level, resetting game state and generating new objects.
+    Place a player's camera behind (or, in first-person, inside) their car.
+    Args:
+        player_id: Index of the player
+    Returns:
+        (eye, center) positions as passed to gluLookAt
     """
-    global current_level, game_finished, position, velocity, max_speed, boost_end_time, level_completed, countdown_state, countdown_start_time, health, slippery_end_time, finish_times
-    
-    current_level += 1
-    game_finished = [False, False]
-    position = [[-TRACK_WIDTH / 4, 0.0, 0.0], [TRACK_WIDTH / 4, 0.0, 0.0]]
-    
-    velocity = [0.0, 0.0]
-    max_speed = [top_speed, top_speed]
-    boost_end_time = [0, 0]
+    (px, py, pz), yaw = car_transform(player_id)
+    cos_o = math.cos(yaw)
+    sin_o = math.sin(yaw)
     
-    slippery_end_time = [0, 0]
-    health = [5.0, 5.0]
-    level_completed = False
-    finish_times = [None, None] 
-    
-    set_level_properties(current_level)
-    generate_objects()
-    generate_trees()
-    
-    countdown_state = 3
-    countdown_start_time = time.time()
-
-
-def restart_game():
-    """
-    Restart the entire game, resetting all levels and state.
-    """
-    global current_level, round_winners, countdown_state, countdown_start_time, health
+    if camera_mode[player_id] == 0:  # First-person
+        eye = (px + 0.3 * sin_o, py + 0.1, pz + 0.3 * cos_o)
+        center = (px + 0.8 * sin_o, py + 0.1, pz + 0.8 * cos_o)
+    else:  # Third-person
+        eye = (px - 6.0 * sin_o, py + 2.5, pz - 6.0 * cos_o)
+        center = (px + 5.0 * sin_o, py + 0.5, pz + 5.0 * cos_o)
     
-    current_level = -1
-    round_winners = []
-    health = [5.0, 5.0]
-    next_level()
+    return eye, center
 
 
-# --- SPLIT SCREEN RENDERING ---
-def setup_viewport(player_id, width, height):
+def draw_player_view(player_id, width, height, eye, center, commands):
     """
-    Set up the viewport for split-screen rendering.
+    Render the 3D view of a single player by replaying the frame's prepared draw list with their camera.
     Args:
-        player_id: 0 for left side (Player 1), 1 for right side (Player 2)
-        width, height: Window dimensions
-    """
-    if player_id == 0:
-        glViewport(0, 0, width // 2, height)
-        
-    else:
-        glViewport(width // 2, 0, width // 2, height)
-
-
-def draw_player_view(player_id, width, height):
-    """
-    Render the view for a single player, including the track, cars, and HUD.
-    Args:
-        player_id: 0 for Player 1, 1 for Player 2
+        player_id: Index of the player whose view is drawn
         width, height: Window dimensions
+        eye, center: Camera placement from player_camera()
+        commands: Draw list from Scene.prepare()
     """
     setup_viewport(player_id, width, height)
     
     # Set background color based on level
-    if current_level == 0:
+    if sim.current_level == 0:
         glClearColor(0.529, 0.808, 0.922, 1.0)
         # Sunny
-    elif current_level == 1:
+    elif sim.current_level == 1:
         glClearColor(0.5, 0.5, 0.5, 1.0)
         # Rainy
-    elif current_level == 2:
+    elif sim.current_level == 2:
         glClearColor(0.8, 0.8, 0.8, 1.0) 
         # Snowy
     
-    if player_id == 0:
+    if player_id == views[0]:
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         
     else:
         glClear(GL_DEPTH_BUFFER_BIT)
     
     glLoadIdentity()
-    px, py, pz = position[player_id]
-    cos_o = math.cos(orientation[player_id])
-    sin_o = math.sin(orientation[player_id])
+    gluLookAt(*eye, *center, 0, 1, 0)
+    scene.replay(commands)
+
+
+def draw_player_hud(player_id, width, height):
+    """
+    Draw a player's HUD (name, speed, level, health) in their part of the window.
+    Args:
+        player_id: Index of the player
+        width, height: Window dimensions
+    """
+    _, _, viewport_width, viewport_height = viewport_rect(player_id, width, height)
     
-    # Set up camera
-    if camera_mode[player_id] == 0:  # First-person
-        eye_x = px + 0.3 * sin_o
-        eye_y = py + 0.1
-        eye_z = pz + 0.3 * cos_o
-        
-        center_x = px + 0.8 * sin_o
-        center_y = py + 0.1
-        center_z = pz + 0.8 * cos_o
-        
-        gluLookAt(eye_x, eye_y, eye_z, center_x, center_y, center_z, 0, 1, 0)
-    else:  # Third-person
-        eye_x = px - 4.0 * sin_o
-        eye_y = py + 2.5
-        eye_z = pz - 6.0 * cos_o
+    with screen_space(viewport_width, viewport_height):
+        glColor3f(*car_colors[player_id])
         
-        center_x = px
-        center_y = py + 0.5
-        center_z = pz + 5.0
-        
-        
-        gluLookAt(eye_x, eye_y, eye_z, center_x, center_y, center_z, 0, 1, 0)
-    
-    # Draw scene components
-    draw_sky()
-    
-    glColor3f(0.0, 0.5, 0.0)
-    glBegin(GL_QUADS)
-    glVertex3f(-10, -0.01, 0)
-    glVertex3f(10, -0.01, 0)
-    glVertex3f(10, -0.01, 150)
-    glVertex3f(-10, -0.01, 150)
-    glEnd()
-    
-    draw_track()
-    draw_trees()
-    draw_particles()
-    draw_objects()
-    
-    for i in range(2):
-        glPushMatrix()
-        glTranslatef(*position[i])
-        draw_car(car_colors[i])
-        glPopMatrix()
-    
-    if current_level == 0:
-        draw_sun()
-    
-    # Draw HUD
-    viewport_width = width // 2
-    viewport_height = height
-    
-    glMatrixMode(GL_PROJECTION)
-    glPushMatrix()
-    glLoadIdentity()
-    glOrtho(0, viewport_width, 0, viewport_height, -1, 1)
-    glMatrixMode(GL_MODELVIEW)
-    glPushMatrix()
-    glLoadIdentity()
-    
-    glColor3f(*car_colors[player_id])
-    
-    player_text = f"Player {player_id + 1}"
-    x_pos = 10
-    y_pos = viewport_height - 20
-    
-    glRasterPos2f(x_pos, y_pos)
-    
-    for char in player_text:
-        glutBitmapCharacter(GLUT_BITMAP_HELVETICA_18, ord(char))
-    
-    speed_text = f"Speed: {int(velocity[player_id] * 1000)}"
-    
-    glRasterPos2f(x_pos, y_pos - 20)
-    
-    for char in speed_text:
-        glutBitmapCharacter(GLUT_BITMAP_HELVETICA_18, ord(char))
-    
-    health_text = f"Health: {int(health[player_id])}/5"
-    
-    glRasterPos2f(x_pos, y_pos - 60)
-    
-    for char in health_text:
-        glutBitmapCharacter(GLUT_BITMAP_HELVETICA_18, ord(char))
-    
-    level_names = ["Sunny", "Rainy", "Snowy"]
-    level_text = f"Level: {current_level + 1} ({level_names[current_level]})"
-    glRasterPos2f(x_pos, y_pos - 40)
-    
-    for char in level_text:
-        glutBitmapCharacter(GLUT_BITMAP_HELVETICA_18, ord(char))
-    
-    if game_finished[player_id] and current_level < 2:
+        x_pos = 10
+        y_pos = viewport_height - 20
         
-        finish_text = "FINISHED! Press Enter"
-        glColor3f(1, 1, 0)
-        x_pos = viewport_width // 2 - 50
-        y_pos = viewport_height // 2
+        draw_text(x_pos, y_pos, f"Player {player_id + 1}")
+        draw_text(x_pos, y_pos - 20, f"Speed: {int(sim.velocity[player_id] * 1000)}", ('speed', player_id))
+        draw_text(x_pos, y_pos - 60, f"Health: {int(sim.health[player_id])}/5", ('health', player_id))
+        draw_text(x_pos, y_pos - 40, f"Level: {sim.current_level + 1} ({LEVEL_NAMES[sim.current_level]})", 'level')
         
-        glRasterPos2f(x_pos, y_pos)
-        for char in finish_text:
-            glutBitmapCharacter(GLUT_BITMAP_HELVETICA_18, ord(char))
-    
-    glPopMatrix()
-    glMatrixMode(GL_PROJECTION)
-    glPopMatrix()
-    glMatrixMode(GL_MODELVIEW)
+        if sim.game_finished[player_id] and sim.current_level < 2:
+            glColor3f(1, 1, 0)
+            draw_text(viewport_width // 2 - 50, viewport_height // 2, "FINISHED! Press Enter")
+
+
+def draw_overlays(width, height):
+    """
+    Draw the screen dividers and the full-window overlays (countdown, pause, results).
+    Args:
+        width, height: Window dimensions
+    """
+    glViewport(0, 0, width, height)
+    columns, rows = viewport_grid(len(views))
     
-    # Draw center line and overlays for Player 2's view
-    if player_id == 1:
-        glViewport(0, 0, width, height)
-        glMatrixMode(GL_PROJECTION)
-        glPushMatrix()
-        glLoadIdentity()
-        glOrtho(0, width, 0, height, -1, 1)
-        glMatrixMode(GL_MODELVIEW)
-        glPushMatrix()
-        glLoadIdentity()
+    with screen_space(width, height):
         glColor3f(1, 1, 1)
         glBegin(GL_LINES)
-        glVertex2f(width // 2, 0)
-        glVertex2f(width // 2, height)
+        for column in range(1, columns):
+            glVertex2f(column * (width // columns), 0)
+            glVertex2f(column * (width // columns), height)
+        for row in range(1, rows):
+            glVertex2f(0, row * (height // rows))
+            glVertex2f(width, row * (height // rows))
         glEnd()
         
         draw_countdown()
         draw_pause_overlay()
         
-        if all(game_finished) and current_level < 2:
-            
+        if rewinding and sim.history is not None:
+            glColor3f(1, 1, 0)
+            draw_text(width // 2 - 40, height - 40, "<< REWIND")
+        
+        if all(sim.game_finished) and sim.current_level < 2:
             glColor3f(1, 1, 1)
             progression_text = "Press Enter for Next Level"
             text_width = len(progression_text) * 9
-            x_pos = width // 2 - text_width // 2
-            y_pos = height // 2
-            
-            glRasterPos2f(x_pos, y_pos)
-            for char in progression_text:
-                glutBitmapCharacter(GLUT_BITMAP_HELVETICA_18, ord(char))
+            draw_text(width // 2 - text_width // 2, height // 2, progression_text)
         
-        if all(game_finished) and current_level == 2:
+        if all(sim.game_finished) and sim.current_level == 2:
             show_overall_winner()
-        
-        glPopMatrix()
-        glMatrixMode(GL_PROJECTION)
-        glPopMatrix()
-        glMatrixMode(GL_MODELVIEW)
 
 
 # --- GLUT CALLBACKS ---
 def display():
     """
-    Main display callback to render the split-screen views for both players.
+    Main display callback to render the split-screen views of all players.
     """
     width = glutGet(GLUT_WINDOW_WIDTH)
     height = glutGet(GLUT_WINDOW_HEIGHT)
-    draw_player_view(0, width, height)
-    draw_player_view(1, width, height)
-    glutSwapBuffers()
+    render_frame(width, height)
+    
+    if show_profiler:
+        draw_profiler_overlay(width, height)
+    
+    with profiler.section('swap_buffers'):
+        glutSwapBuffers()
+
+
+def render_frame(width, height, hud=True):
+    """
+    Render every player's split-screen view into the current GL context.
+    Args:
+        width, height: Size of the framebuffer
+        hud: Whether to draw the HUD text (needs GLUT's bitmap fonts)
+    """
+    with profiler.section('display'):
+        with profiler.section('update_scene'):
+            scene.update(sim, [car_transform(i) + (car_colors[i],) for i in range(sim.num_players)])
+        
+        # The world is culled and sorted once for all cameras, then replayed in every viewport
+        cameras = [player_camera(i) for i in views]
+        
+        with profiler.section('prepare_scene'):
+            commands = scene.prepare([Frustum(eye, center, (0, 1, 0), *perspective, draw_distance=draw_distance)
+                                      for eye, center in cameras])
+        
+        for player_id, (eye, center) in zip(views, cameras):
+            with profiler.section('draw_player_view'):
+                draw_player_view(player_id, width, height, eye, center, commands)
+        
+        if not hud:
+            return
+        
+        with profiler.section('hud_text'):
+            for player_id in views:
+                setup_viewport(player_id, width, height)
+                draw_player_hud(player_id, width, height)
+            
+            draw_overlays(width, height)
+
+
+def draw_profiler_overlay(width, height):
+    """
+    Draw the rolling p50/p95/p99 of every profiled section in the top middle of the window.
+    Args:
+        width, height: Window dimensions
+    """
+    glViewport(0, 0, width, height)
+    
+    with screen_space(width, height):
+        glColor3f(1, 1, 0)
+        
+        lines = ["section            p50     p95     p99 (ms)"]
+        for name, count, p50, p95, p99 in profiler.summary():
+            lines.append(f"{name:<18} {p50:6.2f}  {p95:6.2f}  {p99:6.2f}")
+        
+        y_pos = height - 20
+        for row, line in enumerate(lines):
+            draw_text(width // 2 - 150, y_pos, line, ('profiler', row), 'mono15')
+            y_pos -= 16
 
 
 def reshape(width, height):
@@ -1006,28 +392,53 @@ def reshape(width, height):
     Args:
         width, height: New window dimensions
     """
+    global perspective
+    
+    columns, rows = viewport_grid(len(views))
+    perspective = (45, (width / columns) / max(height / rows, 1), 0.1, 200)
     glMatrixMode(GL_PROJECTION)
     glLoadIdentity()
-    gluPerspective(45, (width / 2) / height, 0.1, 200)
+    gluPerspective(*perspective)
     glMatrixMode(GL_MODELVIEW)
 
 
 def idle():
     """
-    Idle callback to update physics and trigger redraw.
-    """
-    update_physics()
+    Idle callback to run the due simulation ticks and trigger redraw.
+    """
+    with profiler.section('update_physics'):
+        if connection is not None:
+            # The server runs the race; the local simulation only predicts it
+            connection.poll(pack_input(keys['p1_accel'], keys['p1_left'], keys['p1_right'], keys['enter'],
+                                       keys['restart']))
+        elif rewinding and sim.history is not None:
+            # Let the clock run without simulating, and go back by the ticks that would have run
+            paused = sim.paused
+            sim.paused = True
+            ticks = sim.update(keys)
+            sim.paused = paused
+            if not paused:
+                sim.history.rewind(sim, ticks * REWIND_SPEED)
+        else:
+            for player_id, driver in ai_drivers:
+                apply_keys(keys, sim.key_names[player_id], driver.act(observe(sim, player_id)))
+            sim.update(keys)
     glutPostRedisplay()
 
 
 def special_down(k, x, y):
     """
-    Handle special key presses (arrow keys) for Player 2.
+    Handle special key presses (arrow keys) for Player 2, and F3 for the profiler overlay.
     Args:
         k: Key code
         x, y: Mouse coordinates (unused)
     """
-    if k == GLUT_KEY_UP:
+    global show_profiler
+    
+    if k == GLUT_KEY_F3:
+        show_profiler = not show_profiler
+        profiler.enabled = profiler.enabled or show_profiler
+    elif k == GLUT_KEY_UP:
         keys['p2_accel'] = True
     elif k == GLUT_KEY_LEFT:
         keys['p2_left'] = True
@@ -1057,10 +468,10 @@ def keyboard_down(k, x, y):
         k: Key code
         x, y: Mouse coordinates (unused)
     """
-    global camera_mode, paused
+    global rewinding
     
     if k == b'c' or k == b'C':
-        camera_mode[0] = (camera_mode[0] + 1) % 2
+        camera_mode[views[0]] = (camera_mode[views[0]] + 1) % 2
     elif k == b'v' or k == b'V':
         camera_mode[1] = (camera_mode[1] + 1) % 2
     elif k == b'w' or k == b'W':
@@ -1073,8 +484,10 @@ def keyboard_down(k, x, y):
         keys['enter'] = True
     elif k == b'r' or k == b'R':
         keys['restart'] = True
-    elif k == b'p' or k == b'P':
-        paused = not paused
+    elif (k == b'p' or k == b'P') and connection is None:
+        sim.paused = not sim.paused
+    elif k == b'b' or k == b'B':
+        rewinding = True
 
 
 def keyboard_up(k, x, y):
@@ -1084,6 +497,8 @@ def keyboard_up(k, x, y):
         k: Key code
         x, y: Mouse coordinates (unused)
     """
+    global rewinding
+    
     if k == b'w' or k == b'W':
         keys['p1_accel'] = False
     elif k == b'a' or k == b'A':
@@ -1094,58 +509,129 @@ def keyboard_up(k, x, y):
         keys['enter'] = False
     elif k == b'p' or k == b'P':
         keys['restart'] = False
+    elif k == b'b' or k == b'B':
+        rewinding = False
 
 
 # --- INITIALIZATION ---
 def init():
     """
-    Initialize OpenGL settings for depth testing and projection.
+    Initialize OpenGL settings for depth testing and projection, and the scene's GPU buffers.
     """
+    global scene
+    
+    scene = Scene(profiler)
     glEnable(GL_DEPTH_TEST)
     glMatrixMode(GL_PROJECTION)
     gluPerspective(45, 1500 / 900, 0.1, 500)
     glMatrixMode(GL_MODELVIEW)
 
 
-def init_game():
+def parse_args():
     """
-    Initialize game state, track, objects, and countdown.
+    Parse the command line options of the game.
+    Returns:
+        argparse.Namespace with seed, record, profile_out, endless, draw_distance, players, connect and room
     """
-    global current_level, countdown_state, countdown_start_time
+    parser = argparse.ArgumentParser(description="3D split-screen car racing game.")
+    parser.add_argument('--seed', type=int, help="seed for a reproducible race")
+    parser.add_argument('--record', metavar='PATH', help="record every tick's input to PATH for replay.py")
+    parser.add_argument('--profile-out', metavar='PATH',
+                        help="profile every frame and write the timings to PATH (.csv or .json) at exit")
+    parser.add_argument('--endless', action='store_true',
+                        help="endless race on a procedural track generated as you drive")
+    parser.add_argument('--draw-distance', type=float, default=DRAW_DISTANCE,
+                        help="don't draw scenery further than this from the camera")
+    parser.add_argument('--players', type=int, default=NUM_PLAYERS,
+                        help="number of cars; players beyond the second are driven by the computer")
+    parser.add_argument('--connect', metavar='HOST[:PORT]',
+                        help="join a race on a server started with 'python net.py server'")
+    parser.add_argument('--room', default='lobby', help="room to join on the server")
+    args = parser.parse_args()
     
-    current_level = 0
-    set_level_properties(current_level)
-
-    generate_track()
-    generate_objects()
-    generate_trees()
+    if args.players < 2:
+        parser.error("--players must be at least 2")
     
-    countdown_state = 3
-    countdown_start_time = time.time()
+    return args
 
 
-def init_players():
+def main():
     """
-    Initialize player positions at the start of the track.
+    Create the GLUT window, start the race, and enter the main loop.
     """
-    global position
-    position[0][0] = -TRACK_WIDTH / 4
-    position[1][0] = TRACK_WIDTH / 4
-
-
-
-glutInit()
-glutInitDisplayMode(GLUT_DOUBLE | GLUT_RGB | GLUT_DEPTH)
-glutInitWindowSize(1920, 1080)
-glutCreateWindow(b"3D Car Racing Game")
-init()
-init_game()
-init_players()
-glutDisplayFunc(display)
-glutReshapeFunc(reshape)
-glutIdleFunc(idle)
-glutSpecialFunc(special_down)
-glutSpecialUpFunc(special_up)
-glutKeyboardFunc(keyboard_down)
-glutKeyboardUpFunc(keyboard_up)
-glutMainLoop()
+    global sim, keys, draw_distance
+
+    args = parse_args()
+    if args.connect:
+        connect(args)
+        return
+
+    if args.endless:
+        sim = Simulation(seed=args.seed, track_length=math.inf, streaming=True, num_players=args.players)
+    else:
+        sim = Simulation(seed=args.seed, num_players=args.players)
+
+    keys = empty_keys(args.players)
+    set_players(args.players)
+    ai_drivers[:] = [(player_id, ScriptedDriver()) for player_id in range(2, args.players)]
+
+    if args.record:
+        sim.recorder = InputRecorder(sim.seed, args.players, sim.swept_collisions, sim.streaming, sim.track_length)
+        atexit.register(sim.recorder.save, args.record, sim)
+
+    if not args.endless:
+        sim.history = SnapshotRing(REWIND_TICKS)
+
+    draw_distance = args.draw_distance
+
+    if args.profile_out:
+        profiler.enabled = True
+        atexit.register(profiler.dump, args.profile_out)
+
+    sim.init_game()
+    start_window()
+
+
+def connect(args):
+    """
+    Join a race on a race server and show only this player's view of it.
+    The session's simulation has already generated the race from the server's seed.
+    Args:
+        args: Parsed command line with connect and room set
+    """
+    global sim, keys, draw_distance, connection
+
+    host, _, port = args.connect.partition(':')
+    print(f"Waiting for the race in room {args.room!r} on {host}...")
+    connection = PollingConnection(host, int(port or PORT), args.room)
+    session = connection.session
+    sim = session.sim
+
+    keys = empty_keys()
+    set_players(sim.num_players)
+    views[:] = [session.player_id]
+    draw_distance = args.draw_distance
+    start_window()
+
+
+def start_window():
+    """
+    Create the GLUT window and enter the main loop.
+    """
+    glutInit()
+    glutInitDisplayMode(GLUT_DOUBLE | GLUT_RGB | GLUT_DEPTH)
+    glutInitWindowSize(1920, 1080)
+    glutCreateWindow(b"3D Car Racing Game")
+    init()
+    glutDisplayFunc(display)
+    glutReshapeFunc(reshape)
+    glutIdleFunc(idle)
+    glutSpecialFunc(special_down)
+    glutSpecialUpFunc(special_up)
+    glutKeyboardFunc(keyboard_down)
+    glutKeyboardUpFunc(keyboard_up)
+    glutMainLoop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+# Input recording and replay. A recording is the race seed plus the packed key state of
+# every simulation tick (one byte for two players), which is all the headless simulation
+# needs to re-run a race exactly.
+import argparse
+import hashlib
+import struct
+import time
+import zlib
+
+from simulation import NUM_PLAYERS, TICK_DT, TRACK_LENGTH, Simulation, empty_keys
+
+
+MAGIC_V1 = b'RACEREC1'  # Two players, no player count in the header
+HEADER_V1 = struct.Struct('<8sQI32s')  # Magic, seed, tick count, digest of the final state
+MAGIC_V2 = b'RACEREC2'  # Raced before swept collisions
+MAGIC_V3 = b'RACEREC3'  # Swept collisions, fixed track of the default length
+HEADER_V2 = struct.Struct('<8sQIH32s')  # Magic, seed, tick count, player count, digest of the final state
+MAGIC = b'RACEREC4'
+# Magic, seed, tick count, player count, swept collisions, endless, track length, digest of the final state
+HEADER = struct.Struct('<8sQIH??d32s')
+
+
+def key_order(num_players):
+    """
+    Bit order used to pack a keys dict: every player's keys, then enter and restart.
+    Args:
+        num_players: Number of players in the race
+    Returns:
+        Tuple of key names
+    """
+    return tuple(empty_keys(num_players))
+
+
+def tick_size(num_players):
+    """
+    Bytes needed for one tick's packed key state.
+    """
+    return (len(key_order(num_players)) + 7) // 8
+
+
+def pack_keys(keys, order):
+    """
+    Pack an input state into a bitmask.
+    Args:
+        keys: Input state dict
+        order: Key names in bit order, from key_order()
+    Returns:
+        Integer with one bit per key
+    """
+    mask = 0
+
+    for bit, name in enumerate(order):
+        if keys[name]:
+            mask |= 1 << bit
+
+    return mask
+
+
+def unpack_keys(mask, order):
+    """
+    Inverse of pack_keys().
+    Args:
+        mask: Integer with one bit per key
+        order: Key names in bit order, from key_order()
+    Returns:
+        Input state dict
+    """
+    return {name: bool(mask >> bit & 1) for bit, name in enumerate(order)}
+
+
+def state_digest(sim):
+    """
+    Hash everything that determines how a race continues.
+    Two simulations with equal digests are in bit-for-bit identical states.
+    Args:
+        sim: Simulation to hash
+    Returns:
+        32-byte SHA-256 digest
+    """
+    h = hashlib.sha256()
+    h.update(repr((sim.tick, sim.current_level, sim.countdown_state, sim.countdown_start_time,
+                   sim.round_winners, sim.level_completed, sim.game_finished, sim.finish_times,
+                   sim.position, sim.velocity, sim.health, sim.max_speed, sim.handling,
+                   sim.boost_end_time, sim.slippery_end_time, sim.rng.getstate())).encode())
+    h.update(sim.objects.active)
+    return h.digest()
+
+
+class InputRecorder:
+    """
+    Collects the key state of every simulation tick of one race.
+    Attach it as Simulation.recorder and the simulation feeds it.
+    Args:
+        seed: Seed of the race being recorded
+        num_players: Number of players in the race
+        swept_collisions: Whether the race ran with swept collisions, see Simulation
+        streaming: Whether the race was endless, on a track generated as the cars drove
+        track_length: Length of the race's track (infinite for endless races)
+    """
+
+    def __init__(self, seed, num_players=NUM_PLAYERS, swept_collisions=True, streaming=False,
+                 track_length=TRACK_LENGTH):
+        self.seed = seed
+        self.num_players = num_players
+        self.swept_collisions = swept_collisions
+        self.streaming = streaming
+        self.track_length = track_length
+        self.order = key_order(num_players)
+        self.size = tick_size(num_players)
+        self.ticks = bytearray()  # Packed key states, `size` bytes per tick
+        self.digest = bytes(32)  # Final state digest, if known
+
+    def __len__(self):
+        return len(self.ticks) // self.size
+
+    def record(self, keys):
+        """
+        Append the key state for one tick.
+        Args:
+            keys: Input state dict the tick ran with
+        """
+        self.ticks += pack_keys(keys, self.order).to_bytes(self.size, 'little')
+
+    def truncate(self, count):
+        """
+        Drop every tick after the first `count`, e.g. when the race is rewound.
+        Args:
+            count: Number of ticks to keep
+        """
+        del self.ticks[count * self.size:]
+
+    def masks(self):
+        """
+        Iterate over the packed key state of every tick.
+        Yields:
+            Integer bitmasks as made by pack_keys()
+        """
+        size = self.size
+
+        if size == 1:
+            yield from self.ticks
+            return
+
+        for start in range(0, len(self.ticks), size):
+            yield int.from_bytes(self.ticks[start:start + size], 'little')
+
+    def save(self, path, sim=None):
+        """
+        Write the recording to a file.
+        Args:
+            path: Output file path
+            sim: The recorded simulation; when given, its final state digest is
+                stored so replays can be verified
+        """
+        if sim is not None:
+            self.digest = state_digest(sim)
+
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, self.seed, len(self), self.num_players, self.swept_collisions, self.streaming,
+                                self.track_length, self.digest))
+            f.write(zlib.compress(bytes(self.ticks), 9))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read a recording written by save().
+        Args:
+            path: Recording file path
+        Returns:
+            InputRecorder holding the recorded seed, ticks and digest
+        """
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        magic = data[:len(MAGIC)]
+
+        streaming = False
+        track_length = TRACK_LENGTH
+
+        if magic == MAGIC:
+            _, seed, count, num_players, swept, streaming, track_length, digest = HEADER.unpack_from(data)
+            header_size = HEADER.size
+        elif magic in (MAGIC_V3, MAGIC_V2):
+            _, seed, count, num_players, digest = HEADER_V2.unpack_from(data)
+            swept = magic == MAGIC_V3
+            header_size = HEADER_V2.size
+        elif magic == MAGIC_V1:
+            _, seed, count, digest = HEADER_V1.unpack_from(data)
+            num_players = 2
+            swept = False
+            header_size = HEADER_V1.size
+        else:
+            raise ValueError(f"{path} is not a race recording")
+
+        recording = cls(seed, num_players, swept, streaming, track_length)
+        recording.ticks = bytearray(zlib.decompress(data[header_size:]))
+        recording.digest = digest
+
+        if len(recording) != count:
+            raise ValueError(f"{path} is truncated: expected {count} ticks, found {len(recording)}")
+
+        return recording
+
+
+def race_simulation(recording, weather=False):
+    """
+    Set up the race a recording was made in, before its first tick.
+    Args:
+        recording: InputRecorder of the race
+        weather: Whether to simulate rain/snow particles
+    Returns:
+        Simulation with the recorded seed, players, collision rules and track
+    """
+    sim = Simulation(weather=weather, seed=recording.seed, num_players=recording.num_players,
+                     track_length=recording.track_length, streaming=recording.streaming,
+                     swept_collisions=recording.swept_collisions)
+    sim.init_game()
+    return sim
+
+
+def replay_steps(recording, weather=False):
+    """
+    Re-run a recorded race one tick at a time, e.g. to render it.
+    Args:
+        recording: InputRecorder with the seed and per-tick key states
+        weather: Whether to simulate rain/snow particles; they never change the race
+    Yields:
+        The Simulation after each recorded tick (the same object every time)
+    """
+    sim = race_simulation(recording, weather)
+    states = {}  # Decoded key states by mask, so replaying doesn't build a dict per tick
+
+    for mask in recording.masks():
+        keys = states.get(mask)
+        if keys is None:
+            keys = states[mask] = unpack_keys(mask, recording.order)
+        sim.step(keys)
+        yield sim
+
+
+def replay(recording):
+    """
+    Re-run a recorded race in the headless simulation.
+    Args:
+        recording: InputRecorder with the seed and per-tick key states
+    Returns:
+        The Simulation after the last recorded tick
+    """
+    sim = None
+
+    for sim in replay_steps(recording):
+        pass
+
+    if sim is None:  # Empty recording: the race as it stood before the first tick
+        sim = race_simulation(recording)
+
+    return sim
+
+
+def main():
+    """
+    Replay a recording from the command line and check it against its digest.
+    """
+    parser = argparse.ArgumentParser(description="Replay a recorded race headlessly.")
+    parser.add_argument('recording', help="file written by racinggame.py --record")
+    args = parser.parse_args()
+
+    recording = InputRecorder.load(args.recording)
+    start = time.perf_counter()
+    sim = replay(recording)
+    elapsed = time.perf_counter() - start
+
+    race_time = len(recording) * TICK_DT
+    print(f"Replayed {len(recording)} ticks ({race_time:.1f} s of racing) in {elapsed:.3f} s "
+          f"({race_time / max(elapsed, 1e-9):.0f}x real time)")
+    print(f"Level {sim.current_level + 1}, round winners {sim.round_winners}, finish times {sim.finish_times}")
+
+    if recording.digest == bytes(32):
+        print("No final state digest in the recording; nothing to verify")
+    elif state_digest(sim) == recording.digest:
+        print("Final state matches the recording")
+    else:
+        print("MISMATCH: final state differs from the recording")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
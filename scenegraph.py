@@ -0,0 +1,577 @@
+# Retained scene graph for the renderer. Every node keeps its geometry in a GPU vertex
+# buffer, tagged with the version of the race state it was built from. update() runs once
+# per frame and re-uploads only what changed: streamed track chunks, chunks where an item
+# was picked up, the weather particles, and the car transforms. draw() then submits the
+# whole scene with the vertex and color arrays enabled once, instead of issuing a GL call
+# per vertex. For split-screen, prepare() culls against every camera at once and the
+# resulting draw list is replayed per viewport.
+import ctypes
+import math
+from bisect import bisect_left
+
+import numpy as np
+from OpenGL.GL import GL_ARRAY_BUFFER, GL_COLOR_ARRAY, GL_DEPTH_TEST, GL_DYNAMIC_DRAW, GL_FLOAT, GL_LINES, \
+    GL_POINTS, GL_QUADS, GL_STATIC_DRAW, GL_TRIANGLES, GL_VERTEX_ARRAY, glBindBuffer, glBufferData, \
+    glBufferSubData, glColorPointer, glDeleteBuffers, glDisable, glDisableClientState, glDrawArrays, glEnable, \
+    glEnableClientState, glGenBuffers, glLineWidth, glPointSize, glPopMatrix, glPushMatrix, glRotatef, \
+    glTranslatef, glVertexPointer
+
+from culling import CHUNK_LENGTH, bounds, bucket_by_z, chunk_ranges, lod_level
+from meshes import CUBE_FACES, CUBE_VERTICES, SPHERE_DETAIL, car_mesh, sphere_quads, tree_mesh
+from objectstore import BOOST, OBS, SLIPPERY, SPEED_DOWN
+from simulation import TRACK_WIDTH
+
+
+STRIDE = 24  # Bytes per vertex: float32 x, y, z followed by float32 r, g, b
+
+# (top, bottom) sky gradient colors per level
+SKY_COLORS = [
+    ((0.529, 0.808, 0.922), (0.678, 0.847, 0.902)),  # Sunny: light blue
+    ((0.4, 0.4, 0.4), (0.6, 0.6, 0.6)),  # Rainy: dark gray
+    ((0.7, 0.7, 0.7), (0.9, 0.9, 0.9)),  # Snowy: almost white
+]
+
+OBJECT_COLORS = {OBS: (0.5, 0.5, 0.5), BOOST: (1.0, 1.0, 0.0), SPEED_DOWN: (0.0, 1.0, 0.0), SLIPPERY: (0.6, 0.4, 0.0)}
+RAIN_COLOR = (0.5, 0.5, 1.0)
+SNOW_COLOR = (1.0, 1.0, 1.0)
+
+
+# --- GPU BUFFERS ---
+class MeshBuilder:
+    """
+    Collects colored vertices per primitive type before they are uploaded to a Mesh.
+    """
+
+    def __init__(self):
+        self.parts = {}  # GL primitive mode -> list of (x, y, z, r, g, b)
+
+    def add(self, mode, vertices, color):
+        """
+        Append vertices of one color.
+        Args:
+            mode: GL primitive mode, e.g. GL_QUADS
+            vertices: Iterable of (x, y, z) tuples
+            color: RGB tuple
+        """
+        self.parts.setdefault(mode, []).extend(vertex + color for vertex in vertices)
+
+
+class Mesh:
+    """
+    Interleaved position and color data in a vertex buffer object, drawn as one
+    glDrawArrays per primitive type.
+    Args:
+        usage: GL_STATIC_DRAW for geometry rebuilt rarely, GL_DYNAMIC_DRAW for per-frame data
+    """
+
+    __slots__ = ('vbo', 'usage', 'capacity', 'batches')
+
+    def __init__(self, usage=GL_STATIC_DRAW):
+        self.vbo = glGenBuffers(1)
+        self.usage = usage
+        self.capacity = 0  # Bytes allocated in the buffer
+        self.batches = []  # (mode, first vertex, vertex count)
+
+    def upload(self, builder):
+        """
+        Replace the mesh with the contents of a MeshBuilder.
+        """
+        batches = []
+        vertices = []
+
+        for mode, part in builder.parts.items():
+            if part:
+                batches.append((mode, len(vertices), len(part)))
+                vertices += part
+
+        self.upload_array(np.array(vertices, dtype=np.float32).reshape(-1, 6), batches)
+
+    def upload_array(self, data, batches):
+        """
+        Replace the mesh with prepared vertex data.
+        The buffer is only reallocated when the data outgrows it.
+        Args:
+            data: float32 array of shape (n, 6)
+            batches: List of (mode, first vertex, vertex count)
+        """
+        self.batches = batches
+
+        if not data.nbytes:
+            return
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+
+        if data.nbytes > self.capacity:
+            glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, self.usage)
+            self.capacity = data.nbytes
+        else:
+            glBufferSubData(GL_ARRAY_BUFFER, 0, data.nbytes, data)
+
+    def draw(self):
+        """
+        Submit the mesh. The vertex and color arrays must be enabled.
+        """
+        if not self.batches:
+            return
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glVertexPointer(3, GL_FLOAT, STRIDE, ctypes.c_void_p(0))
+        glColorPointer(3, GL_FLOAT, STRIDE, ctypes.c_void_p(12))
+
+        for mode, first, count in self.batches:
+            glDrawArrays(mode, first, count)
+
+    def delete(self):
+        """
+        Free the vertex buffer.
+        """
+        glDeleteBuffers(1, [self.vbo])
+
+
+class Node:
+    """
+    A mesh in the scene, with the version of the race state it shows and the box used to cull it.
+    """
+
+    __slots__ = ('mesh', 'version', 'lo', 'hi')
+
+    def __init__(self, usage=GL_STATIC_DRAW):
+        self.mesh = Mesh(usage)
+        self.version = None
+        self.lo = self.hi = None
+
+    def rebuild(self, version, builder, lo=None, hi=None):
+        """
+        Upload new geometry if the version changed.
+        Args:
+            version: Anything that changes whenever the geometry must be rebuilt
+            builder: Function returning a MeshBuilder, only called when needed
+            lo, hi: New bounding box corners
+        """
+        if version != self.version:
+            self.mesh.upload(builder())
+            self.version = version
+
+        self.lo, self.hi = lo, hi
+
+
+def sync_chunks(nodes, chunks):
+    """
+    Make a dict of chunk nodes match a new chunk layout.
+    Nodes of chunks that no longer exist are freed; new chunks get empty nodes.
+    Args:
+        nodes: Dict mapping chunk key to Node, updated in place
+        chunks: Iterable of current chunk keys
+    """
+    keys = set(chunks)
+
+    for key in [key for key in nodes if key not in keys]:
+        nodes.pop(key).mesh.delete()
+
+    for key in keys:
+        if key not in nodes:
+            nodes[key] = Node()
+
+
+# --- GEOMETRY ---
+def track_geometry(track, start, end):
+    """
+    Asphalt quads, white side lines and the dashed center line of part of the track.
+    Args:
+        track: Track to build
+        start, end: Range of global spline point indices, end inclusive
+    Returns:
+        MeshBuilder
+    """
+    builder = MeshBuilder()
+    points = track.points[start - track.offset:end - track.offset + 1]
+    normals = track.normals[start - track.offset:end - track.offset + 1]
+    w = TRACK_WIDTH / 2
+    asphalt = []
+    lines = []
+
+    for i in range(end - start):
+        x1, y1, z1 = points[i]
+        x2, y2, z2 = points[i + 1]
+        nx1, _, nz1 = normals[i]
+        nx2, _, nz2 = normals[i + 1]
+
+        asphalt += [(x1 + nx1 * w, y1, z1 + nz1 * w), (x1 - nx1 * w, y1, z1 - nz1 * w),
+                    (x2 - nx2 * w, y2, z2 - nz2 * w), (x2 + nx2 * w, y2, z2 + nz2 * w)]
+
+        for side in (-4.8, 4.8):
+            lines += [(x1 + nx1 * side, y1 + 0.01, z1 + nz1 * side), (x2 + nx2 * side, y2 + 0.01, z2 + nz2 * side)]
+
+        if (start + i) % 10 < 5:  # Dashed center line
+            lines += [(x1, y1 + 0.01, z1), (x2, y2 + 0.01, z2)]
+
+    builder.add(GL_QUADS, asphalt, (0.2, 0.2, 0.2))
+    builder.add(GL_LINES, lines, (1.0, 1.0, 1.0))
+    return builder
+
+
+def object_geometry(sim, first, last, level):
+    """
+    All active objects in a range of ids, baked in world space.
+    Args:
+        sim: Simulation holding the objects and the track
+        first, last: Range of object ids, last exclusive
+        level: Level of detail of the pickup spheres
+    Returns:
+        MeshBuilder
+    """
+    builder = MeshBuilder()
+    track = sim.track
+    objects = sim.objects
+    sphere = sphere_quads(0.25, *SPHERE_DETAIL[level])
+
+    for i in range(first, last):
+        if not objects.active[i]:
+            continue
+
+        kind = objects.types[i]
+        lateral, height, s = objects.pos(i)
+        color = OBJECT_COLORS[kind]
+
+        if kind == SLIPPERY:  # Flat quad lying along the track
+            builder.add(GL_QUADS, [track.to_world(lateral + dl, height + 0.01, s + ds)
+                                   for dl, ds in ((-0.5, -0.5), (0.5, -0.5), (0.5, 0.5), (-0.5, 0.5))], color)
+            continue
+
+        x, y, z = track.to_world(lateral, height, s)
+        y += 0.01
+
+        if kind == OBS:  # 0.5 unit cube turned to face along the track
+            cos_h = math.cos(track.heading(s)) * 0.25
+            sin_h = math.sin(track.heading(s)) * 0.25
+            builder.add(GL_QUADS, [(x + vx * cos_h + vz * sin_h, y + vy * 0.25, z - vx * sin_h + vz * cos_h)
+                                   for face in CUBE_FACES for vx, vy, vz in (CUBE_VERTICES[v] for v in face)], color)
+        else:
+            builder.add(GL_QUADS, [(x + vx, y + vy, z + vz) for vx, vy, vz in sphere], color)
+
+    return builder
+
+
+def tree_geometry(trees):
+    """
+    Trunks and foliage of some trees.
+    """
+    builder = MeshBuilder()
+    trunks, foliage = tree_mesh(trees)
+    builder.add(GL_QUADS, trunks, (0.5, 0.35, 0.05))
+    builder.add(GL_TRIANGLES, foliage, (0.0, 0.6, 0.0))
+    return builder
+
+
+def car_geometry(color, level):
+    """
+    The car model in car space.
+    Args:
+        color: RGB tuple of the body
+        level: Level of detail
+    """
+    builder = MeshBuilder()
+    body, cabin, wheels = car_mesh(level)
+    builder.add(GL_QUADS, body, color)
+    builder.add(GL_QUADS, cabin, (0.7, 0.7, 1.0))
+    builder.add(GL_QUADS, wheels, (0.0, 0.0, 0.0))
+    return builder
+
+
+def sun_geometry():
+    """
+    The sun with its rays, centered on the origin.
+    """
+    builder = MeshBuilder()
+    builder.add(GL_QUADS, sphere_quads(2.0, 20, 20), (1.0, 1.0, 0.0))
+    rays = []
+    for i in range(12):
+        angle = math.radians(i * 30)
+        rays += [(0.0, 0.0, 0.0), (math.cos(angle) * 4.0, math.sin(angle) * 4.0, 0.0)]
+    builder.add(GL_LINES, rays, (1.0, 1.0, 0.0))
+    return builder
+
+
+def sky_geometry(level):
+    """
+    The gradient backdrop of a level.
+    """
+    top, bottom = SKY_COLORS[level]
+    builder = MeshBuilder()
+    builder.add(GL_QUADS, [(-100.0, 100.0, -100.0), (100.0, 100.0, -100.0)], top)
+    builder.add(GL_QUADS, [(100.0, 0.0, -100.0), (-100.0, 0.0, -100.0)], bottom)
+    return builder
+
+
+def ground_geometry(track):
+    """
+    A grass quad under the whole (stored part of the) track.
+    """
+    lo, hi = bounds(track.points, (30.0, 0.0, 30.0))
+    y = lo[1] - 0.01
+    builder = MeshBuilder()
+    builder.add(GL_QUADS, [(lo[0], y, lo[2]), (hi[0], y, lo[2]), (hi[0], y, hi[2]), (lo[0], y, hi[2])], (0.0, 0.5, 0.0))
+    return builder
+
+
+def nearest_in_box(eye, lo, hi):
+    """
+    The point of a box closest to the camera, for picking a chunk's level of detail.
+    """
+    return tuple(min(max(eye[i], lo[i]), hi[i]) for i in range(3))
+
+
+# --- SCENE ---
+class Scene:
+    """
+    Everything drawn in the 3D views, kept on the GPU between frames.
+    Call update() once per frame, then either draw() once per camera or
+    prepare() once for all cameras and replay() the result per camera.
+    Args:
+        profiler: Optional FrameProfiler; replaying times each group of nodes
+            (draw_sky, draw_track, draw_trees, draw_particles, draw_objects, draw_car)
+    """
+
+    def __init__(self, profiler=None):
+        self.profiler = profiler
+        self.sky = Node()
+        self.ground = Node()
+        self.sun = Node()
+        self.sun_position = (0.0, 0.0, 0.0)
+        self.track_chunks = {}  # Chunk number -> Node
+        self.track_layout = None
+        self.tree_chunks = {}  # Chunk key -> Node
+        self.tree_layout = None
+        self.object_chunks = {}  # (chunk number, level of detail) -> Node, built when first seen
+        self.object_ranges = {}  # Chunk number -> (first, last) ids of the objects on that stretch of track
+        self.object_layout = None
+        self.particles = Node(GL_DYNAMIC_DRAW)
+        self.car_meshes = {}  # (color, level of detail) -> Mesh
+        self.cars = []  # (position, yaw in degrees, color) of every car this frame
+        self.sim = None
+        self.level = 0
+
+    def update(self, sim, cars):
+        """
+        Bring the scene up to date with the race, re-uploading only what changed.
+        Args:
+            sim: Simulation to show
+            cars: List of ((x, y, z), yaw in radians, color) per car
+        """
+        self.sim = sim
+        self.level = sim.current_level
+        track = sim.track
+        layout = (sim.track_version, track.offset, len(track))  # Changes as a streaming track grows or shrinks
+
+        self.sky.rebuild(self.level, lambda: sky_geometry(self.level))
+        self.ground.rebuild(layout, lambda: ground_geometry(track))
+        self.sun.rebuild('sun', sun_geometry)  # Never changes
+        self.sun_position = track.to_world(0.0, 15.0, track.length)  # Above the finish line
+
+        if layout != self.track_layout:
+            self.track_layout = layout
+            self._layout_track(track)
+
+        if sim.scenery_version != self.tree_layout:
+            self.tree_layout = sim.scenery_version
+            self._layout_trees(sim.trees)
+
+        if (sim.scenery_version, layout) != self.object_layout:
+            self.object_layout = (sim.scenery_version, layout)
+            self._layout_objects(sim, track)
+
+        self._update_particles(sim)
+        self.cars = [(position, math.degrees(yaw), tuple(color)) for position, yaw, color in cars]
+
+    def _layout_track(self, track):
+        """
+        Split the stored track into chunks, rebuilding the chunks whose samples changed.
+        """
+        per_chunk = int(round(CHUNK_LENGTH / track.spacing))
+        ranges = chunk_ranges(track.offset, track.offset + len(track) - 1, per_chunk)
+        pad = (TRACK_WIDTH / 2 + 1.0, 1.0, TRACK_WIDTH / 2 + 1.0)  # Also holds everything standing on the track
+        sync_chunks(self.track_chunks, [n for n, _, _ in ranges])
+
+        for n, start, end in ranges:
+            lo, hi = bounds(track.points[start - track.offset:end - track.offset + 1], pad)
+            self.track_chunks[n].rebuild((self.track_layout[0], end), lambda: track_geometry(track, start, end), lo, hi)
+
+
+    def _layout_objects(self, sim, track):
+        """
+        Find the objects on each track chunk. Objects are stored in order along the track,
+        so every chunk holds a contiguous range of ids.
+        """
+        zs = sim.objects.zs
+        per_chunk = int(round(CHUNK_LENGTH / track.spacing))
+        self.object_ranges = {}
+
+        for n, start, end in chunk_ranges(track.offset, track.offset + len(track) - 1, per_chunk):
+            # Half-open, so an object on a shared boundary sample belongs to one chunk only
+            first = bisect_left(zs, start * track.spacing)
+            self.object_ranges[n] = (first, bisect_left(zs, end * track.spacing, first))
+
+        for key in [key for key in self.object_chunks if key[0] not in self.object_ranges]:
+            self.object_chunks.pop(key).mesh.delete()
+
+    def _layout_trees(self, trees):
+        """
+        Group the trees into chunks along z, rebuilding the chunks whose trees changed.
+        """
+        chunks = bucket_by_z(trees)
+        sync_chunks(self.tree_chunks, chunks)
+
+        for key, chunk in chunks.items():
+            lo, hi = bounds(chunk, (1.0, 0.0, 1.0))
+            hi = (hi[0], hi[1] + 3.0, hi[2])  # Foliage reaches 3 units up
+            self.tree_chunks[key].rebuild(tuple(chunk), lambda: tree_geometry(chunk), lo, hi)
+
+    def _update_particles(self, sim):
+        """
+        Upload this frame's rain streaks or snow flakes.
+        """
+        particles = sim.particles
+
+        if not len(particles) or sim.current_level == 0:
+            self.particles.mesh.batches = []
+            return
+
+        if sim.current_level == 1:
+            vertices, mode, color = particles.rain_lines(), GL_LINES, RAIN_COLOR
+        else:
+            vertices, mode, color = particles.pos, GL_POINTS, SNOW_COLOR
+
+        data = np.empty((len(vertices), 6), dtype=np.float32)
+        data[:, :3] = vertices
+        data[:, 3:] = color
+        self.particles.mesh.upload_array(data, [(mode, 0, len(data))])
+
+    def _objects(self, n, level):
+        """
+        Node holding the objects on one track chunk at one level of detail,
+        rebuilt when one of them is picked up.
+        """
+        sim = self.sim
+        first, last = self.object_ranges[n]
+        node = self.object_chunks.get((n, level))
+
+        if node is None:
+            node = self.object_chunks[(n, level)] = Node()
+
+        node.rebuild((self.object_layout, bytes(sim.objects.active[first:last])),
+                     lambda: object_geometry(sim, first, last, level))
+        return node
+
+    def _car_mesh(self, color, level):
+        """
+        Shared mesh of every car with this body color and level of detail.
+        """
+        mesh = self.car_meshes.get((color, level))
+
+        if mesh is None:
+            mesh = self.car_meshes[(color, level)] = Mesh()
+            mesh.upload(car_geometry(color, level))
+
+        return mesh
+
+    def prepare(self, frustums):
+        """
+        Build this frame's draw list: every node visible from at least one of the
+        cameras, in submission order, so culling, level-of-detail selection and
+        version checks happen once per frame instead of once per viewport.
+        A node's level of detail is picked for the nearest camera.
+        Args:
+            frustums: Frustum of every camera the list will be replayed for
+        Returns:
+            List of (function, args) GL commands for replay()
+        """
+        eyes = [frustum.eye for frustum in frustums]
+        commands = [(glEnableClientState, (GL_VERTEX_ARRAY,)), (glEnableClientState, (GL_COLOR_ARRAY,))]
+
+        def visible_box(node):
+            return any(frustum.box_visible(node.lo, node.hi) for frustum in frustums)
+
+        def nearest_level(x, y, z):
+            return min(lod_level(eye, x, y, z) for eye in eyes)
+
+        def add(mesh):
+            if mesh.batches:
+                commands.append((mesh.draw, ()))
+
+        def section(name, start):
+            # Time the commands added since `start` as one profiler section whenever the list is replayed
+            if self.profiler is not None and self.profiler.enabled:
+                timer = self.profiler.section(name)
+                commands.insert(start, (timer.__enter__, ()))
+                commands.append((timer.__exit__, (None, None, None)))
+
+        start = len(commands)
+        commands.append((glDisable, (GL_DEPTH_TEST,)))
+        add(self.sky.mesh)
+        commands.append((glEnable, (GL_DEPTH_TEST,)))
+        add(self.ground.mesh)
+
+        if self.level == 0:
+            commands += [(glPushMatrix, ()), (glTranslatef, self.sun_position)]
+            add(self.sun.mesh)
+            commands.append((glPopMatrix, ()))
+
+        section('draw_sky', start)
+
+        visible = [(n, node) for n, node in self.track_chunks.items() if visible_box(node)]
+
+        start = len(commands)
+        commands.append((glLineWidth, (2.0,)))
+        for _, node in visible:
+            add(node.mesh)
+        commands.append((glLineWidth, (1.0,)))
+        section('draw_track', start)
+
+        start = len(commands)
+        for node in self.tree_chunks.values():
+            if visible_box(node):
+                add(node.mesh)
+        section('draw_trees', start)
+
+        start = len(commands)
+        commands.append((glPointSize, (3.0 if self.level == 2 else 1.0,)))
+        add(self.particles.mesh)
+        commands.append((glPointSize, (1.0,)))
+        section('draw_particles', start)
+
+        start = len(commands)
+        for n, node in visible:
+            level = min(lod_level(eye, *nearest_in_box(eye, node.lo, node.hi)) for eye in eyes)
+            add(self._objects(n, level).mesh)
+        section('draw_objects', start)
+
+        start = len(commands)
+        for position, yaw, color in self.cars:
+            if not any(frustum.sphere_visible(*position, 1.0) for frustum in frustums):
+                continue
+            commands += [(glPushMatrix, ()), (glTranslatef, position), (glRotatef, (yaw, 0, 1, 0))]
+            add(self._car_mesh(color, nearest_level(*position)))
+            commands.append((glPopMatrix, ()))
+        section('draw_car', start)
+
+        commands += [(glDisableClientState, (GL_COLOR_ARRAY,)), (glDisableClientState, (GL_VERTEX_ARRAY,)),
+                     (glBindBuffer, (GL_ARRAY_BUFFER, 0))]
+        return commands
+
+    @staticmethod
+    def replay(commands):
+        """
+        Submit a prepared draw list with the current camera. The camera's modelview matrix must be current.
+        Args:
+            commands: List returned by prepare()
+        """
+        for function, args in commands:
+            function(*args)
+
+    def draw(self, frustum):
+        """
+        Submit everything visible from one camera.
+        Args:
+            frustum: Camera frustum used for culling and level of detail
+        """
+        self.replay(self.prepare([frustum]))
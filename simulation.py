@@ -0,0 +1,897 @@
+# Headless race simulation: owns all race state and advances it on a fixed timestep.
+# Nothing in this module touches OpenGL/GLUT, so races can run without a display.
+import random
+import time
+from bisect import bisect_left
+from collections import deque
+
+import numpy as np
+
+from objectstore import BOOST, OBS, SLIPPERY, SPEED_DOWN, ObjectStore
+from particles import PARTICLE_COUNT, ParticleSystem
+from spatial import ZIndex
+from track import CONTROL_POINTS, StreamingTrack, Track
+
+
+# --- TRACK & TUNING CONSTANTS ---
+TRACK_WIDTH = 10.0  # Width of the racing path
+TRACK_LENGTH = 150.0  # Distance from the start to the finish line along the track
+TRACK_SAMPLES = 600  # Number of spline samples along the track
+SAMPLE_SPACING = TRACK_LENGTH / TRACK_SAMPLES  # Distance between spline samples
+
+TOP_SPEED = 0.3  # Base maximum speed (units per tick)
+ACCELERATION = 0.005  # Acceleration rate (units per tick squared)
+BOOSTED_TOP_SPEED = TOP_SPEED * 2.0  # Boosted speed multiplier
+LEVEL_HANDLING = [0.06, 0.03, 0.12]  # Base handling for Sunny, Rainy, Snowy
+LEVEL_NAMES = ["Sunny", "Rainy", "Snowy"]
+NUM_LEVELS = len(LEVEL_NAMES)
+
+# Items placed on a standard-length track, by type code
+ITEM_COUNTS = {OBS: 50, BOOST: 10, SPEED_DOWN: 5, SLIPPERY: 15}
+TREES_PER_SIDE = 30  # Trees along each side of a standard-length track
+
+# Streaming (endless) races generate the track in chunks around the cars
+STREAM_CHUNK = 25.0  # Length of track generated at a time
+STREAM_AHEAD = 150.0  # How far ahead of the leading car the track must exist
+STREAM_BEHIND = 30.0  # How far behind the trailing car chunks are kept before being freed
+
+START_HEALTH = 5.0  # Health each player starts a level with
+BOOST_DURATION = 2.0  # Seconds a boost lasts
+SLIPPERY_DURATION = 2.0  # Seconds a slippery patch lasts
+COUNTDOWN_STEP = 1.0  # Seconds between countdown states
+
+NUM_PLAYERS = 2  # Default number of cars
+START_LANES = 8  # Cars side by side on the start line; more start in further rows
+START_ROW_SPACING = 0.6  # Distance between rows on the start line
+
+CAR_HALF = 0.1  # Half-extent of a car's bounding box
+CAR_RADIUS = 0.2  # Cars closer than this collide
+CAR_RADIUS_SQUARED = 0.04
+ITEM_HALF = 0.125  # Half-extent of obstacles, boosts and speed-downs
+SLIPPERY_HALF = 0.5  # Half-extent of a slippery patch in x and z
+SLIPPERY_HALF_Y = 0.1  # Half-height of a slippery patch
+REACH = SLIPPERY_HALF + CAR_HALF  # Furthest z distance at which a car can touch an object
+
+# Fixed timestep: the simulation always advances in TICK_DT increments
+TICK_RATE = 60
+TICK_DT = 1.0 / TICK_RATE
+MAX_TICKS_PER_UPDATE = 5  # Cap catch-up work after a long stall
+
+
+def player_keys(player_id):
+    """
+    Names of a player's keys in an input state.
+    Args:
+        player_id: Index of the player (0 is Player 1)
+    Returns:
+        (accelerate, left, right) key names
+    """
+    prefix = f'p{player_id + 1}_'
+    return prefix + 'accel', prefix + 'left', prefix + 'right'
+
+
+def empty_keys(num_players=NUM_PLAYERS):
+    """
+    Create an input state with every key released.
+    Player 1 drives with W/A/D and Player 2 with the arrow keys; further
+    players are driven by code or over the network.
+    Args:
+        num_players: Number of players with accelerate/left/right keys
+    Returns:
+        Dict mapping key names to False
+    """
+    keys = {}
+
+    for player_id in range(num_players):
+        for name in player_keys(player_id):
+            keys[name] = False
+
+    keys['enter'] = False  # Enter key for advancing levels
+    keys['restart'] = False  # R key for restarting game
+    return keys
+
+
+# --- GENERATION ---
+def start_grid(num_players):
+    """
+    Starting positions, up to START_LANES cars side by side per row.
+    Args:
+        num_players: Number of cars
+    Returns:
+        List of [x, y, z] positions in track coordinates
+    """
+    lanes = min(num_players, START_LANES)
+    lane_width = TRACK_WIDTH / lanes
+    return [[-TRACK_WIDTH / 2 + (i % lanes + 0.5) * lane_width, 0.0, i // lanes * START_ROW_SPACING]
+            for i in range(num_players)]
+
+
+def scaled_item_counts(total, mix=ITEM_COUNTS):
+    """
+    Item counts with the same mix of types but a different total.
+    Args:
+        total: Total number of items wanted
+        mix: Dict mapping type code to count giving the proportions
+    Returns:
+        Dict mapping type code to count, summing to total
+    """
+    standard = sum(mix.values())
+    counts = {kind: count * total // standard for kind, count in mix.items()}
+    counts[OBS] = counts.get(OBS, 0) + total - sum(counts.values())
+    return counts
+
+
+def generate_track(length=TRACK_LENGTH, control_points=CONTROL_POINTS):
+    """
+    Generate a spline track through the control points.
+    Args:
+        length: Length of the track along its center line
+        control_points: Shape of the track as (x, y, z) points, scaled to length
+    Returns:
+        Track sampled every SAMPLE_SPACING units
+    """
+    return Track(length, SAMPLE_SPACING, control_points)
+
+
+def generate_trees(trees, rng, track):
+    """
+    Generate trees on both sides of the track at random positions.
+    Args:
+        trees: List that is cleared and filled with world tree positions
+        rng: random.Random instance to draw positions from
+        track: Track the trees line
+    """
+    trees.clear()
+    place_trees(trees, rng, track, 0.0, track.length)
+
+
+def place_trees(trees, rng, track, start, end):
+    """
+    Add trees on both sides of a stretch of track, at the standard density.
+    Trees that would stand on another part of a winding track are left out.
+    Args:
+        trees: List the world tree positions are appended to
+        rng: random.Random instance to draw positions from
+        track: Track the trees line
+        start, end: Stretch of track, as distances along it
+    """
+    num_trees_per_side = int(round(TREES_PER_SIDE * (end - start) / TRACK_LENGTH))
+    clearance = TRACK_WIDTH / 2 + 0.5
+
+    for _ in range(num_trees_per_side):
+        s = rng.uniform(start, end)
+        x_left = -6.0 + rng.uniform(-1.0, 1.0)
+        x_right = 6.0 + rng.uniform(-1.0, 1.0)
+
+        for lateral in (x_left, x_right):
+            x, y, z = track.to_world(lateral, 0.0, s)
+            if abs(track.project(x, z)[0]) >= clearance:
+                trees.append((x, y, z))
+
+
+def generate_objects(objects, track, rng, counts=ITEM_COUNTS):
+    """
+    Place objects (obstacles, boosts, etc.) randomly along the track.
+    Args:
+        objects: ObjectStore that is cleared and refilled, in order along the track
+        track: Track the objects are placed on, at its sample points
+        rng: random.Random instance to draw placements from
+        counts: Dict mapping type code to the number of items of that type
+    """
+    objects.clear()
+    N = len(track) - 1  # The finish line sample is never used
+    place_objects(objects, track, rng, counts, 10, N - 10)
+
+
+def place_objects(objects, track, rng, counts, first, last):
+    """
+    Add objects on distinct, randomly picked track samples.
+    Objects are stored in track coordinates: (lateral offset, height, distance along the track).
+    Args:
+        objects: ObjectStore the objects are appended to, in order along the track
+        track: Track the objects are placed on
+        rng: random.Random instance to draw placements from
+        counts: Dict mapping type code to the number of items of that type
+        first, last: Range of sample indices to place on, last exclusive
+    """
+    kinds = []
+    for kind in sorted(counts):
+        kinds += [kind] * counts[kind]
+
+    picks = rng.sample(range(first, last), len(kinds))
+    rng.shuffle(kinds)
+
+    placed = []
+    for idx, kind in zip(picks, kinds):
+        placed.append((idx, kind, rng.uniform(-TRACK_WIDTH / 2 + 0.25, TRACK_WIDTH / 2 - 0.25)))
+
+    for idx, kind, x in sorted(placed):
+        objects.add(kind, x, 0.0, idx * track.spacing)
+
+
+# --- RACE STATE ---
+class RaceRandom(random.Random):
+    """
+    random.Random that counts how often its state changed, so snapshots can
+    tell whether they need to save it again. Draws the same numbers as random.Random.
+    """
+
+    draws = 0  # Bumped by every draw, reseed or setstate()
+
+    def random(self):
+        self.draws += 1
+        return super().random()
+
+    def getrandbits(self, k):
+        self.draws += 1
+        return super().getrandbits(k)
+
+    def seed(self, *args, **kwargs):
+        self.draws += 1
+        super().seed(*args, **kwargs)
+
+    def setstate(self, state):
+        self.draws += 1
+        super().setstate(state)
+
+
+class RaceState:
+    """
+    Everything about a race that changes while it runs, apart from the random
+    generator and the objects: the race timers and one list entry per car.
+    The lists are allocated once and then only ever updated in place, so a
+    state can be reset, snapshotted, restored and cloned without touching the
+    allocator, and any reference to one of its lists stays valid.
+    Args:
+        num_players: Number of cars
+        base_handling: Handling every car starts with
+    """
+
+    __slots__ = ('num_players', 'tick', 'current_level', 'countdown_state', 'countdown_start_time',
+                 'level_completed', 'level_complete_time', 'base_handling', 'round_winners',
+                 'position', 'previous_position', 'orientation', 'velocity', 'max_speed', 'handling', 'health',
+                 'boost_end_time', 'slippery_end_time', 'finish_times', 'game_finished')
+
+    CAR_FIELDS = ('orientation', 'velocity', 'max_speed', 'handling', 'health', 'boost_end_time',
+                  'slippery_end_time', 'finish_times', 'game_finished')
+
+    def __init__(self, num_players=NUM_PLAYERS, base_handling=LEVEL_HANDLING[0]):
+        n = self.num_players = num_players
+        self.tick = 0  # Fixed ticks simulated so far
+        self.current_level = 0  # Current level (0: Sunny, 1: Rainy, 2: Snowy)
+        self.countdown_state = None  # Countdown state: None, 3, 2, 1, 'GO!', 'racing'
+        self.countdown_start_time = 0.0  # Sim time when the countdown state changed
+        self.level_completed = False  # Flag for level completion
+        self.level_complete_time = 0.0  # Sim time when level is completed
+        self.base_handling = base_handling
+        self.round_winners = []  # Stores winners of each round
+
+        # Car state, one entry per player
+        self.position = [[0.0, 0.0, 0.0] for _ in range(n)]  # Player positions (x, y, z)
+        self.previous_position = [[0.0, 0.0, 0.0] for _ in range(n)]  # Positions at the last collision check
+        self.orientation = [0.0] * n  # Car orientations (radians)
+        self.velocity = [0.0] * n  # Current speed for each player
+        self.max_speed = [TOP_SPEED] * n
+        self.handling = [base_handling] * n
+        self.health = [START_HEALTH] * n
+        self.boost_end_time = [0.0] * n  # Sim time when boost effect ends
+        self.slippery_end_time = [0.0] * n  # Sim time when slippery effect ends
+        self.finish_times = [None] * n
+        self.game_finished = [False] * n  # Tracks if each player has finished the race
+
+    def reset_cars(self, grid):
+        """
+        Put every car back on the start line with fresh health, speed and effects.
+        Handling is left to the level (see Simulation.set_level_properties()).
+        Args:
+            grid: Start position per car, from start_grid()
+        """
+        for position, previous, start in zip(self.position, self.previous_position, grid):
+            position[:] = start
+            previous[:] = start
+
+        for i in range(self.num_players):
+            self.velocity[i] = 0.0
+            self.max_speed[i] = TOP_SPEED
+            self.health[i] = START_HEALTH
+            self.boost_end_time[i] = 0.0
+            self.slippery_end_time[i] = 0.0
+            self.finish_times[i] = None
+            self.game_finished[i] = False
+
+        self.level_completed = False
+
+    def snapshot(self):
+        """
+        Copy the state into immutable tuples.
+        Returns:
+            Tuple accepted by restore()
+        """
+        return ((self.tick, self.current_level, self.countdown_state, self.countdown_start_time,
+                 self.level_completed, self.level_complete_time, self.base_handling),
+                tuple(self.round_winners),
+                tuple(map(tuple, self.position)),
+                tuple(map(tuple, self.previous_position)),
+                tuple(tuple(getattr(self, name)) for name in self.CAR_FIELDS))
+
+    def restore(self, snapshot):
+        """
+        Overwrite the state in place with a snapshot of a state with the same number of cars.
+        Args:
+            snapshot: Tuple returned by snapshot()
+        """
+        race, round_winners, positions, previous_positions, cars = snapshot
+        (self.tick, self.current_level, self.countdown_state, self.countdown_start_time,
+         self.level_completed, self.level_complete_time, self.base_handling) = race
+        self.round_winners[:] = round_winners
+
+        for position, saved in zip(self.position, positions):
+            position[:] = saved
+
+        for position, saved in zip(self.previous_position, previous_positions):
+            position[:] = saved
+
+        for name, saved in zip(self.CAR_FIELDS, cars):
+            getattr(self, name)[:] = saved
+
+    def clone(self):
+        """
+        Create an independent copy of the state.
+        """
+        copy = RaceState(self.num_players, self.base_handling)
+        copy.restore(self.snapshot())
+        return copy
+
+
+def aabb_sweep(start, end, center, half):
+    """
+    Find when a point moving in a straight line first gets strictly inside a box.
+    Args:
+        start, end: (x, y, z) positions at the start and end of the motion
+        center: (x, y, z) center of the box
+        half: (x, y, z) half-extents of the box
+    Returns:
+        Fraction of the motion in [0, 1) at which the point is first inside, or None if it never is
+    """
+    t_in = 0.0
+    t_out = 1.0
+
+    for a, b, c, h in zip(start, end, center, half):
+        d = b - a
+
+        if d == 0.0:
+            if abs(a - c) >= h:
+                return None
+            continue
+
+        t0 = (c - h - a) / d
+        t1 = (c + h - a) / d
+        if t0 > t1:
+            t0, t1 = t1, t0
+
+        t_in = max(t_in, t0)
+        t_out = min(t_out, t1)
+
+        if t_in >= t_out:
+            return None
+
+    return t_in
+
+
+def aabb_collide(min1, max1, min2, max2):
+    """
+    Check for collision between two axis-aligned bounding boxes.
+    Args:
+        min1, max1: Min and max coordinates of first box
+        min2, max2: Min and max coordinates of second box
+    Returns:
+        Boolean indicating if the boxes intersect
+    """
+    return all(min1[i] < max2[i] and max1[i] > min2[i] for i in range(3))
+
+
+# --- SIMULATION ---
+class Simulation(RaceState):
+    """
+    Complete state of one race plus the rules that advance it.
+    Cars and objects live in track coordinates: position [x, y, z] is the
+    lateral offset from the center line (positive to the left), the height
+    above the track, and the distance along the track. self.track converts
+    them to world space for rendering.
+    Time inside the simulation is measured in ticks of TICK_DT seconds and
+    all randomness comes from a per-race generator, so a race with the same
+    seed and the same per-tick inputs plays out identically every time.
+    The changing race and car state is inherited from RaceState, so it can
+    be snapshotted and restored in place.
+    Args:
+        clock: Callable returning seconds; only used by update() to decide
+            how many fixed ticks are due
+        weather: Whether to simulate rain/snow particles (off for headless runs)
+        particle_count: Number of rain drops / snow flakes on weather levels
+        seed: Seed for the race's random generators (None picks a random seed)
+        track_length: Distance from the start to the finish line
+        item_counts: Dict mapping type code to item count (defaults to ITEM_COUNTS)
+        control_points: Shape of the track (defaults to track.CONTROL_POINTS)
+        streaming: Generate a procedural track in chunks around the cars instead
+            of all up front; track_length may then be math.inf for an endless race
+        num_players: Number of cars in the race
+        swept_collisions: Test the whole path each car drove since the last tick
+            against the objects, so fast cars can't skip over them; False checks
+            only where the cars are, like recordings made before swept collisions
+    """
+
+    def __init__(self, clock=time.perf_counter, weather=True, particle_count=PARTICLE_COUNT, seed=None,
+                 track_length=TRACK_LENGTH, item_counts=None, control_points=CONTROL_POINTS, streaming=False,
+                 num_players=NUM_PLAYERS, swept_collisions=True):
+        self.clock = clock
+        self.track_length = track_length
+        self.control_points = control_points
+        self.item_counts = ITEM_COUNTS if item_counts is None else item_counts
+        self.weather = weather
+        self.seed = random.randrange(2 ** 63) if seed is None else seed
+        self.rng = RaceRandom(self.seed)  # Track generation and race rules
+        self.swept_collisions = swept_collisions
+        self.recorder = None  # Optional InputRecorder fed the keys of every tick run
+        self.history = None  # Optional SnapshotRing fed the state after every tick run
+        self._accumulator = 0.0
+        self._last_clock = None
+
+        # Track, objects, particles, and trees
+        self.track = None  # Track, created by init_game()
+        self.track_version = 0  # Bumped whenever the track is regenerated
+        self.streaming = streaming
+        self.streamed_to = 0.0  # Distance along the track up to which chunks have been generated
+        self.stream_chunks = deque()  # (end distance, tree count) of every chunk still in memory
+        self.objects = ObjectStore()
+        self.object_index = ZIndex()  # Ids of active objects sorted by distance along the track
+        # Particles get their own generator so weather never changes the race itself
+        self.particles = ParticleSystem(particle_count if weather else 0, np.random.default_rng(self.seed))
+        self.trees = []
+        self.scenery_version = 0  # Bumped whenever the trees (or streamed objects) change
+
+        # Game state: race timers and car state, kept in RaceState's slots
+        super().__init__(num_players)
+        self.key_names = [player_keys(player_id) for player_id in range(num_players)]
+        self.paused = False  # Pause state for the game
+
+    @property
+    def time(self):
+        """
+        Simulation time in seconds.
+        """
+        return self.tick * TICK_DT
+
+    # --- TIMESTEP ---
+    def update(self, keys):
+        """
+        Run however many fixed ticks are due according to the clock.
+        Args:
+            keys: Input state dict applied to every tick run
+        Returns:
+            Number of ticks run
+        """
+        now = self.clock()
+
+        if self._last_clock is None:
+            self._last_clock = now
+
+        self._accumulator += now - self._last_clock
+        self._last_clock = now
+
+        ticks = 0
+
+        while self._accumulator >= TICK_DT and ticks < MAX_TICKS_PER_UPDATE:
+            self.step(keys)
+            self._accumulator -= TICK_DT
+            ticks += 1
+
+        if ticks == MAX_TICKS_PER_UPDATE:
+            self._accumulator = 0.0  # Drop the backlog instead of spiralling
+
+        return ticks
+
+    def step(self, keys):
+        """
+        Advance the race by exactly one fixed tick.
+        Args:
+            keys: Input state dict for this tick
+        """
+        if self.paused:
+            return
+
+        if self.recorder is not None:
+            self.recorder.record(keys)
+
+        self.tick += 1
+        self.update_countdown()
+        self.update_physics(keys)
+
+        if self.history is not None:
+            self.history.capture(self)
+
+    # --- LEVEL MANAGEMENT ---
+    def init_game(self):
+        """
+        Initialize game state, track, objects, and countdown.
+        """
+        self.current_level = 0
+        self.round_winners.clear()
+        if not self.streaming:
+            self.track = generate_track(self.track_length, self.control_points)
+            self.track_version += 1
+
+        self.reset_level()
+
+    def reset_level(self):
+        """
+        Reset players and timers and generate fresh objects for the current level.
+        """
+        self.reset_cars(start_grid(self.num_players))
+        self.set_level_properties(self.current_level)
+
+        if self.streaming:
+            self.start_stream()
+        else:
+            generate_objects(self.objects, self.track, self.rng, self.item_counts)
+            generate_trees(self.trees, self.rng, self.track)
+            self.scenery_version += 1
+            self.build_object_index()
+
+        self.countdown_state = 3
+        self.countdown_start_time = self.time
+
+    # --- STREAMING ---
+    def start_stream(self):
+        """
+        Begin a fresh streaming track and generate the chunks in front of the start line.
+        """
+        self.track = StreamingTrack(SAMPLE_SPACING, self.rng, self.track_length)
+        self.track_version += 1
+        self.objects.clear()
+        self.trees.clear()
+        self.stream_chunks.clear()
+        self.streamed_to = 0.0
+        self.stream(0.0, 0.0)
+
+    def stream(self, lead, trail):
+        """
+        Generate chunks up to STREAM_AHEAD in front of the leading car and free
+        the ones more than STREAM_BEHIND behind the trailing car, so the amount
+        of track, objects and trees in memory stays constant.
+        Args:
+            lead: Distance along the track of the leading car
+            trail: Distance along the track of the trailing car
+        """
+        changed = False
+        per_chunk = sum(self.item_counts.values()) * STREAM_CHUNK / TRACK_LENGTH
+        last_sample = self.track_length / SAMPLE_SPACING - 10  # Keep the finish line clear
+
+        while self.streamed_to < min(lead + STREAM_AHEAD, self.track_length):
+            start = self.streamed_to
+            end = start + STREAM_CHUNK
+            self.track.extend(end)
+
+            first = max(int(round(start / SAMPLE_SPACING)), 10)  # Keep the start line clear
+            last = int(min(round(end / SAMPLE_SPACING), last_sample))
+            count = max(0, min(int(round(per_chunk)), last - first))
+            place_objects(self.objects, self.track, self.rng, scaled_item_counts(count, self.item_counts),
+                          first, max(first, last))
+
+            trees_before = len(self.trees)
+            place_trees(self.trees, self.rng, self.track, start, end)
+            self.stream_chunks.append((end, len(self.trees) - trees_before))
+
+            self.streamed_to = end
+            changed = True
+
+        cutoff = trail - STREAM_BEHIND
+
+        while self.stream_chunks and self.stream_chunks[0][0] < cutoff:
+            end, tree_count = self.stream_chunks.popleft()
+            del self.trees[:tree_count]
+            self.objects.drop_first(bisect_left(self.objects.zs, end))
+            self.track.trim(end)
+            changed = True
+
+        if changed:
+            self.scenery_version += 1
+            self.build_object_index()
+
+    def build_object_index(self):
+        """
+        Rebuild the z index from the currently active objects.
+        """
+        zs = self.objects.zs
+        self.object_index.build((zs[i], i) for i in self.objects.active_ids())
+
+    def set_level_properties(self, level):
+        """
+        Set properties (handling, particles) for the given level.
+        Args:
+            level: Integer (0: Sunny, 1: Rainy, 2: Snowy)
+        """
+        self.base_handling = LEVEL_HANDLING[level]
+        self.particles.spawn(level)
+
+        for i in range(self.num_players):
+            self.handling[i] = self.base_handling
+
+    def next_level(self):
+        """
+        Advance to the next level, resetting game state and generating new objects.
+        """
+        self.current_level += 1
+        self.reset_level()
+
+    def restart_game(self):
+        """
+        Restart the entire game, resetting all levels and state.
+        """
+        self.current_level = 0
+        self.round_winners.clear()
+        self.reset_level()
+
+    def update_countdown(self):
+        """
+        Advance the countdown (3, 2, 1, GO!) one state per COUNTDOWN_STEP seconds.
+        """
+        if self.countdown_state is None or self.countdown_state == 'racing':
+            return
+
+        if self.time - self.countdown_start_time <= COUNTDOWN_STEP:
+            return
+
+        if self.countdown_state == 'GO!':
+            self.countdown_state = 'racing'
+        elif self.countdown_state == 1:
+            self.countdown_state = 'GO!'
+        else:
+            self.countdown_state -= 1
+
+        self.countdown_start_time = self.time
+
+    # --- PHYSICS & COLLISION ---
+    def check_collisions(self, player_id):
+        """
+        Check for collisions between a player and track objects.
+        Updates player state (health, speed, handling) based on collisions.
+        With swept collisions the car's whole path since its last check is tested,
+        so a boosted car moving further than an object is deep can't jump over it,
+        and the objects are hit in the order the car reached them. The car itself
+        stays where it is. Only objects within REACH of the path in z are looked at,
+        via the object index.
+        Args:
+            player_id: Index of the player
+        """
+        end = cx, cy, cz = tuple(self.position[player_id])
+        start = tuple(self.previous_position[player_id]) if self.swept_collisions else end
+        moved = start != end
+        self.previous_position[player_id][:] = end
+
+        t = self.time
+
+        objects = self.objects
+
+        hits = []
+
+        for i in self.object_index.query(min(start[2], cz) - REACH, max(start[2], cz) + REACH):
+
+            kind = objects.types[i]
+            x, y, z = objects.xs[i], objects.ys[i], objects.zs[i]
+
+            if kind == SLIPPERY:
+                hx, hy = SLIPPERY_HALF + CAR_HALF, SLIPPERY_HALF_Y + CAR_HALF
+
+            else:
+                hx = hy = ITEM_HALF + CAR_HALF
+
+            entry = aabb_sweep(start, end, (x, y, z), (hx, hy, hx)) if moved else None
+
+            if abs(cx - x) < hx and abs(cy - y) < hy and abs(cz - z) < hx:
+                # Where the car is now always counts, even if rounding put the entry on the path's end
+                hits.append((1.0 if entry is None else entry, i, kind, z))
+
+            elif entry is not None:
+                hits.append((entry, i, kind, z))
+
+        hits.sort(key=lambda hit: hit[0])  # Stable, so objects reached together keep the index's order
+
+        for _, i, kind, z in hits:
+
+            if kind == OBS:
+
+                self.health[player_id] -= 1.0
+                self.max_speed[player_id] *= 0.9
+                self.velocity[player_id] = 0.0
+
+                if self.health[player_id] <= 0:
+
+                    self.health[player_id] = 0
+                    self.max_speed[player_id] *= 0.1
+
+            elif kind == BOOST:
+
+                self.max_speed[player_id] = BOOSTED_TOP_SPEED
+                self.boost_end_time[player_id] = t + BOOST_DURATION
+
+            elif kind == SPEED_DOWN:
+                # Slows down every opponent
+                for opponent_id in range(self.num_players):
+                    if opponent_id != player_id:
+                        self.velocity[opponent_id] *= 0.2
+
+            elif kind == SLIPPERY:
+
+                self.handling[player_id] = self.base_handling * 0.3
+                self.slippery_end_time[player_id] = t + SLIPPERY_DURATION
+
+            objects.deactivate(i)
+            self.object_index.remove(z, i)
+
+        if self.boost_end_time[player_id] and t > self.boost_end_time[player_id]:
+
+            self.max_speed[player_id] = TOP_SPEED if self.health[player_id] > 0 else self.max_speed[player_id]
+            self.boost_end_time[player_id] = 0.0
+
+        if self.slippery_end_time[player_id] and t > self.slippery_end_time[player_id]:
+
+            self.handling[player_id] = self.base_handling
+            self.slippery_end_time[player_id] = 0.0
+
+    def check_car_collision(self):
+        """
+        Check for collisions between player cars.
+        Cars are sorted by distance along the track and swept, so only cars
+        within CAR_RADIUS of each other along the track are compared. For
+        each colliding pair a random loser is stopped and the cars are pushed apart.
+        """
+        position = self.position
+        order = sorted(range(self.num_players), key=lambda i: position[i][2])
+
+        for k, a in enumerate(order):
+            pa = position[a]
+
+            for b in order[k + 1:]:
+                pb = position[b]
+
+                if pb[2] - pa[2] >= CAR_RADIUS:
+                    break
+
+                if abs(pb[0] - pa[0]) < CAR_RADIUS:
+                    self.collide_cars(min(a, b), max(a, b))
+
+    def collide_cars(self, a, b):
+        """
+        Resolve a possible collision between two cars.
+        Args:
+            a, b: Player indices, a < b
+        """
+        pa = self.position[a]
+        pb = self.position[b]
+
+        dx = pa[0] - pb[0]
+        dz = pa[2] - pb[2]
+
+        dist_squared = dx * dx + dz * dz
+
+        if dist_squared < CAR_RADIUS_SQUARED:
+
+            loser = self.rng.choice([a, b])
+            self.velocity[loser] = 0.0
+
+            push_dir = 0.05 if dx < 0 else -0.05
+
+            pa[0] += push_dir
+            pb[0] -= push_dir
+
+    def update_physics(self, keys):
+        """
+        Update game physics: car movement, collisions, and particle positions.
+        Handles level completion and progression logic.
+        Args:
+            keys: Input state dict for this tick
+        """
+        if self.countdown_state != 'racing':
+            return
+
+        self.check_car_collision()
+
+        for player_id in range(self.num_players):
+
+            if self.game_finished[player_id]:
+                continue
+
+            self.check_collisions(player_id)
+
+            accel_key, left_key, right_key = self.key_names[player_id]
+
+            if keys[accel_key]:
+
+                self.velocity[player_id] += ACCELERATION
+
+            else:
+
+                self.velocity[player_id] -= ACCELERATION / 2 if self.velocity[player_id] > 0 else 0
+
+            self.velocity[player_id] = max(0, min(self.max_speed[player_id], self.velocity[player_id]))
+
+            if keys[left_key]:
+
+                self.position[player_id][0] += self.handling[player_id]
+
+            if keys[right_key]:
+
+                self.position[player_id][0] -= self.handling[player_id]
+
+            new_x = max(-TRACK_WIDTH / 2 + 0.1, min(TRACK_WIDTH / 2 - 0.1, self.position[player_id][0]))
+
+            if new_x != self.position[player_id][0]:
+                self.velocity[player_id] *= 0.9
+
+            self.position[player_id][0] = new_x
+            self.position[player_id][2] += self.velocity[player_id]
+
+            if self.position[player_id][2] >= self.track_length:
+                self.finish_times[player_id] = self.time
+                self.game_finished[player_id] = True
+
+        if self.streaming:
+            self.stream(max(p[2] for p in self.position), min(p[2] for p in self.position))
+
+        if all(self.game_finished) and not self.level_completed:
+
+            self.level_completed = True
+            self.level_complete_time = self.time
+
+            best = min(self.finish_times)
+            winners = [i for i, finish in enumerate(self.finish_times) if finish == best]
+            self.round_winners.append(winners[0] if len(winners) == 1 else -1)  # -1 for a tie
+
+        if self.level_completed and keys['enter'] and self.current_level < NUM_LEVELS - 1:
+            self.next_level()
+
+        if self.level_completed and self.current_level == NUM_LEVELS - 1 and keys['restart']:
+            self.restart_game()
+
+        self.update_particles()
+
+    def update_particles(self):
+        """
+        Move weather particles and respawn the ones that fell below the ground.
+        The weather follows the midpoint of the cars in world space.
+        """
+        if not len(self.particles):
+            return
+
+        sum_x = sum_z = 0.0
+        for position in self.position:
+            x, _, z = self.track.to_world(*position)
+            sum_x += x
+            sum_z += z
+
+        self.particles.update(sum_x / self.num_players, sum_z / self.num_players)
+
+
+def run_headless(max_ticks=TICK_RATE * 120, keys=None, seed=None):
+    """
+    Run a single level to completion (or max_ticks) without any display.
+    Args:
+        max_ticks: Safety cap on the number of ticks to simulate
+        keys: Input state held for the whole race (defaults to both players
+            holding accelerate)
+        seed: Seed for the race (None picks a random seed)
+    Returns:
+        The finished Simulation
+    """
+    if keys is None:
+        keys = empty_keys()
+        keys['p1_accel'] = True
+        keys['p2_accel'] = True
+
+    sim = Simulation(weather=False, seed=seed)
+    sim.init_game()
+
+    while sim.tick < max_ticks and not sim.level_completed:
+        sim.step(keys)
+
+    return sim
@@ -0,0 +1,274 @@
+# Binary snapshots of a running race, for rollback netcode and the rewind key.
+# A snapshot packs the RaceState, the race's random generator and the objects'
+# active flags into one bytes object, and restoring it writes all of that back in
+# place. Object positions and trees only change when a level is generated, so they
+# are kept once per layout and shared by every snapshot taken on that layout; the
+# generator's state is likewise shared by snapshots between draws from it.
+import math
+import struct
+from collections import deque
+
+import numpy as np
+
+from objectstore import ObjectStore
+
+
+COUNTDOWN_CODES = {None: 0, 3: 3, 2: 2, 1: 1, 'GO!': 4, 'racing': 5}
+COUNTDOWN_STATES = {code: state for state, code in COUNTDOWN_CODES.items()}
+
+# Tick, level, countdown, round winner count, level completed, countdown start, level complete time,
+# base handling, object count
+RACE = struct.Struct('<IBBB?dddI')
+# Position, position at the last collision check, orientation, velocity, max speed, handling, health,
+# boost end, slippery end, finish time (NaN if none), finished
+CAR = struct.Struct('<14d?')
+RNG = struct.Struct('<625Id')  # Mersenne Twister state and position, pending gauss value (NaN if none)
+
+
+# --- RACE STATE ---
+def pack_state(sim, rng=True):
+    """
+    Serialize the race state, random generator and object active flags of a simulation.
+    Args:
+        sim: Simulation to serialize
+        rng: Whether to include the random generator (most of the size and time)
+    Returns:
+        Bytes for unpack_state()
+    """
+    parts = [RACE.pack(sim.tick, sim.current_level, COUNTDOWN_CODES[sim.countdown_state], len(sim.round_winners),
+                       sim.level_completed, sim.countdown_start_time, sim.level_complete_time, sim.base_handling,
+                       len(sim.objects))]
+
+    for i in range(sim.num_players):
+        finish = sim.finish_times[i]
+        parts.append(CAR.pack(*sim.position[i], *sim.previous_position[i], sim.orientation[i], sim.velocity[i], sim.max_speed[i],
+                              sim.handling[i], sim.health[i], sim.boost_end_time[i], sim.slippery_end_time[i],
+                              math.nan if finish is None else finish, sim.game_finished[i]))
+
+    if rng:
+        _, mt, gauss = sim.rng.getstate()
+        parts.append(RNG.pack(*mt, math.nan if gauss is None else gauss))
+
+    parts.append(bytes(winner & 0xFF for winner in sim.round_winners))
+    parts.append(sim.objects.active)
+    return b''.join(parts)
+
+
+def unpack_state(sim, data, offset=0, rng=True):
+    """
+    Load a state written by pack_state() into a simulation of the same race.
+    The simulation's objects must have the layout the state was packed with.
+    Args:
+        sim: Simulation with the same number of cars and objects
+        data: Bytes from pack_state()
+        offset: Where the state starts in data
+        rng: Whether the state includes the random generator, as passed to pack_state()
+    Returns:
+        Offset just past the state
+    """
+    (tick, level, countdown, winners, completed, countdown_start, complete_time, base_handling,
+     count) = RACE.unpack_from(data, offset)
+    offset += RACE.size
+
+    if count != len(sim.objects):
+        raise ValueError(f"state has {count} objects, the simulation {len(sim.objects)}")
+
+    if level != sim.current_level:
+        sim.set_level_properties(level)  # Respawns the weather for that level
+
+    sim.tick = tick
+    sim.current_level = level
+    sim.countdown_state = COUNTDOWN_STATES[countdown]
+    sim.level_completed = completed
+    sim.countdown_start_time = countdown_start
+    sim.level_complete_time = complete_time
+    sim.base_handling = base_handling
+
+    for i in range(sim.num_players):
+        values = CAR.unpack_from(data, offset)
+        offset += CAR.size
+        sim.position[i][:] = values[0:3]
+        sim.previous_position[i][:] = values[3:6]
+        (sim.orientation[i], sim.velocity[i], sim.max_speed[i], sim.handling[i], health,
+         sim.boost_end_time[i], sim.slippery_end_time[i], finish, sim.game_finished[i]) = values[6:]
+        sim.health[i] = health or 0  # A wrecked car's health is the int 0, see check_collisions()
+        sim.finish_times[i] = None if math.isnan(finish) else finish
+
+    if rng:
+        values = RNG.unpack_from(data, offset)
+        offset += RNG.size
+        sim.rng.setstate((3, values[:625], None if math.isnan(values[625]) else values[625]))
+
+    sim.round_winners[:] = [winner - 256 if winner > 127 else winner for winner in data[offset:offset + winners]]
+    offset += winners
+
+    set_active(sim, data[offset:offset + count])
+    return offset + count
+
+
+def set_active(sim, flags):
+    """
+    Overwrite the objects' active flags, updating the object index only where they changed.
+    Args:
+        sim: Simulation to update
+        flags: One byte per object, 1 if active
+    """
+    objects = sim.objects
+
+    if flags == objects.active:
+        return
+
+    changed = np.flatnonzero(np.frombuffer(flags, np.uint8) != np.frombuffer(objects.active, np.uint8))
+    objects.active[:] = flags
+    zs = objects.zs
+
+    for i in changed.tolist():
+        if flags[i]:
+            sim.object_index.insert(zs[i], i)
+        else:
+            sim.object_index.remove(zs[i], i)
+
+
+# --- LAYOUTS ---
+class Layout:
+    """
+    Copy of the parts of a race that only change when a level is generated:
+    the objects (without their active flags) and the trees.
+    Args:
+        sim: Simulation to copy from
+    """
+
+    __slots__ = ('version', 'objects', 'trees')
+
+    def __init__(self, sim):
+        self.version = sim.scenery_version
+        self.objects = ObjectStore()
+        source = sim.objects
+
+        for i in range(len(source)):
+            self.objects.add(source.types[i], source.xs[i], source.ys[i], source.zs[i])
+
+        self.trees = list(sim.trees)
+
+    def apply(self, sim):
+        """
+        Put this layout back into a simulation; every object starts out active.
+        """
+        objects = sim.objects
+        objects.clear()
+
+        for i in range(len(self.objects)):
+            objects.add(self.objects.types[i], self.objects.xs[i], self.objects.ys[i], self.objects.zs[i])
+
+        sim.trees[:] = self.trees
+        sim.scenery_version += 1  # A new version, so renderers rebuild their meshes
+        sim.build_object_index()
+        self.version = sim.scenery_version
+
+
+# --- HISTORY ---
+class SnapshotRing:
+    """
+    Snapshots of the last `capacity` ticks of a race, oldest first.
+    Attach it as Simulation.history and the simulation captures every tick it runs.
+    Besides the race, each snapshot holds the weather particles, so they rewind with it.
+    Endless races aren't supported: their track is generated and freed as the cars move.
+    Args:
+        capacity: Number of ticks kept
+    """
+
+    def __init__(self, capacity):
+        # (tick, Layout, generator state, particle state, bytes from pack_state())
+        self.snapshots = deque(maxlen=capacity)
+        self.layout = None  # Layout of the newest snapshot
+        self.rng_state = None  # Generator state of the newest snapshot
+        self.rng_draws = None  # The generator's draw count when rng_state was taken
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    def clear(self):
+        """
+        Forget every snapshot.
+        """
+        self.snapshots.clear()
+        self.layout = None
+        self.rng_state = self.rng_draws = None
+
+    def capture(self, sim):
+        """
+        Snapshot the current tick of a race.
+        Args:
+            sim: Simulation to capture
+        """
+        if sim.streaming:
+            raise ValueError("snapshots of endless races are not supported")
+
+        if self.layout is None or self.layout.version != sim.scenery_version:
+            self.layout = Layout(sim)
+
+        if sim.rng.draws != self.rng_draws:
+            # Reading the generator costs more than the rest of the snapshot, so only do it after draws
+            self.rng_state = sim.rng.getstate()
+            self.rng_draws = sim.rng.draws
+
+        self.snapshots.append((sim.tick, self.layout, self.rng_state, sim.particles.get_state(),
+                               pack_state(sim, rng=False)))
+
+    def oldest_tick(self):
+        """
+        Tick of the oldest snapshot, or None if there are none.
+        """
+        return self.snapshots[0][0] if self.snapshots else None
+
+    def restore(self, sim, tick):
+        """
+        Put a race back into the state it had at a captured tick. Later snapshots
+        are dropped, as is the part of an attached recording after that tick.
+        If the tick isn't in the ring, neither the ring nor the race is touched.
+        Args:
+            sim: Simulation the snapshots were captured from
+            tick: Tick to go back to
+        Raises:
+            KeyError: If that tick isn't in the ring
+        """
+        for newer, snapshot in enumerate(reversed(self.snapshots)):
+            if snapshot[0] <= tick:
+                break
+        else:
+            raise KeyError(tick)
+
+        if snapshot[0] != tick:
+            raise KeyError(tick)
+
+        for _ in range(newer):
+            self.snapshots.pop()
+
+        _, layout, rng_state, particles, data = snapshot
+
+        if layout.version != sim.scenery_version:
+            layout.apply(sim)
+
+        self.layout = layout
+        sim.rng.setstate(rng_state)
+        self.rng_state = rng_state
+        self.rng_draws = sim.rng.draws
+        unpack_state(sim, data, rng=False)
+        sim.particles.set_state(particles)  # After unpack_state(), whose level change respawns them
+
+        if sim.recorder is not None:
+            sim.recorder.truncate(tick)
+
+    def rewind(self, sim, ticks):
+        """
+        Go back up to `ticks` ticks, no further than the oldest snapshot.
+        Args:
+            sim: Simulation the snapshots were captured from
+            ticks: Number of ticks to go back
+        Returns:
+            Tick the race is at now
+        """
+        if self.snapshots:
+            self.restore(sim, max(sim.tick - ticks, self.oldest_tick()))
+
+        return sim.tick
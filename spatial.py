@@ -0,0 +1,78 @@
+# Spatial index for track objects. Everything on the track is spread out along z,
+# so a list kept sorted by z answers "what is near this car" with two bisections.
+from bisect import bisect_left, bisect_right
+
+
+class ZIndex:
+    """
+    Items kept sorted by their z coordinate.
+    Range queries cost O(log n + k) for k results, and removed items no
+    longer show up in any query.
+    """
+
+    def __init__(self):
+        self._zs = []  # Sorted z keys
+        self._items = []  # Items, parallel to _zs
+
+    def __len__(self):
+        return len(self._items)
+
+    def clear(self):
+        """
+        Remove every item from the index.
+        """
+        self._zs.clear()
+        self._items.clear()
+
+    def build(self, pairs):
+        """
+        Replace the contents of the index in one go.
+        Args:
+            pairs: Iterable of (z, item) pairs, in any order
+        """
+        ordered = sorted(pairs, key=lambda pair: pair[0])
+        self._zs = [z for z, _ in ordered]
+        self._items = [item for _, item in ordered]
+
+    def insert(self, z, item):
+        """
+        Add an item at the given z.
+        Args:
+            z: Sort key (the item's z coordinate)
+            item: Object stored in the index
+        """
+        i = bisect_right(self._zs, z)
+        self._zs.insert(i, z)
+        self._items.insert(i, item)
+
+    def remove(self, z, item):
+        """
+        Remove an item that was inserted at z.
+        Args:
+            z: The z the item was inserted with
+            item: The item to remove (compared by equality)
+        Returns:
+            True if the item was found and removed
+        """
+        i = bisect_left(self._zs, z)
+
+        while i < len(self._zs) and self._zs[i] == z:
+            if self._items[i] == item:
+                del self._zs[i]
+                del self._items[i]
+                return True
+            i += 1
+
+        return False
+
+    def query(self, zmin, zmax):
+        """
+        Find all items with zmin <= z <= zmax.
+        Args:
+            zmin, zmax: Inclusive z range
+        Returns:
+            List of matching items in z order (safe to modify the index while iterating)
+        """
+        lo = bisect_left(self._zs, zmin)
+        hi = bisect_right(self._zs, zmax, lo)
+        return self._items[lo:hi]
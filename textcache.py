@@ -0,0 +1,78 @@
+# Cached bitmap text for the HUD. Every glyph of a GLUT bitmap font is compiled into a
+# display list once, and every on-screen string into a list calling those glyphs, so a
+# string costs one glCallList per frame and is only recompiled when its text changes.
+from OpenGL.GL import GL_COMPILE, GL_UNSIGNED_BYTE, glCallList, glCallLists, glEndList, glGenLists, glListBase, \
+    glNewList, glRasterPos2f
+from OpenGL.GLUT import GLUT_BITMAP_9_BY_15, GLUT_BITMAP_HELVETICA_18, GLUT_BITMAP_TIMES_ROMAN_24, \
+    glutBitmapCharacter
+
+
+# Fonts by name; the GLUT font handles themselves aren't usable as dict keys
+FONTS = {
+    'helvetica18': GLUT_BITMAP_HELVETICA_18,
+    'times24': GLUT_BITMAP_TIMES_ROMAN_24,
+    'mono15': GLUT_BITMAP_9_BY_15,
+}
+
+GLYPH_COUNT = 128  # ASCII only; other characters are drawn as '?'
+
+
+class TextCache:
+    """
+    Draws strings from compiled display lists.
+    Strings are cached per slot, a caller-chosen key for one place on screen
+    (e.g. ('speed', player_id)), so a changing value replaces its old list
+    instead of piling up a new one for every value it ever had.
+    """
+
+    def __init__(self):
+        self.glyph_bases = {}  # Font name -> first display list of its glyphs
+        self.strings = {}  # Slot -> (font name, text, display list id)
+
+    def glyph_base(self, font):
+        """
+        Get the glyph display lists of a font, compiling them on first use.
+        Args:
+            font: Font name from FONTS
+        Returns:
+            Display list id of glyph 0; glyph c is at base + c
+        """
+        base = self.glyph_bases.get(font)
+
+        if base is None:
+            base = glGenLists(GLYPH_COUNT)
+
+            for code in range(GLYPH_COUNT):
+                glNewList(base + code, GL_COMPILE)
+                glutBitmapCharacter(FONTS[font], code)
+                glEndList()
+
+            self.glyph_bases[font] = base
+
+        return base
+
+    def draw(self, slot, x, y, text, font='helvetica18'):
+        """
+        Draw a string at a raster position in the current projection.
+        The current color is used, as with glutBitmapCharacter.
+        Args:
+            slot: Hashable key identifying this string's place on screen
+            x, y: Raster position of the start of the baseline
+            text: String to display
+            font: Font name from FONTS
+        """
+        cached = self.strings.get(slot)
+
+        if cached is None or cached[0] != font or cached[1] != text:
+            list_id = cached[2] if cached is not None else glGenLists(1)
+            encoded = text.encode('ascii', 'replace')
+
+            glNewList(list_id, GL_COMPILE)
+            glListBase(self.glyph_base(font))
+            glCallLists(len(encoded), GL_UNSIGNED_BYTE, encoded)
+            glEndList()
+
+            cached = self.strings[slot] = (font, text, list_id)
+
+        glRasterPos2f(x, y)
+        glCallList(cached[2])
@@ -0,0 +1,344 @@
+# Spline race tracks. The center line is a Catmull-Rom spline through control points,
+# resampled at equal arc-length spacing so that "distance along the track" (s) maps
+# straight to a table index. The simulation works in track coordinates (lateral offset,
+# height, s); these tables convert between them and world space. StreamingTrack grows
+# an endless procedural track ahead of the cars and forgets it behind them.
+import math
+from bisect import bisect_right
+
+
+# Shape of the default track as (x, y, z) control points. It is scaled to the requested
+# track length, so only the proportions matter. The start runs straight along +z.
+CONTROL_POINTS = [
+    (0.0, 0.0, 0.0), (0.0, 0.0, 25.0), (10.0, 0.0, 50.0), (12.0, 0.0, 75.0),
+    (0.0, 0.0, 100.0), (-12.0, 0.0, 125.0), (-8.0, 0.0, 150.0),
+]
+
+SPLINE_STEPS = 256  # Dense samples per spline segment for the arc-length table
+GRID_CELL = 5.0  # Cell size of the world-to-track lookup grid
+GRID_REACH = 8.0  # Lateral distance from the center line that project() is exact within
+GRID_SPAN = 8  # Track segments per grid entry
+
+STREAM_SEGMENT = 25.0  # Distance between the control points of a streaming track
+STREAM_TURN = 0.5  # Largest change of direction between two control points, in radians
+STREAM_MAX_HEADING = 1.0  # Streaming tracks never turn further than this from +z, so they can't cross themselves
+
+
+def catmull_rom(p0, p1, p2, p3, t):
+    """
+    Point on a uniform Catmull-Rom segment between p1 and p2.
+    Args:
+        p0, p1, p2, p3: (x, y, z) control points
+        t: Parameter in [0, 1]
+    Returns:
+        (x, y, z) point
+    """
+    t2 = t * t
+    t3 = t2 * t
+    return tuple(0.5 * (2 * b + (c - a) * t + (2 * a - 5 * b + 4 * c - d) * t2 + (3 * b - a - 3 * c + d) * t3)
+                 for a, b, c, d in zip(p0, p1, p2, p3))
+
+
+def arc_length_table(control_points, steps=SPLINE_STEPS):
+    """
+    Densely sample a spline through control points and accumulate its length.
+    The end points are extrapolated so the spline passes through every control point.
+    Args:
+        control_points: At least two (x, y, z) points
+        steps: Samples per segment
+    Returns:
+        (points, lengths): dense (x, y, z) samples and the arc length at each of them
+    """
+    first, last = control_points[0], control_points[-1]
+    padded = ([tuple(2 * a - b for a, b in zip(first, control_points[1]))] + list(control_points)
+              + [tuple(2 * a - b for a, b in zip(last, control_points[-2]))])
+
+    points = [tuple(first)]
+    lengths = [0.0]
+
+    for i in range(1, len(padded) - 2):
+        for step in range(1, steps + 1):
+            point = catmull_rom(padded[i - 1], padded[i], padded[i + 1], padded[i + 2], step / steps)
+            lengths.append(lengths[-1] + math.dist(points[-1], point))
+            points.append(point)
+
+    return points, lengths
+
+
+class Track:
+    """
+    Center line of a track, sampled every `spacing` units of arc length.
+    Sample i is at distance s = i * spacing from the start and is stored at
+    points[i - offset]; offset is always 0 here but grows on a StreamingTrack.
+    The last sample is the finish line at s = length.
+    Args:
+        length: Length of the track along its center line
+        spacing: Arc length between samples
+        control_points: Shape of the track, scaled to `length`
+    """
+
+    def __init__(self, length, spacing, control_points=CONTROL_POINTS):
+        self.length = length
+        self.spacing = spacing
+        self.offset = 0
+        count = int(round(length / spacing))
+
+        dense, lengths = arc_length_table(control_points)
+        scale = length / lengths[-1]
+        origin = dense[0]
+
+        # Resample at equal arc length: binary search the dense table for each s
+        self.points = []
+        for i in range(count + 1):
+            target = min(i * spacing, length) / scale
+            j = min(bisect_right(lengths, target), len(lengths) - 1)
+            span = lengths[j] - lengths[j - 1]
+            t = (target - lengths[j - 1]) / span if span else 0.0
+            self.points.append(tuple(o + (a + (b - a) * t - o) * scale
+                                     for o, a, b in zip(origin, dense[j - 1], dense[j])))
+
+        self.tangents = []
+        self.normals = []
+        self._update_frames(0)
+        self._grid = None
+
+    def __len__(self):
+        return len(self.points)
+
+    def _update_frames(self, start):
+        """
+        (Re)compute the unit tangents (direction of travel) and left-pointing
+        normals in the ground plane from points[start] on.
+        Args:
+            start: First local sample index to update
+        """
+        last = len(self.points) - 1
+        del self.tangents[start:]
+        del self.normals[start:]
+
+        for i in range(start, last + 1):
+            x0, _, z0 = self.points[max(i - 1, 0)]
+            x1, _, z1 = self.points[min(i + 1, last)]
+            norm = math.hypot(x1 - x0, z1 - z0)
+            tx, tz = (x1 - x0) / norm, (z1 - z0) / norm
+            self.tangents.append((tx, 0.0, tz))
+            self.normals.append((tz, 0.0, -tx))
+
+    def _sample(self, s):
+        """
+        Find the sample interval containing s, clamped to the stored samples.
+        Returns:
+            (i, t): local index of the sample before s and the fraction of the way to the next one
+        """
+        u = max(0.0, min(min(s, self.length) / self.spacing - self.offset, len(self.points) - 1))
+        i = min(int(u), len(self.points) - 2)
+        return i, u - i
+
+    def _lerp_normal(self, i, t):
+        """
+        Normal between samples i and i + 1, blended so offsets don't jump at sample boundaries.
+        Returns:
+            (nx, nz) of the (very nearly unit length) normal
+        """
+        ax, _, az = self.normals[i]
+        bx, _, bz = self.normals[i + 1]
+        return ax + (bx - ax) * t, az + (bz - az) * t
+
+    def to_world(self, lateral, height, s):
+        """
+        Convert track coordinates to a world position, in O(1).
+        Args:
+            lateral: Offset from the center line, positive to the left
+            height: Height above the track surface
+            s: Distance along the track
+        Returns:
+            (x, y, z) world position
+        """
+        i, t = self._sample(s)
+        ax, ay, az = self.points[i]
+        bx, by, bz = self.points[i + 1]
+        nx, nz = self._lerp_normal(i, t)
+        return (ax + (bx - ax) * t + nx * lateral,
+                ay + (by - ay) * t + height,
+                az + (bz - az) * t + nz * lateral)
+
+    def heading(self, s):
+        """
+        Direction of travel at a point of the track.
+        Args:
+            s: Distance along the track
+        Returns:
+            Yaw in radians; the direction is (sin(yaw), 0, cos(yaw))
+        """
+        nx, nz = self._lerp_normal(*self._sample(s))
+        return math.atan2(-nz, nx)  # The tangent is the normal turned a quarter to the right
+
+    def _build_grid(self):
+        """
+        Bucket every span of GRID_SPAN segments into the grid cells within GRID_REACH of it.
+        """
+        self._grid = {}
+        last = len(self.points) - 1
+
+        for k in range(0, last, GRID_SPAN):
+            span = self.points[k:min(k + GRID_SPAN, last) + 1]
+            xs = [p[0] for p in span]
+            zs = [p[2] for p in span]
+            for cx in range(int((min(xs) - GRID_REACH) // GRID_CELL), int((max(xs) + GRID_REACH) // GRID_CELL) + 1):
+                for cz in range(int((min(zs) - GRID_REACH) // GRID_CELL), int((max(zs) + GRID_REACH) // GRID_CELL) + 1):
+                    self._grid.setdefault((cx, cz), []).append(k)
+
+    def _nearest_on_segments(self, x, z, segments, length=1):
+        """
+        Find the point of some track segments nearest to (x, z).
+        Args:
+            x, z: World position
+            segments: Indices of the first sample of each segment
+            length: Samples spanned by each segment (longer ones are chords of the track)
+        Returns:
+            (distance_sq, i, t, px, pz): segment index, fraction along it and the point itself
+        """
+        best = None
+        last = len(self.points) - 1
+
+        for i in segments:
+            ax, _, az = self.points[i]
+            bx, _, bz = self.points[min(i + length, last)]
+            dx, dz = bx - ax, bz - az
+            t = max(0.0, min(1.0, ((x - ax) * dx + (z - az) * dz) / (dx * dx + dz * dz)))
+            px, pz = ax + dx * t, az + dz * t
+            distance_sq = (x - px) ** 2 + (z - pz) ** 2
+
+            if best is None or distance_sq < best[0]:
+                best = (distance_sq, i, t, px, pz)
+
+        return best
+
+    def project(self, x, z):
+        """
+        Convert a world position to track coordinates, ignoring height.
+        Within GRID_REACH of the track this only looks at the spans sharing the
+        point's grid cell, so it's O(1); further away it falls back to scanning
+        every segment. The grid is built on first use.
+        Args:
+            x, z: World position
+        Returns:
+            (lateral, s) of the nearest point on the center line
+        """
+        if self._grid is None:
+            self._build_grid()
+
+        last = len(self.points) - 1
+        spans = self._grid.get((int(x // GRID_CELL), int(z // GRID_CELL)))
+
+        if spans is None:
+            segments = range(last)
+
+        else:
+            # Coarse pass over chords of the spans, then every segment around the best one
+            _, k, t, _, _ = self._nearest_on_segments(x, z, spans, GRID_SPAN)
+            i = k + int(t * GRID_SPAN)
+            segments = range(max(i - GRID_SPAN, 0), min(i + GRID_SPAN, last))
+
+        _, i, t, px, pz = self._nearest_on_segments(x, z, segments)
+        nx, nz = self._lerp_normal(i, t)
+        return (x - px) * nx + (z - pz) * nz, min((self.offset + i + t) * self.spacing, self.length)
+
+
+class StreamingTrack(Track):
+    """
+    An endless track whose control points are made up as it grows.
+    Only a window of samples is kept: extend() appends samples at the far end
+    and trim() forgets them at the near end, so memory stays bounded however
+    long the race is. The track starts at the origin heading along +z.
+    Args:
+        spacing: Arc length between samples
+        rng: random.Random instance the control points are drawn from
+        length: Distance to the finish line (infinite for an endless race)
+    """
+
+    def __init__(self, spacing, rng, length=math.inf):
+        self.length = length
+        self.spacing = spacing
+        self.rng = rng
+        self.offset = 0
+        self.points = [(0.0, 0.0, 0.0)]
+        self.tangents = [(0.0, 0.0, 1.0)]
+        self.normals = [(1.0, 0.0, 0.0)]
+        self._grid = None
+
+        self._heading = 0.0
+        self._controls = [(0.0, 0.0, -STREAM_SEGMENT), (0.0, 0.0, 0.0), (0.0, 0.0, STREAM_SEGMENT)]
+        self._last_dense = (0.0, 0.0, 0.0)
+        self._travelled = 0.0  # Arc length from the start to _last_dense
+        self._next_sample = spacing  # Arc length of the next sample to emit
+
+    @property
+    def end(self):
+        """
+        Distance along the track of the last generated sample.
+        """
+        return (self.offset + len(self.points) - 1) * self.spacing
+
+    def _add_segment(self):
+        """
+        Draw one more control point and sample the spline segment it completes.
+        """
+        self._heading += self.rng.uniform(-STREAM_TURN, STREAM_TURN)
+        self._heading = max(-STREAM_MAX_HEADING, min(STREAM_MAX_HEADING, self._heading))
+        x, y, z = self._controls[-1]
+        self._controls.append((x + STREAM_SEGMENT * math.sin(self._heading), y,
+                               z + STREAM_SEGMENT * math.cos(self._heading)))
+        p0, p1, p2, p3 = self._controls[-4:]
+        del self._controls[:-3]
+
+        first_new = len(self.points)
+
+        for step in range(1, SPLINE_STEPS + 1):
+            point = catmull_rom(p0, p1, p2, p3, step / SPLINE_STEPS)
+            piece = math.dist(self._last_dense, point)
+
+            # Emit every sample that falls on this piece of the dense spline
+            while self._travelled + piece >= self._next_sample:
+                t = (self._next_sample - self._travelled) / piece
+                self.points.append(tuple(a + (b - a) * t for a, b in zip(self._last_dense, point)))
+                self._next_sample += self.spacing
+
+            self._travelled += piece
+            self._last_dense = point
+
+        self._update_frames(first_new - 1)
+        self._grid = None
+
+    def extend(self, s):
+        """
+        Generate samples until the track reaches at least s.
+        Args:
+            s: Distance along the track that must exist
+        Returns:
+            Whether any samples were added
+        """
+        grew = False
+
+        while self.end < s:
+            self._add_segment()
+            grew = True
+
+        return grew
+
+    def trim(self, s):
+        """
+        Forget the samples before s. A couple of samples are always kept.
+        Args:
+            s: Distance along the track before which nothing is needed any more
+        """
+        n = min(int(s / self.spacing) - self.offset, len(self.points) - 2)
+
+        if n <= 0:
+            return
+
+        del self.points[:n]
+        del self.tangents[:n]
+        del self.normals[:n]
+        self.offset += n
+        self._grid = None